@@ -0,0 +1,63 @@
+import sys
+import argparse
+import tempfile
+
+from benchmarks.cases import BENCHMARKS, SIZES, QUICK_SIZES
+from benchmarks.data import Workspace
+from benchmarks.runner import case_key, run_benchmarks, write_results, load_results, compare, format_comparison, METRICS
+
+
+def run_command(args):
+    sizes = tuple(args.sizes) if args.sizes else QUICK_SIZES if args.quick else SIZES
+    with tempfile.TemporaryDirectory(prefix='biosignals-bench-') as directory:
+        workspace = Workspace(args.data_dir or directory)
+        results = run_benchmarks(BENCHMARKS, workspace, sizes, only=args.only, repeat=args.repeat, max_time=args.max_time)
+    print(f"Results written to {write_results(results, args.output)}")
+    if results["skipped"]:
+        print(f"Skipped {len(results['skipped'])} case(s) with a missing optional dependency")
+    # The results of the cases that ran are kept, but a failed case still fails the run
+    return 1 if results["failed"] else 0
+
+
+def compare_command(args):
+    rows = compare(load_results(args.baseline), load_results(args.candidate), args.threshold, args.metric)
+    print(format_comparison(rows))
+    # Non-zero exit when anything regressed, so CI can gate on it
+    return 1 if any(status == 'regression' for *_, status in rows) else 0
+
+
+def list_command(args):
+    sizes = tuple(args.sizes) if args.sizes else QUICK_SIZES if args.quick else SIZES
+    for benchmark in BENCHMARKS:
+        for params in benchmark.params(sizes):
+            print(case_key(benchmark.name, params))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks for the EEG and EMG hot paths.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    for name, help_text in (('run', 'run the benchmarks and write JSON results'), ('list', 'list the benchmark cases')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--quick', action='store_true', help=f'only the {QUICK_SIZES[0]} s recordings')
+        command.add_argument('--sizes', type=int, nargs='+', help=f'recording lengths in seconds (default {list(SIZES)})')
+    run_parser = commands.choices['run']
+    run_parser.add_argument('--only', help='regular expression selecting cases by key, e.g. "emg_features|infer_"')
+    run_parser.add_argument('--output', help='results file (default benchmarks/results/<time>-<commit>.json)')
+    run_parser.add_argument('--repeat', type=int, default=7, help='maximum timings per case')
+    run_parser.add_argument('--max-time', type=float, default=5.0, help='seconds of timed calls per case once three timings are in')
+    run_parser.add_argument('--data-dir', help='keep the synthetic recordings here instead of a temporary directory')
+
+    compare_parser = commands.add_parser('compare', help='compare two results files and flag regressions')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown that counts as a regression')
+    compare_parser.add_argument('--metric', choices=METRICS, default='median_s')
+
+    args = parser.parse_args(argv)
+    handler = {'run': run_command, 'compare': compare_command, 'list': list_command}[args.command]
+    return handler(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
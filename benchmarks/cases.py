@@ -0,0 +1,244 @@
+import asyncio
+import warnings
+import itertools
+import numpy as np
+
+from emg.data_ingestion.config import FEATURE_CONFIG, SAMPLING_FREQ as EMG_SAMPLING_FREQ, WINDOW_LEN as EMG_WINDOW_LEN, OVERLAP as EMG_OVERLAP
+from emg.data_ingestion.data_loader import load_csv_channels, apply_window_csv, sliding_windows as emg_sliding_windows
+from emg.feature_extraction.feature_extraction import extract_features_batch as extract_emg_features, ALL_FEATURES_CONFIG
+from emg.models.model_suite import get_model, hyperparameters
+from emg.models.model_inferencer import compile_model, infer, infer_batch
+from eeg.config.settings import SAMPLING_FREQ as EEG_SAMPLING_FREQ, WINDOW_LEN as EEG_WINDOW_LEN, OVERLAP as EEG_OVERLAP, feature_config as EEG_FEATURE_CONFIG, \
+    preprocessing_config as EEG_PREPROCESSING_CONFIG
+from eeg.classifier.recording_cache import convert_recording, load_cached_recording
+from eeg.classifier.windowing import apply_window, apply_window_strided, sliding_windows as eeg_sliding_windows
+from eeg.classifier.preprocessing import preprocess_eeg, fit_ica_stage
+from eeg.classifier.feature_extraction import extract_features_batch as extract_eeg_features
+from benchmarks.data import emg_electrode_config, synthetic_emg, synthetic_eeg
+
+SIZES = (10, 60, 240)  # seconds of recording
+QUICK_SIZES = (10,)
+EMG_FEATURE_CONFIGS = {'live': FEATURE_CONFIG, 'all': ALL_FEATURES_CONFIG}
+INFERENCE_MODELS = ('LogisticRegression', 'NaiveBayes', 'SVM', 'RandomForest')
+SINGLE_INFER_ROWS = 200
+
+
+class Benchmark:
+    # setup(workspace, **params) builds the inputs outside the timed region and returns a state dict;
+    # run(state) is the timed call and returns how many items (samples, windows, rows) it processed. A run may
+    # leave extra metrics, such as stage latencies, in state['extra'].
+    def __init__(self, name, setup, run, unit, **grid):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.unit = unit
+        self.grid = grid
+
+    def params(self, sizes=SIZES):
+        grid = dict(self.grid, seconds=sizes) if 'seconds' in self.grid else self.grid
+        names = list(grid)
+        return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def emg_windows(seconds, channels):
+    data, labels = synthetic_emg(seconds, channels)
+    samples_per_window = int(EMG_WINDOW_LEN * EMG_SAMPLING_FREQ)
+    step = samples_per_window - int(EMG_OVERLAP * samples_per_window)
+    windows = np.ascontiguousarray(emg_sliding_windows(data, samples_per_window, step))
+    # Each window takes the gesture of its last sample
+    return windows, labels[samples_per_window - 1::step][:len(windows)]
+
+
+def eeg_windows(seconds, channels):
+    recording = synthetic_eeg(seconds, channels)
+    windows = np.ascontiguousarray(eeg_sliding_windows(recording, EEG_WINDOW_LEN, EEG_OVERLAP, EEG_SAMPLING_FREQ), dtype=float)
+    # Fitted once per recording, as extract_features_from_file does, so preprocess_eeg runs the configured steps
+    ica = None
+    if EEG_PREPROCESSING_CONFIG['ICA_artefacts']:
+        with warnings.catch_warnings():
+            # FastICA may not converge on synthetic noise; the stage is still applied at full cost
+            warnings.simplefilter('ignore')
+            ica = fit_ica_stage(np.asarray(recording, dtype=float), EEG_SAMPLING_FREQ)
+    return windows, ica
+
+
+def training_data(seconds, channels, feature_config=FEATURE_CONFIG):
+    windows, labels = emg_windows(seconds, channels)
+    return extract_emg_features(windows, EMG_SAMPLING_FREQ, feature_config), labels
+
+
+def fit_model(model_name, X, y):
+    with warnings.catch_warnings():
+        # The ANN and LogisticRegression stop at max_iter on synthetic data; that is the cost we want to time
+        warnings.simplefilter('ignore')
+        return get_model(model_name).fit(X, y)
+
+
+### Ingestion
+def setup_eeg_json(workspace, seconds, channels):
+    return {'path': workspace.eeg_json(seconds, channels), 'cache_dir': f'{workspace.directory}/json_cache', 'samples': seconds * EEG_SAMPLING_FREQ}
+
+
+def run_eeg_json(state):
+    # Cold path: parse the JSON and write the recording cache
+    convert_recording(state['path'], state['cache_dir'])
+    return state['samples']
+
+
+def setup_emg_csv(workspace, seconds, channels):
+    return {'path': workspace.emg_csv(seconds, channels), 'electrode_config': emg_electrode_config(channels)}
+
+
+def run_emg_csv(state):
+    return load_csv_channels(state['path'], state['electrode_config']).shape[1]
+
+
+### Windowing
+def setup_eeg_windowing(workspace, seconds, channels):
+    path = workspace.eeg_json(seconds, channels)
+    load_cached_recording(path)  # time windowing, not the one-off JSON conversion
+    return {'path': path}
+
+
+def run_apply_window(state):
+    return len(apply_window(EEG_WINDOW_LEN, EEG_OVERLAP, state['path']))
+
+
+def run_apply_window_strided(state):
+    # Materialise the views so the read from the memory-mapped cache is part of the timing
+    return len(np.array(apply_window_strided(EEG_WINDOW_LEN, EEG_OVERLAP, state['path'])))
+
+
+def run_apply_window_csv(state):
+    return len(apply_window_csv(EMG_WINDOW_LEN, EMG_OVERLAP, state['path'], state['electrode_config'], EMG_SAMPLING_FREQ))
+
+
+### Preprocessing and features
+def setup_eeg_windows(workspace, seconds, channels):
+    windows, ica = eeg_windows(seconds, channels)
+    return {'windows': windows, 'ica': ica, 'preprocessed': preprocess_eeg(windows, EEG_SAMPLING_FREQ, ica=ica)}
+
+
+def run_preprocess_eeg(state):
+    return len(preprocess_eeg(state['windows'], EEG_SAMPLING_FREQ, ica=state['ica']))
+
+
+def run_eeg_features(state):
+    return len(extract_eeg_features(state['preprocessed'], EEG_SAMPLING_FREQ, EEG_FEATURE_CONFIG))
+
+
+def setup_emg_features(workspace, seconds, channels, config):
+    return {'windows': emg_windows(seconds, channels)[0], 'config': EMG_FEATURE_CONFIGS[config]}
+
+
+def run_emg_features(state):
+    return len(extract_emg_features(state['windows'], EMG_SAMPLING_FREQ, state['config']))
+
+
+### Models
+def setup_training(workspace, seconds, channels, model):
+    X, y = training_data(seconds, channels)
+    return {'X': X, 'y': y, 'model': model}
+
+
+def run_training(state):
+    fit_model(state['model'], state['X'], state['y'])
+    return len(state['X'])
+
+
+def setup_inference(workspace, seconds, channels, model, compiled):
+    X, y = training_data(seconds, channels)
+    fitted = fit_model(model, X, y)
+    return {'X': X, 'model': compile_model(fitted) if compiled else fitted}
+
+
+def setup_single_inference(workspace, channels, model, compiled):
+    return setup_inference(workspace, QUICK_SIZES[0], channels, model, compiled)
+
+
+def run_infer_single(state):
+    # One window at a time, as the live pipeline calls it
+    rows = state['X'][:SINGLE_INFER_ROWS]
+    for row in rows:
+        infer(state['model'], row)
+    return len(rows)
+
+
+def run_infer_batch(state):
+    return len(infer_batch(state['model'], state['X']))
+
+
+### Realtime loop
+class DrainReader:
+    # Stands in for BoardReader at replay speed None: hands over whatever the board holds without sleeping for
+    # the next chunk, so the loop runs as fast as windowing, features and inference allow
+    def __init__(self, board):
+        self.board = board
+        self.stats = {"chunks": 0}
+
+    async def chunks(self):
+        while self.board.streaming or self.board.get_board_data_count():
+            data = self.board.get_board_data()
+            if data.shape[1]:
+                self.stats["chunks"] += 1
+                yield data
+            await asyncio.sleep(0)
+
+    async def stop(self):
+        pass
+
+
+def setup_realtime(workspace, seconds, model, policy):
+    # Imported here so the offline benchmarks run without the mindrove SDK installed
+    from emg.realtime.simulator import load_emg_recording
+
+    X, y = training_data(seconds, 8)
+    return {'recording': load_emg_recording(workspace.emg_csv(seconds, 8)), 'model': compile_model(fit_model(model, X, y)), 'policy': policy}
+
+
+async def replay(state):
+    from emg.realtime.simulator import SimulatedBoard
+    from emg.realtime.pipeline import RealtimePipeline
+    from emg.realtime.instrumentation import Instrumentation
+    from emg.realtime.armband_async import read_emg_data
+
+    board = SimulatedBoard(state['recording'], speed=None, loop=False)
+    board.start_stream()
+    instrumentation = Instrumentation()
+    pipeline = RealtimePipeline(state['model'], FEATURE_CONFIG, samp_freq=EMG_SAMPLING_FREQ, policy=state['policy'],
+                                on_result=lambda *args: None, instrumentation=instrumentation).start()
+    reader = DrainReader(board)
+    try:
+        await read_emg_data(board, EMG_SAMPLING_FREQ, pipeline, EMG_WINDOW_LEN, EMG_OVERLAP, buffer_duration=4.0, reader=reader)
+        # Acquisition is done; let the workers finish what is queued
+        while pipeline.stats["processed"] + pipeline.stats["dropped"] + pipeline.stats["coalesced"] < pipeline.stats["submitted"] \
+                or not pipeline.results.empty():
+            await asyncio.sleep(0.001)
+    finally:
+        await pipeline.stop()
+        board.stop_stream()
+        board.release_session()
+    state['extra'] = {'stages': instrumentation.report(), 'pipeline': dict(pipeline.stats), 'reader': reader.stats, 'board': board.stats}
+    return pipeline.stats["processed"]
+
+
+def run_realtime(state):
+    return asyncio.run(replay(state))
+
+
+BENCHMARKS = [
+    Benchmark('ingest_eeg_json', setup_eeg_json, run_eeg_json, 'samples', seconds=SIZES, channels=(4, 8)),
+    Benchmark('ingest_emg_csv', setup_emg_csv, run_emg_csv, 'samples', seconds=SIZES, channels=(2, 4, 8)),
+    # apply_window selects the electrodes in eeg/config/settings.py, so the EEG recordings need all 8 channels
+    Benchmark('apply_window', setup_eeg_windowing, run_apply_window, 'windows', seconds=SIZES, channels=(8,)),
+    Benchmark('apply_window_strided', setup_eeg_windowing, run_apply_window_strided, 'windows', seconds=SIZES, channels=(8,)),
+    Benchmark('apply_window_csv', setup_emg_csv, run_apply_window_csv, 'windows', seconds=SIZES, channels=(2, 4, 8)),
+    Benchmark('preprocess_eeg', setup_eeg_windows, run_preprocess_eeg, 'windows', seconds=SIZES, channels=(4, 8)),
+    Benchmark('eeg_features', setup_eeg_windows, run_eeg_features, 'windows', seconds=SIZES, channels=(4, 8)),
+    Benchmark('emg_features', setup_emg_features, run_emg_features, 'windows', seconds=SIZES, channels=(2, 4, 8), config=tuple(EMG_FEATURE_CONFIGS)),
+    Benchmark('train', setup_training, run_training, 'rows', seconds=SIZES, channels=(8,), model=tuple(hyperparameters)),
+    Benchmark('infer_single', setup_single_inference, run_infer_single, 'rows', channels=(8,), model=INFERENCE_MODELS, compiled=(False, True)),
+    Benchmark('infer_batch', setup_inference, run_infer_batch, 'rows', seconds=SIZES, channels=(8,), model=INFERENCE_MODELS, compiled=(False, True)),
+    # The simulated board has the armband's 8 EMG channels
+    Benchmark('realtime_loop', setup_realtime, run_realtime, 'windows', seconds=SIZES, model=('LogisticRegression',), policy=('block',)),
+]
@@ -0,0 +1,80 @@
+import os
+import json
+import numpy as np
+
+from emg.data_ingestion.config import SAMPLING_FREQ as EMG_SAMPLING_FREQ
+from eeg.config.settings import SAMPLING_FREQ as EEG_SAMPLING_FREQ, EPOCH_TIME, channel_position_config
+
+EMG_CHANNELS = [f'CH{idx}' for idx in range(1, 9)]
+EEG_CHANNELS = list(channel_position_config)
+N_GESTURES = 3
+
+
+def emg_electrode_config(n_channels):
+    # The first n_channels armband channels, in the layout of ELECTRODE_CONFIG
+    return {channel: idx < n_channels for idx, channel in enumerate(EMG_CHANNELS)}
+
+
+def synthetic_emg(seconds, n_channels=len(EMG_CHANNELS), fs=EMG_SAMPLING_FREQ, seed=0):
+    # Labelled (n_channels, n_samples) signal: gestures alternate every 2 s, each with its own per-channel gain,
+    # so models trained on it converge like on real captures
+    rng = np.random.default_rng(seed)
+    n_samples = int(seconds * fs)
+    labels = (np.arange(n_samples) // (2 * fs)) % N_GESTURES
+    gains = rng.uniform(5, 60, size=(N_GESTURES, n_channels))
+    signal = rng.normal(size=(n_channels, n_samples)) * gains[labels].T
+    return signal.astype(np.float32), labels
+
+
+def synthetic_eeg(seconds, n_channels=len(EEG_CHANNELS), fs=EEG_SAMPLING_FREQ, seed=0):
+    # Alpha and beta rhythms over pink-ish noise, in microvolts
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    noise = np.cumsum(rng.normal(size=(n_channels, t.size)), axis=-1) * 0.5
+    rhythms = 10 * np.sin(2 * np.pi * 10 * t + rng.uniform(0, 2 * np.pi, (n_channels, 1))) \
+        + 4 * np.sin(2 * np.pi * 20 * t + rng.uniform(0, 2 * np.pi, (n_channels, 1)))
+    return (noise - noise.mean(axis=-1, keepdims=True) + rhythms).astype(np.float32)
+
+
+def write_emg_csv(path, data):
+    # MindRove export layout: one header line, then ;-separated channel columns
+    with open(path, 'w') as handle:
+        handle.write('header\n')
+        handle.write(';'.join(EMG_CHANNELS[:data.shape[0]]) + '\n')
+        np.savetxt(handle, data.T, delimiter=';', fmt='%.6f')
+
+
+def write_eeg_json(path, data, fs=EEG_SAMPLING_FREQ, epoch_samples=int(EPOCH_TIME * EEG_SAMPLING_FREQ)):
+    # Neurosity rawUnfiltered layout, as written by collector_trial.py: {epoch index: {data, info, label}}
+    channel_names = EEG_CHANNELS[:data.shape[0]]
+    epochs = {}
+    for idx in range(data.shape[1] // epoch_samples):
+        epochs[str(idx)] = {
+            'data': data[:, idx * epoch_samples:(idx + 1) * epoch_samples].tolist(),
+            'info': {'channelNames': channel_names, 'samplingRate': fs, 'startTime': 1.7e12 + idx * EPOCH_TIME * 1000},
+            'label': 'rawUnfiltered'
+        }
+    with open(path, 'w') as handle:
+        json.dump(epochs, handle)
+
+
+class Workspace:
+    # Synthetic recordings for the benchmarks, generated once per (seconds, channels) and reused by every case
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, kind, seconds, n_channels, extension):
+        return os.path.join(self.directory, f'{kind}_{seconds}s_{n_channels}ch.{extension}')
+
+    def emg_csv(self, seconds, n_channels):
+        path = self.path('emg', seconds, n_channels, 'csv')
+        if not os.path.exists(path):
+            write_emg_csv(path, synthetic_emg(seconds, n_channels)[0])
+        return path
+
+    def eeg_json(self, seconds, n_channels):
+        path = self.path('eeg', seconds, n_channels, 'json')
+        if not os.path.exists(path):
+            write_eeg_json(path, synthetic_eeg(seconds, n_channels))
+        return path
@@ -0,0 +1,164 @@
+import os
+import re
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+
+import numpy as np
+
+RESULTS_VERSION = 1
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+METRICS = ('median_s', 'min_s', 'mean_s')
+
+
+def case_key(name, params):
+    return f"{name}[{','.join(f'{param}={value}' for param, value in params.items())}]"
+
+
+def git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import scipy
+    import pandas
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "pandas": pandas.__version__,
+        "scikit-learn": sklearn.__version__,
+        "commit": git_commit()
+    }
+
+
+def time_case(run, state, repeat=7, min_repeat=3, max_time=5.0, min_call_time=0.05):
+    # An untimed warm-up call also calibrates how many calls make up one timing, timeit-style, so sub-millisecond
+    # cases are not dominated by timer noise. Then at least min_repeat timings; stops at repeat timings or once
+    # max_time seconds have been spent, so slow cases (training, long recordings) keep the suite bounded.
+    start = time.perf_counter()
+    run(state)
+    number = max(int(min_call_time / max(time.perf_counter() - start, 1e-9)), 1)
+    times = []
+    while len(times) < repeat and (len(times) < min_repeat or sum(times) * number < max_time):
+        start = time.perf_counter()
+        for _ in range(number):
+            items = run(state)
+        times.append((time.perf_counter() - start) / number)
+    return times, items, number
+
+
+def summarise(times, items, unit, number=1):
+    median = statistics.median(times)
+    return {
+        "median_s": median,
+        "min_s": min(times),
+        "mean_s": statistics.fmean(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "repeats": len(times),
+        "calls_per_repeat": number,
+        "items": items,
+        "unit": unit,
+        "items_per_s": items / median if median else None
+    }
+
+
+def run_benchmarks(benchmarks, workspace, sizes, only=None, repeat=7, min_repeat=3, max_time=5.0, log=print):
+    # only is a regular expression matched against each case key, e.g. 'emg_features|infer_'
+    pattern = re.compile(only) if only else None
+    results, skipped, failed = {}, {}, {}
+    for benchmark in benchmarks:
+        for params in benchmark.params(sizes):
+            key = case_key(benchmark.name, params)
+            if pattern is not None and not pattern.search(key):
+                continue
+            # One case failing must not lose the others' results. A missing optional dependency (the mindrove SDK
+            # for realtime_loop) skips the case; anything else is recorded as a failure.
+            try:
+                state = benchmark.setup(workspace, **params)
+                times, items, number = time_case(benchmark.run, state, repeat, min_repeat, max_time)
+            except ImportError as error:
+                skipped[key] = str(error)
+                log(f"{key:<80} skipped: {error}")
+                continue
+            except Exception as error:
+                failed[key] = f'{type(error).__name__}: {error}'
+                log(f"{key:<80} failed: {failed[key]}")
+                continue
+            result = dict(summarise(times, items, benchmark.unit, number), case=benchmark.name, params=params)
+            if state.get('extra'):
+                result['extra'] = state['extra']
+            results[key] = result
+            log(f"{key:<80} {result['median_s'] * 1000:10.2f} ms  {result['items_per_s']:12.0f} {benchmark.unit}/s")
+    return {"version": RESULTS_VERSION, "created": time.strftime('%Y-%m-%dT%H:%M:%S'), "environment": environment(),
+            "argv": sys.argv, "results": results, "skipped": skipped, "failed": failed}
+
+
+def default_results_path(results):
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.strptime(results["created"], '%Y-%m-%dT%H:%M:%S'))
+    commit = results["environment"].get("commit")
+    return os.path.join(RESULTS_DIR, f'{stamp}-{commit}.json' if commit else f'{stamp}.json')
+
+
+def write_results(results, path=None):
+    path = path or default_results_path(results)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(results, handle, indent=2, default=float)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_results(path):
+    with open(path) as handle:
+        results = json.load(handle)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{path} has results version {results.get('version')}, expected {RESULTS_VERSION}.")
+    return results
+
+
+def compare(baseline, candidate, threshold=0.1, metric='median_s'):
+    # One row per case: (key, baseline seconds, candidate seconds, relative change, status). A case regresses
+    # when the candidate is more than threshold (0.1 = 10%) slower and improves when it is that much faster.
+    if metric not in METRICS:
+        raise ValueError(f"Metric {metric} not recognized. Choose one of {list(METRICS)}.")
+    if threshold < 0:
+        raise ValueError(f"Regression threshold must be non-negative, got {threshold}.")
+    base, new = baseline["results"], candidate["results"]
+    rows = []
+    for key in list(base) + [key for key in new if key not in base]:
+        if key not in new:
+            rows.append((key, base[key][metric], None, None, 'missing'))
+            continue
+        if key not in base:
+            rows.append((key, None, new[key][metric], None, 'new'))
+            continue
+        change = new[key][metric] / base[key][metric] - 1
+        status = 'regression' if change > threshold else 'improved' if change < -threshold else 'ok'
+        rows.append((key, base[key][metric], new[key][metric], change, status))
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'case':<80} {'baseline':>12} {'candidate':>12} {'change':>9}  status"]
+    for key, base, new, change, status in rows:
+        base_ms = f'{base * 1000:10.2f}ms' if base is not None else f"{'-':>12}"
+        new_ms = f'{new * 1000:10.2f}ms' if new is not None else f"{'-':>12}"
+        change_pct = f'{change:+9.1%}' if change is not None else f"{'-':>9}"
+        lines.append(f"{key:<80} {base_ms} {new_ms} {change_pct}  {status}")
+    counts = {status: sum(row[-1] == status for row in rows) for status in ('regression', 'improved', 'ok', 'new', 'missing')}
+    lines.append(', '.join(f'{count} {status}' for status, count in counts.items() if count))
+    return '\n'.join(lines)
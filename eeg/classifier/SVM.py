@@ -4,13 +4,18 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 
 from eeg.classifier.feature_extraction import extract_features_from_files
+from eeg.config.settings import FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES
+from utils.feature_store import FeatureStore
 
 
 freestyle_files = ['freestyling_1.json', 'freestyling_2.json', 'freestyling_3.json', 'freestyling_4.json']
 silent_files = ['eyes_open_silent_1.json', 'eyes_open_silent_2.json', 'eyes_open_silent_3.json', 'eyes_open_silent_4.json']
 
-all_freestyle_features = extract_features_from_files(freestyle_files)
-all_silent_features = extract_features_from_files(silent_files)
+# Features are cached by file content and config, so re-runs only pay for the model
+feature_store = FeatureStore(FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES)
+all_freestyle_features = extract_features_from_files(freestyle_files, feature_store=feature_store)
+all_silent_features = extract_features_from_files(silent_files, feature_store=feature_store)
+print("Feature cache:", feature_store.stats())
 
 # Create labels
 labels_freestyle = np.zeros(len(all_freestyle_features))  # 0 for eyes open
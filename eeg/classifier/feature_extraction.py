@@ -1,9 +1,12 @@
 import numpy as np
+from joblib import Parallel, delayed
 from scipy.signal import welch
 from scipy.stats import skew, kurtosis, entropy
-from eeg.config.settings import SAMPLING_FREQ, feature_config, WINDOW_LEN, OVERLAP
-from eeg.classifier.windowing import apply_window
-from eeg.classifier.preprocessing import preprocess_eeg
+from eeg.config.settings import SAMPLING_FREQ, feature_config, WINDOW_LEN, OVERLAP, preprocessing_config, electrode_config
+from eeg.classifier.windowing import apply_window, apply_window_strided, load_recording, count_windows
+from eeg.classifier.preprocessing import preprocess_eeg, fit_ica_stage
+from eeg.classifier.recording_cache import recording_source
+from utils.feature_store import to_feature_matrix
 
 
 def hjorth_parameters(eeg_data):
@@ -65,29 +68,184 @@ def extract_features_multi_channel(eeg_data_multi_channel, fs, config):
     return np.array(features)
 
 
-def extract_features_multi_channel(eeg_data_multi_channel, fs, config):
-    features = []
-    for channel_data in eeg_data_multi_channel:
-        channel_data = preprocess_eeg(channel_data, SAMPLING_FREQ)
-        channel_features = extract_frequency_features_eeg(channel_data, fs, config)
-        features.extend(channel_features)
-    return np.array(features)
+def extract_features_multi_channel(eeg_data_multi_channel, fs, config, ica=None):
+    eeg_data_multi_channel = preprocess_eeg(np.asarray(eeg_data_multi_channel), SAMPLING_FREQ, ica=ica)
+    return extract_features_batch(eeg_data_multi_channel[np.newaxis], fs, config)[0]
+
+
+def hjorth_parameters_batch(eeg_windows):
+    first_diff = np.diff(eeg_windows, axis=-1)
+    second_diff = np.diff(first_diff, axis=-1)
+    activity = np.var(eeg_windows, axis=-1)
+    mobility = np.sqrt(np.var(first_diff, axis=-1) / activity)
+    complexity = np.sqrt(np.var(second_diff, axis=-1) / np.var(first_diff, axis=-1)) / mobility
+    return activity, mobility, complexity
+
+
+def extract_features_batch(eeg_windows, fs, config):
+    # eeg_windows is (n_windows, n_channels, n_samples); one welch call covers every window and channel
+    eeg_windows = np.asarray(eeg_windows, dtype=float)
+    n_windows, n_channels = eeg_windows.shape[:2]
+    columns = []
+
+    if config["psd"]:
+        freqs, psd = welch(eeg_windows, fs, nperseg=min(fs * 2, eeg_windows.shape[-1]), axis=-1)
+        total_power = np.sum(psd, axis=-1)
+    else:
+        zeros = np.zeros((n_windows, n_channels))
+
+    if config["band_powers"]:
+        bands = {'delta': (0.5, 4), 'theta': (4, 8), 'alpha': (8, 13), 'beta': (13, 30), 'gamma': (30, 50)}
+        total_band_power = np.trapz(psd, freqs, axis=-1) if config["psd"] else None
+        for band, (low, high) in bands.items():
+            if config["psd"]:
+                mask = (freqs >= low) & (freqs <= high)
+                band_power = np.trapz(psd[..., mask], freqs[mask], axis=-1)
+                relative_power = np.divide(band_power, total_band_power, out=np.zeros_like(band_power), where=total_band_power != 0)
+                columns.extend([band_power, relative_power])
+                if config["peak_frequency"]:
+                    peak_freq = freqs[mask][np.argmax(psd[..., mask], axis=-1)] if mask.any() else zeros
+                    columns.append(peak_freq)
+            else:
+                columns.extend([zeros, zeros])
+                if config["peak_frequency"]:
+                    columns.append(zeros)
+
+    if config["spectral_entropy"]:
+        columns.append(entropy(psd, axis=-1) if config["psd"] else zeros)
+
+    if config["mean_median_frequency"]:
+        if config["psd"]:
+            mean_freq = np.sum(freqs * psd, axis=-1) / total_power
+            cumulative_power = np.cumsum(psd, axis=-1)
+            median_idx = np.argmax(cumulative_power >= cumulative_power[..., -1:] / 2, axis=-1)
+            columns.extend([mean_freq, freqs[median_idx]])
+        else:
+            columns.extend([zeros, zeros])
+
+    if config["bandwidth"]:
+        if config["psd"]:
+            significant = psd >= 0.5 * np.max(psd, axis=-1, keepdims=True)
+            first_idx = np.argmax(significant, axis=-1)
+            last_idx = psd.shape[-1] - 1 - np.argmax(significant[..., ::-1], axis=-1)
+            columns.append(freqs[last_idx] - freqs[first_idx])
+        else:
+            columns.append(zeros)
+
+    if config["hjorth_parameters"]:
+        columns.extend(hjorth_parameters_batch(eeg_windows))
+
+    if config["spectral_flatness"]:
+        columns.append(np.exp(np.mean(np.log(psd), axis=-1)) / np.mean(psd, axis=-1) if config["psd"] else zeros)
+
+    if config["statistical_features"]:
+        columns.extend([np.mean(eeg_windows, axis=-1), np.var(eeg_windows, axis=-1),
+                        skew(eeg_windows, axis=-1), kurtosis(eeg_windows, axis=-1)])
+
+    if not columns:
+        return np.empty((n_windows, 0))
+
+    # (n_windows, n_channels, n_features_per_channel) -> channel-major rows, matching extract_features_multi_channel
+    return np.stack(columns, axis=-1).reshape(n_windows, -1)
+
+
+def iter_equal_length_blocks(windows):
+    # A 3-D array, such as apply_window_strided's zero-copy view, is already one block and is passed on without
+    # copying. apply_window can return a list with a shorter final window, so batch runs of windows that share a shape.
+    if isinstance(windows, np.ndarray) and windows.ndim == 3:
+        if len(windows):
+            yield windows
+        return
+    start = 0
+    for end in range(1, len(windows) + 1):
+        if end == len(windows) or windows[end].shape != windows[start].shape:
+            yield np.array(windows[start:end])
+            start = end
+
+
+def fit_file_ica(filepath):
+    # The ICA stage is fitted once on the whole recording
+    if not preprocessing_config['ICA_artefacts']:
+        return None
+    return fit_ica_stage(np.asarray(load_recording(filepath), dtype=float), SAMPLING_FREQ)
+
+
+def load_windows(filepath, strided=False, start=0, stop=None):
+    # Only the samples of windows [start:stop] are read, so a chunk task costs its share of the file
+    if strided:
+        return apply_window_strided(WINDOW_LEN, OVERLAP, filepath, start=start, stop=stop)
+    return apply_window(WINDOW_LEN, OVERLAP, filepath, start=start, stop=stop)
+
+
+def plan_file(filepath, strided=False):
+    # The window count comes from the cache metadata; the ICA fit is the only pass over the whole recording
+    return count_windows(filepath, WINDOW_LEN, OVERLAP, strided), fit_file_ica(filepath)
 
 
-def extract_features_from_file(filepath):
-    eeg_data = apply_window(WINDOW_LEN, OVERLAP, filepath)
-    full_features = [extract_features_multi_channel(sample_channels, SAMPLING_FREQ, feature_config) for sample_channels in eeg_data]
+def extract_features_from_file(filepath, strided=False, ica=None, start=0, stop=None):
+    if ica is None:
+        ica = fit_file_ica(filepath)
+
+    eeg_data = load_windows(filepath, strided, start, stop)
+    full_features = []
+    for block in iter_equal_length_blocks(eeg_data):
+        block = preprocess_eeg(block, SAMPLING_FREQ, ica=ica)
+        full_features.extend(extract_features_batch(block, SAMPLING_FREQ, feature_config))
     return full_features
 
 
-def extract_features_from_files(file_list):
-    all_features = []
-    for file in file_list:
-        file_path = f'../files/unfiltered/{file}'
-        features = extract_features_from_file(file_path)
-        all_features.extend(features)
+def extract_features_per_file(file_paths, strided=False, n_jobs=1, chunk_size=512):
+    if n_jobs == 1:
+        return [extract_features_from_file(file_path, strided=strided) for file_path in file_paths]
+
+    # Fit each file's ICA stage once, then spread chunks of windows across the pool; Parallel keeps task order
+    plans = Parallel(n_jobs=n_jobs)(delayed(plan_file)(file_path, strided) for file_path in file_paths)
+    tasks = [(file_idx, delayed(extract_features_from_file)(file_path, strided, ica, start, min(start + chunk_size, n_windows)))
+             for file_idx, (file_path, (n_windows, ica)) in enumerate(zip(file_paths, plans))
+             for start in range(0, n_windows, chunk_size)]
+    chunk_features = Parallel(n_jobs=n_jobs)(task for _, task in tasks)
+
+    per_file = [[] for _ in file_paths]
+    for (file_idx, _), features in zip(tasks, chunk_features):
+        per_file[file_idx].extend(features)
+    return per_file
+
+
+# Part of every feature cache key; bump it whenever a change here alters the features computed from the same recording
+FEATURE_VERSION = 1
+
+
+def feature_cache_params(strided=False):
+    return {
+        "feature_version": FEATURE_VERSION,
+        "feature_config": feature_config,
+        "preprocessing_config": preprocessing_config,
+        "electrode_config": electrode_config,
+        "win_len": WINDOW_LEN,
+        "overlap": OVERLAP,
+        "sampling_freq": SAMPLING_FREQ,
+        "strided": strided
+    }
+
+
+def extract_features_from_files(file_list, file_loc='../files/unfiltered', strided=False, n_jobs=1, chunk_size=512, feature_store=None):
+    file_paths = [f'{file_loc}/{file}' for file in file_list]
+
+    if feature_store is None:
+        per_file = extract_features_per_file(file_paths, strided, n_jobs, chunk_size)
+        return [features for file_features in per_file for features in file_features]
+
+    # Serve cache hits straight from the store and only extract the files that missed
+    params = feature_cache_params(strided)
+    keys = [feature_store.make_key(recording_source(file_path), **params) for file_path in file_paths]
+    matrices = [feature_store.get(key) for key in keys]
+    missing = [idx for idx, matrix in enumerate(matrices) if matrix is None]
+
+    computed = extract_features_per_file([file_paths[idx] for idx in missing], strided, n_jobs, chunk_size)
+    for idx, features in zip(missing, computed):
+        matrices[idx] = feature_store.put(keys[idx], to_feature_matrix(features))
 
-    return all_features
+    return [features for matrix in matrices for features in matrix]
 
 
 if __name__ == '__main__':
@@ -1,39 +1,194 @@
+import warnings
 import numpy as np
-from scipy.signal import butter, filtfilt
-from scipy.signal import iirnotch
+from scipy.signal import butter, sosfilt, sosfilt_zi, sosfiltfilt
+from scipy.signal import iirnotch, tf2sos
 from sklearn.decomposition import FastICA
 from scipy.signal import resample
+from scipy.stats import kurtosis
 from eeg.config.settings import preprocessing_config as config
 from eeg.config.settings import SAMPLING_FREQ, DOWNSAMPLE_FREQ
 
+
+class FilterBank:
+    def __init__(self):
+        self.designs = {}
+
+    def design(self, filter_type, params, fs):
+        # Each (type, params, fs) is designed once and kept in second-order sections
+        key = (filter_type, params, fs)
+        if key not in self.designs:
+            nyquist = 0.5 * fs
+            if filter_type == 'bandpass':
+                lowcut, highcut, order = params
+                sos = butter(order, [lowcut / nyquist, highcut / nyquist], btype='band', output='sos')
+            elif filter_type == 'notch':
+                notch_freq, quality_factor = params
+                b, a = iirnotch(notch_freq / nyquist, quality_factor)
+                sos = tf2sos(b, a)
+            elif filter_type == 'cascade':
+                sos = np.vstack([self.design(*stage, fs) for stage in params])
+            else:
+                raise ValueError(f"Filter type {filter_type} not recognized. Choose 'bandpass', 'notch' or 'cascade'.")
+            self.designs[key] = sos
+        return self.designs[key]
+
+    def bandpass(self, lowcut, highcut, fs, order=5):
+        return self.design('bandpass', (lowcut, highcut, order), fs)
+
+    def notch(self, notch_freq, fs, quality_factor=30):
+        return self.design('notch', (notch_freq, quality_factor), fs)
+
+    def cascade(self, stages, fs):
+        return self.design('cascade', tuple(stages), fs)
+
+    def apply(self, data, stages, fs):
+        # Filters a whole (..., n_samples) block, e.g. (n_windows, n_channels, n_samples), in one call
+        return sosfiltfilt(self.cascade(stages, fs), data, axis=-1)
+
+
+filter_bank = FilterBank()
+
+
+class StreamingFilter:
+    def __init__(self, sos, n_channels):
+        self.sos = sos
+        self.n_channels = n_channels
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def initial_conditions(self, first_samples):
+        # Steady-state conditions for each channel's first sample, so a DC offset does not ring at start-up
+        return sosfilt_zi(self.sos)[:, np.newaxis, :] * first_samples[np.newaxis, :, np.newaxis]
+
+    def process(self, chunk):
+        # chunk is (n_channels, n_samples); the per-channel filter state carries over to the next chunk
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.shape[-1] == 0:
+            return chunk
+        if self.zi is None:
+            self.zi = self.initial_conditions(chunk[:, 0])
+        filtered, self.zi = sosfilt(self.sos, chunk, axis=-1, zi=self.zi)
+        return filtered
+
+
+def streaming_preprocessor(n_channels, fs=SAMPLING_FREQ):
+    return StreamingFilter(filter_bank.cascade(preprocessing_filter_stages(fs), fs), n_channels)
+
+
+def streaming_callback(callback, n_channels, fs=SAMPLING_FREQ):
+    # Wraps a Neurosity raw-epoch callback so it receives every epoch bandpass/notch filtered, with the filter
+    # state carried from one epoch to the next instead of re-filtering each one from scratch
+    stream = streaming_preprocessor(n_channels, fs)
+
+    def filtered(epoch):
+        callback(dict(epoch, data=stream.process(epoch['data'])))
+
+    return filtered
+
+
+def causal_filter(data, fs=SAMPLING_FREQ):
+    # Offline counterpart of streaming_preprocessor: one causal pass over a whole (n_channels, n_samples) recording
+    stream = streaming_preprocessor(data.shape[0], fs)
+    return stream.process(data)
+
+
+def preprocessing_filter_stages(fs=SAMPLING_FREQ):
+    stages = []
+    if config['bandpass']:
+        stages.append(('bandpass', (0.5, 50.0, 5)))
+
+    # Notch filter to remove power line noise at 60Hz
+    if config['notch']:
+        stages.append(('notch', (60.0, 30)))
+    return stages
+
+
 def bandpass_filter(data, lowcut, highcut, fs, order=5):
-    nyquist = 0.5 * fs
-    low = lowcut / nyquist
-    high = highcut / nyquist
-    b, a = butter(order, [low, high], btype='band')
-    return filtfilt(b, a, data)
+    return sosfiltfilt(filter_bank.bandpass(lowcut, highcut, fs, order), data, axis=-1)
 
 
 def notch_filter(data, notch_freq, fs, quality_factor=30):
-    nyquist = 0.5 * fs
-    notch_freq = notch_freq / nyquist
-    b, a = iirnotch(notch_freq, quality_factor)
-    return filtfilt(b, a, data)
+    return sosfiltfilt(filter_bank.notch(notch_freq, fs, quality_factor), data, axis=-1)
 
 
 def baseline_correction(data):
-    mean_value = np.mean(data)
+    mean_value = np.mean(data, axis=-1, keepdims=True)
     return data - mean_value
 
 
-def remove_artifacts_ica(data, n_components=None):
-    ica = FastICA(n_components=n_components, random_state=0)
-    sources = ica.fit_transform(data.reshape(-1, 1))  # Reconstruct signals
-    components = ica.mixing_
-    # Here you would need to identify and remove the artifact components manually or via an algorithm.
-    # For simplicity, let's assume we are retaining all components.
-    reconstructed_signal = np.dot(sources, components.T)
-    return reconstructed_signal.reshape(len(reconstructed_signal))
+class ICAStage:
+    def __init__(self, n_components=None, reject_components=None, random_state=0):
+        # reject_components(sources, stage) returns the indices of the components to drop
+        self.n_components = n_components
+        self.reject_components = reject_components
+        self.random_state = random_state
+        self.mean_ = None
+        self.unmixing_ = None
+        self.mixing_ = None
+        self.projection_ = None
+        self.rejected_ = []
+
+    def fit(self, data):
+        # data is the full (n_channels, n_samples) recording
+        ica = FastICA(n_components=self.n_components, whiten='unit-variance', random_state=self.random_state)
+        sources = ica.fit_transform(np.asarray(data, dtype=float).T).T
+
+        self.mean_ = ica.mean_
+        self.unmixing_ = ica.components_
+        self.mixing_ = ica.mixing_
+        self.rejected_ = sorted(self.reject_components(sources, self)) if self.reject_components else []
+        self.projection_ = self.build_projection()
+        return self
+
+    def build_projection(self):
+        # Unmix, drop the rejected components and remix, folded into one (n_channels, n_channels) matrix
+        keep = np.setdiff1d(np.arange(self.unmixing_.shape[0]), self.rejected_)
+        return self.mixing_[:, keep] @ self.unmixing_[keep]
+
+    def apply(self, data):
+        # Works on (n_channels, n_samples) or (n_windows, n_channels, n_samples) with a single matmul
+        mean = self.mean_[:, np.newaxis]
+        return np.matmul(self.projection_, data - mean) + mean
+
+    def save(self, path):
+        np.savez(path, mean=self.mean_, unmixing=self.unmixing_, mixing=self.mixing_, rejected=np.array(self.rejected_, dtype=int))
+
+    @classmethod
+    def load(cls, path):
+        stored = np.load(path)
+        stage = cls()
+        stage.mean_ = stored['mean']
+        stage.unmixing_ = stored['unmixing']
+        stage.mixing_ = stored['mixing']
+        stage.rejected_ = stored['rejected'].tolist()
+        stage.projection_ = stage.build_projection()
+        return stage
+
+
+def kurtosis_rejection(threshold=5.0):
+    # Example rejection hook: blinks and muscle bursts show up as components with very peaky distributions
+    def reject(sources, stage):
+        return np.flatnonzero(np.abs(kurtosis(sources, axis=-1)) > threshold).tolist()
+    return reject
+
+
+def fit_ica_stage(recording, fs, n_components=None, reject_components=None):
+    # Fit once on the whole recording, preprocessed the same way as the windows it will be applied to
+    data = recording
+    stages = preprocessing_filter_stages(fs)
+    if stages:
+        data = filter_bank.apply(data, stages, fs)
+    if config['baseline_correction']:
+        data = baseline_correction(data)
+    if config['z_score']:
+        data = zscore_normalization(data)
+    return ICAStage(n_components=n_components, reject_components=reject_components).fit(data)
+
+
+def remove_artifacts_ica(data, ica):
+    return ica.apply(data)
 
 
 def epoching(data, epoch_length, fs):
@@ -44,24 +199,23 @@ def epoching(data, epoch_length, fs):
 
 
 def zscore_normalization(data):
-    mean = np.mean(data)
-    std = np.std(data)
+    mean = np.mean(data, axis=-1, keepdims=True)
+    std = np.std(data, axis=-1, keepdims=True)
     return (data - mean) / std
 
 
 def downsample(data, original_fs, target_fs):
-    num_samples = int(len(data) * target_fs / original_fs)
-    return resample(data, num_samples)
+    num_samples = int(data.shape[-1] * target_fs / original_fs)
+    return resample(data, num_samples, axis=-1)
 
 
-def preprocess_eeg(data, fs):
-    # Apply bandpass filter
-    if config['bandpass']:
-        data = bandpass_filter(data, lowcut=0.5, highcut=50.0, fs=fs, order=5)
-
-    # Apply notch filter to remove power line noise at 60Hz
-    if config['notch']:
-        data = notch_filter(data, notch_freq=60.0, fs=fs)
+def preprocess_eeg(data, fs, ica=None):
+    # data can be a single channel or a (..., n_samples) block; every step works along the last axis
+    # ica is a fitted ICAStage and needs (..., n_channels, n_samples) data
+    # Apply bandpass and notch filters as one cascade of second-order sections
+    stages = preprocessing_filter_stages(fs)
+    if stages:
+        data = filter_bank.apply(data, stages, fs)
 
     # Apply baseline correction
     if config['baseline_correction']:
@@ -73,10 +227,17 @@ def preprocess_eeg(data, fs):
 
     # Apply ICA for artifact removal
     if config['ICA_artefacts']:
-        data = remove_artifacts_ica(data, n_components=None)
+        if ica is not None:
+            data = remove_artifacts_ica(data, ica)
+        else:
+            # The stage has to be fitted on a whole recording (fit_ica_stage), so a window alone cannot apply it;
+            # warn rather than quietly preprocess differently from preprocessing_config
+            warnings.warn("preprocessing_config enables ICA_artefacts but no fitted ICAStage was passed; "
+                          "ICA artefact removal is skipped.", RuntimeWarning, stacklevel=2)
 
     # Downsample the data to reduce computational load
     if config['downsample']:
         data = downsample(data, original_fs=SAMPLING_FREQ, target_fs=DOWNSAMPLE_FREQ)
 
     return data
+
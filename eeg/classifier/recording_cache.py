@@ -0,0 +1,142 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from eeg.config.settings import RECORDING_CACHE_DIR, SAMPLING_FREQ
+
+CACHE_VERSION = 1
+
+
+def cache_paths(json_path, cache_dir=RECORDING_CACHE_DIR):
+    # Cached recordings live next to the JSON in a .cache/ folder unless RECORDING_CACHE_DIR is set. A shared
+    # cache_dir holds recordings from many folders, so there the name also carries a hash of the JSON's path.
+    directory, filename = os.path.split(os.path.abspath(json_path))
+    stem = os.path.splitext(filename)[0]
+    if cache_dir is None:
+        cache_dir = os.path.join(directory, '.cache')
+    else:
+        stem = f'{stem}-{hashlib.sha256(os.path.abspath(json_path).encode()).hexdigest()[:12]}'
+    return os.path.join(cache_dir, f'{stem}.npy'), os.path.join(cache_dir, f'{stem}.meta.json')
+
+
+def source_signature(json_path):
+    stat = os.stat(json_path)
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns}
+
+
+def write_recording_cache(data, metadata, data_path, meta_path):
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    # Write to temporary files first so a crash never leaves a half-written cache behind
+    tmp_data_path = f'{data_path}.tmp'
+    with open(tmp_data_path, 'wb') as handle:
+        np.save(handle, np.ascontiguousarray(data, dtype=np.float32))
+    os.replace(tmp_data_path, data_path)
+    write_cache_metadata(metadata, meta_path)
+
+
+def write_recording_cache_blocks(blocks, shape, metadata, data_path, meta_path):
+    # Same layout as write_recording_cache, filled from (n_channels, n_samples) blocks in sample order so the
+    # whole recording never has to be in memory at once
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    tmp_data_path = f'{data_path}.tmp'
+    data = np.lib.format.open_memmap(tmp_data_path, mode='w+', dtype=np.float32, shape=shape)
+    start = 0
+    for block in blocks:
+        data[:, start:start + block.shape[1]] = block
+        start += block.shape[1]
+    data.flush()
+    del data
+    os.replace(tmp_data_path, data_path)
+    write_cache_metadata(metadata, meta_path)
+
+
+def write_cache_metadata(metadata, meta_path):
+    tmp_meta_path = f'{meta_path}.tmp'
+    with open(tmp_meta_path, 'w') as handle:
+        json.dump(dict(metadata, version=CACHE_VERSION), handle)
+    os.replace(tmp_meta_path, meta_path)
+
+
+def read_recording_cache(data_path, meta_path, mmap_mode='r'):
+    with open(meta_path) as handle:
+        metadata = json.load(handle)
+    data = np.load(data_path, mmap_mode=mmap_mode)
+    return data, metadata
+
+
+def convert_recording(json_path, cache_dir=RECORDING_CACHE_DIR):
+    with open(json_path) as handle:
+        raw = json.loads(handle.read())
+
+    epochs = list(raw.values())
+    if epochs:
+        # (n_epochs, n_channels, epoch_samples) -> columnar (n_channels, n_samples)
+        stacked = np.array([epoch['data'] for epoch in epochs], dtype=np.float32)
+        data = stacked.transpose(1, 0, 2).reshape(stacked.shape[1], -1)
+        info = epochs[0].get('info', {})
+        epoch_samples = stacked.shape[2]
+    else:
+        data = np.empty((0, 0), dtype=np.float32)
+        info = {}
+        epoch_samples = 0
+
+    metadata = {
+        'sampling_rate': info.get('samplingRate', SAMPLING_FREQ),
+        'channel_names': info.get('channelNames', []),
+        'epoch_samples': epoch_samples,
+        'start_times': [epoch.get('info', {}).get('startTime') for epoch in epochs],
+        **source_signature(json_path)
+    }
+
+    data_path, meta_path = cache_paths(json_path, cache_dir)
+    write_recording_cache(data, metadata, data_path, meta_path)
+    return data_path, meta_path
+
+
+def is_cache_stale(json_path, cache_dir=RECORDING_CACHE_DIR):
+    data_path, meta_path = cache_paths(json_path, cache_dir)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return True
+
+    with open(meta_path) as handle:
+        metadata = json.load(handle)
+
+    if metadata.get('version') != CACHE_VERSION:
+        return True
+    if metadata.get('source') == 'stream' and not os.path.exists(json_path):
+        # Written by the streaming collector and there is no JSON to compare against. Once a JSON does appear,
+        # the signature check below finds the stream cache stale and the JSON is converted instead.
+        return False
+    signature = source_signature(json_path)
+    return any(metadata.get(key) != value for key, value in signature.items())
+
+
+def recording_source(json_path, cache_dir=RECORDING_CACHE_DIR):
+    # The file whose content identifies a recording: its JSON, or the cached samples for a session that only
+    # exists as a streamed cache (stream_to_recording_cache writes no JSON)
+    if os.path.exists(json_path):
+        return json_path
+    data_path, _ = cache_paths(json_path, cache_dir)
+    if os.path.exists(data_path):
+        return data_path
+    raise FileNotFoundError(f"No recording at {json_path} and no cached copy at {data_path}.")
+
+
+def load_cached_recording(json_path, cache_dir=RECORDING_CACHE_DIR, mmap_mode='r'):
+    # Returns a memory-mapped float32 (n_channels, n_samples) array and its metadata, re-parsing the JSON only when stale
+    if is_cache_stale(json_path, cache_dir):
+        convert_recording(json_path, cache_dir)
+    return read_recording_cache(*cache_paths(json_path, cache_dir), mmap_mode=mmap_mode)
+
+
+if __name__ == '__main__':
+    import glob
+
+    for path in glob.glob('../files/unfiltered/*.json'):
+        if is_cache_stale(path):
+            convert_recording(path)
+        data, metadata = load_cached_recording(path)
+        print(f"{path}: {data.shape[0]} channels x {data.shape[1]} samples @ {metadata['sampling_rate']} Hz")
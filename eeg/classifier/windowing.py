@@ -1,19 +1,17 @@
-import json
 import numpy as np
 from math import ceil
-from eeg.config.settings import channel_position_config, EPOCH_TIME, electrode_config
+from numpy.lib.stride_tricks import sliding_window_view
+from eeg.classifier.recording_cache import load_cached_recording
+from eeg.config.settings import channel_position_config, EPOCH_TIME, electrode_config, WINDOW_LEN, OVERLAP, SAMPLING_FREQ
 
 
 electrode_list = [channel_position_config[k] for k, v in electrode_config.items() if v]
 
-def apply_window(win_len, overlap, filepath):
-    with open(filepath) as handle:
-        raw_original = json.loads(handle.read())
-        raw = []
-        for k, v in raw_original.items():
-            raw.append(v)
-
-    NO_EPOCHS = len(raw)
+def window_segments(n_epochs, win_len=WINDOW_LEN, overlap=OVERLAP):
+    # (start_epoch, end_epoch) of every window apply_window returns; needs only the epoch count
+    if n_epochs == 0:
+        return []
+    NO_EPOCHS = n_epochs
     TOTAL_SAMPLE_TIME = NO_EPOCHS * EPOCH_TIME
     WINDOW_RATIO = win_len / TOTAL_SAMPLE_TIME
     WINDOW_EPOCHS = WINDOW_RATIO * NO_EPOCHS
@@ -21,20 +19,80 @@ def apply_window(win_len, overlap, filepath):
     NON_OVERLAP_EPOCHS = (1 - overlap) * WINDOW_EPOCHS
     ITERS = ceil(NO_EPOCHS - OVERLAP_EPOCHS) / (WINDOW_EPOCHS - OVERLAP_EPOCHS)
 
-    windowing_output = []
+    segments = []
     for i in range(0, ceil(ITERS)):
-        sample_output = [[] for i in range(len(electrode_list))]
-
         start_seg = int(i * NON_OVERLAP_EPOCHS)
         end_seg = min(int(i * NON_OVERLAP_EPOCHS) + int(WINDOW_EPOCHS), NO_EPOCHS)
-        first_sample = raw[start_seg:end_seg]
+        segments.append((start_seg, end_seg))
+    return segments
 
-        for k in range(len(first_sample)):
-            for idx, electrode in enumerate(electrode_list):
-                channel = first_sample[k]['data'][electrode]
-                sample_output[idx].extend(channel)
 
-        output = np.array(sample_output)
+def apply_window(win_len, overlap, filepath, start=0, stop=None):
+    # Windows [start:stop]; only their slices are read from the memory-mapped cache
+    data, metadata = load_cached_recording(filepath)
+    epoch_samples = metadata['epoch_samples']
+
+    windowing_output = []
+    for start_seg, end_seg in window_segments(len(metadata['start_times']), win_len, overlap)[start:stop]:
+        output = np.array(data[electrode_list, start_seg * epoch_samples:end_seg * epoch_samples], dtype=float)
         windowing_output.append(output)
 
     return windowing_output
+
+
+def select_electrodes(data):
+    # Selecting every electrode in order keeps the memory-mapped array as is; any other selection copies those rows
+    if electrode_list == list(range(data.shape[0])):
+        return data
+    return np.ascontiguousarray(data[electrode_list])
+
+
+def load_recording(filepath):
+    data, metadata = load_cached_recording(filepath)
+    if data.size == 0:
+        return np.empty((len(electrode_list), 0), dtype=np.float32)
+    return select_electrodes(data)
+
+
+def window_geometry(win_len=WINDOW_LEN, overlap=OVERLAP, fs=SAMPLING_FREQ):
+    window_samples = int(win_len * fs)
+    return window_samples, max(int(round((1 - overlap) * window_samples)), 1)
+
+
+def sliding_windows(data, win_len=WINDOW_LEN, overlap=OVERLAP, fs=SAMPLING_FREQ):
+    # Returns a read-only (n_windows, n_channels, window_samples) view of data; overlapping windows share memory
+    window_samples, hop_samples = window_geometry(win_len, overlap, fs)
+
+    if data.shape[-1] < window_samples:
+        return np.empty((0, data.shape[0], window_samples), dtype=data.dtype)
+
+    windows = sliding_window_view(data, window_samples, axis=-1)[:, ::hop_samples]
+    return windows.transpose(1, 0, 2)
+
+
+def count_strided_windows(n_samples, win_len=WINDOW_LEN, overlap=OVERLAP, fs=SAMPLING_FREQ):
+    window_samples, hop_samples = window_geometry(win_len, overlap, fs)
+    return 0 if n_samples < window_samples else (n_samples - window_samples) // hop_samples + 1
+
+
+def apply_window_strided(win_len, overlap, filepath, fs=SAMPLING_FREQ, start=0, stop=None):
+    if start == 0 and stop is None:
+        return sliding_windows(load_recording(filepath), win_len, overlap, fs)
+
+    # Windows [start:stop] only: read the samples they span from the cache and window those
+    data, _ = load_cached_recording(filepath)
+    window_samples, hop_samples = window_geometry(win_len, overlap, fs)
+    indices = range(count_strided_windows(data.shape[-1], win_len, overlap, fs))[start:stop]
+    if len(indices) == 0:
+        return np.empty((0, len(electrode_list), window_samples), dtype=data.dtype)
+    first_sample = indices[0] * hop_samples
+    last_sample = indices[-1] * hop_samples + window_samples
+    return sliding_windows(select_electrodes(data[:, first_sample:last_sample]), win_len, overlap, fs)
+
+
+def count_windows(filepath, win_len=WINDOW_LEN, overlap=OVERLAP, strided=False, fs=SAMPLING_FREQ):
+    # From the cache's shape and metadata alone, without reading any samples
+    data, metadata = load_cached_recording(filepath)
+    if strided:
+        return count_strided_windows(data.shape[-1], win_len, overlap, fs)
+    return len(window_segments(len(metadata['start_times']), win_len, overlap))
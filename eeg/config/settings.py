@@ -11,6 +11,11 @@ OVERLAP = 0.5
 EPOCH_TIME = 0.0625
 SAMPLING_FREQ = 256
 DOWNSAMPLE_FREQ = 128
+RECORDING_CACHE_DIR = None  # None caches next to each JSON recording in a .cache/ folder
+
+# Content-addressed EEG feature cache (see utils/feature_store.py)
+FEATURE_CACHE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '.feature_cache', 'eeg'))
+FEATURE_CACHE_MAX_BYTES = 2 * 1024 ** 3
 
 kinesis_setting = {
     'sensitivity': {
@@ -1,54 +1,53 @@
-from neurosity import NeurositySDK
 from dotenv import load_dotenv
 import time
-import os
-import json
-from eeg.scripts.utils import convert_timestamp_ms_to_time
+from eeg.config.settings import SAMPLING_FREQ, channel_position_config
+from eeg.classifier.preprocessing import streaming_callback
+from eeg.scripts.utils import convert_timestamp_ms_to_time, connect_neurosity, SignalMonitor
+from eeg.scripts.stream_recorder import StreamRecorder, read_stream, stream_to_recording_cache
 
 load_dotenv()
 
 #  Inputs
 TITLE = 'ChillinLikaVillain'
 TOTALTIME = 30
+MONITOR_INTERVAL = 5  # seconds between signal-quality printouts
 
-# Logging into Neurosity
-neurosity = NeurositySDK({
-    "device_id": os.getenv("NEUROSITY_DEVICE_ID"),
-})
-
-neurosity.login({
-    "email": os.getenv("NEUROSITY_EMAIL"),
-    "password": os.getenv("NEUROSITY_PASSWORD")
-})
-
-data_returned = {}
-
-index = 0
-
-
-def callback(data):
-    global index
-    data_returned[index] = data
-    print("data: ", data)
-    index += 1
+# Logging into Neurosity (or replaying a recording when NEUROSITY_SIMULATOR is set)
+neurosity = connect_neurosity()
 
+# Epochs are appended to ../files/unfiltered/{TITLE}.f32 (+ .ts.f64) as they arrive; the callback only copies
+recorder = StreamRecorder(f'../files/unfiltered/{TITLE}')
 
 start_time_milliseconds = time.time() * 1000
 start_datetime = convert_timestamp_ms_to_time(start_time_milliseconds)
-unsubscribe = neurosity.brainwaves_raw_unfiltered(callback)
-
-time.sleep(TOTALTIME)
+unsubscribe = neurosity.brainwaves_raw_unfiltered(recorder.callback)
+
+# A second subscription feeds the live signal-quality readout through the streaming filters; the recording stays raw
+monitor = SignalMonitor(channel_position_config)
+unsubscribe_monitor = neurosity.brainwaves_raw_unfiltered(streaming_callback(monitor.update, len(channel_position_config), SAMPLING_FREQ))
+
+try:
+    end_time = time.time() + TOTALTIME
+    while time.time() < end_time:
+        time.sleep(min(MONITOR_INTERVAL, max(end_time - time.time(), 0)))
+        if monitor.epochs:
+            print(f"Filtered RMS (uV): {monitor.summary()}")
+finally:
+    unsubscribe_monitor()
+    unsubscribe()
+    metadata = recorder.close()
 
-unsubscribe()
 end_time_milliseconds = time.time() * 1000
 end_datetime = convert_timestamp_ms_to_time(end_time_milliseconds)
 
-with open(f'../files/unfiltered/{TITLE}.json', 'w') as json_file:
-    json.dump(data_returned, json_file, indent=4)
-
-first_sample_time = convert_timestamp_ms_to_time(data_returned[0]['info']['startTime'])
-last_sample_time = convert_timestamp_ms_to_time(data_returned[len(data_returned) - 1]['info']['startTime'])
+# Also store the session in the recording-cache layout, so the classifier loads it as ../files/unfiltered/{TITLE}.json
+stream_to_recording_cache(f'../files/unfiltered/{TITLE}', f'../files/unfiltered/{TITLE}.json')
 
-print(f"Start of Code Time: {start_datetime}\nFirst Sample Time: {first_sample_time}\nLast Sample Time: {last_sample_time}\nEnd of Code Time: {end_datetime}")
+_, start_times, _ = read_stream(f'../files/unfiltered/{TITLE}')
+if len(start_times):
+    first_sample_time = convert_timestamp_ms_to_time(start_times[0])
+    last_sample_time = convert_timestamp_ms_to_time(start_times[-1])
+    print(f"Start of Code Time: {start_datetime}\nFirst Sample Time: {first_sample_time}\nLast Sample Time: {last_sample_time}\nEnd of Code Time: {end_datetime}")
+print(f"Recorded {metadata['n_epochs']} epochs ({metadata['dropped_epochs']} dropped)")
 
 print()
@@ -1,18 +1,10 @@
-from neurosity import NeurositySDK
 from dotenv import load_dotenv
-import os
+from eeg.scripts.utils import connect_neurosity
 
 load_dotenv()
 
-# Logging into Neurosity
-neurosity = NeurositySDK({
-    "device_id": os.getenv("NEUROSITY_DEVICE_ID"),
-})
-
-neurosity.login({
-    "email": os.getenv("NEUROSITY_EMAIL"),
-    "password": os.getenv("NEUROSITY_PASSWORD")
-})
+# Logging into Neurosity (or replaying a recording when NEUROSITY_SIMULATOR is set)
+neurosity = connect_neurosity()
 
 LEFT_THRESH = 0.75
 RIGHT_THRESH = 0.75
@@ -0,0 +1,97 @@
+import time
+import threading
+import numpy as np
+
+from eeg.config.settings import SAMPLING_FREQ, EPOCH_TIME, channel_position_config
+from eeg.classifier.recording_cache import load_cached_recording
+from emg.realtime.simulator import ReplayClock
+
+
+class SimulatedNeurosity:
+    # Stand-in for NeurositySDK: replays a (n_channels, n_samples) recording through the callback API the EEG
+    # scripts use. Raw subscriptions emit one epoch per callback; calm/focus/kinesis emit a seeded random walk.
+    def __init__(self, recording, sampling_rate=SAMPLING_FREQ, epoch_samples=int(EPOCH_TIME * SAMPLING_FREQ),
+                 channel_names=None, speed=1.0, jitter_ms=0.0, packet_loss=0.0, loop=True, seed=None, metric_rate=4.0):
+        self.recording = np.asarray(recording, dtype=np.float64)
+        self.sampling_rate = sampling_rate
+        self.epoch_samples = epoch_samples
+        self.channel_names = channel_names if channel_names is not None else list(channel_position_config)
+        self.replay = dict(speed=speed, jitter_ms=jitter_ms, packet_loss=packet_loss)
+        self.loop = loop
+        self.seed = seed
+        self.metric_rate = metric_rate
+        self.n_epochs = self.recording.shape[1] // epoch_samples
+
+    def login(self, credentials=None):
+        pass
+
+    def brainwaves_raw_unfiltered(self, callback):
+        return self.subscribe(callback, ReplayClock(self.sampling_rate, self.epoch_samples, seed=self.seed, **self.replay), self.epoch)
+
+    def brainwaves_raw(self, callback):
+        return self.brainwaves_raw_unfiltered(callback)
+
+    def calm(self, callback):
+        return self.subscribe_metric(callback, 'awareness', 'calm', 'probability')
+
+    def focus(self, callback):
+        return self.subscribe_metric(callback, 'awareness', 'focus', 'probability')
+
+    def kinesis(self, label, callback):
+        return self.subscribe_metric(callback, 'kinesis', label, 'confidence')
+
+    def epoch(self, epoch_idx, clock):
+        if not self.loop and epoch_idx >= self.n_epochs:
+            return None
+        start = (epoch_idx % self.n_epochs) * self.epoch_samples
+        return {
+            'data': self.recording[:, start:start + self.epoch_samples].tolist(),
+            'info': {
+                'startTime': float(clock.sample_time(epoch_idx * self.epoch_samples)) * 1000,
+                'samplingRate': self.sampling_rate,
+                'channelNames': self.channel_names,
+                'notchFrequency': '60Hz'
+            },
+            'label': 'raw'
+        }
+
+    def subscribe_metric(self, callback, metric, label, field):
+        rng = np.random.default_rng(self.seed)
+        level = [0.5]
+
+        def event(idx, clock):
+            level[0] = float(np.clip(level[0] + rng.normal(0, 0.05), 0, 1))
+            return {field: level[0], 'metric': metric, 'label': label, 'timestamp': float(clock.sample_time(idx)) * 1000}
+
+        return self.subscribe(callback, ReplayClock(self.metric_rate, 1, seed=self.seed, **self.replay), event)
+
+    def subscribe(self, callback, clock, make_event):
+        # One delivery thread per subscription; returns the unsubscribe function like the SDK
+        stop_event = threading.Event()
+
+        def deliver():
+            clock.start()
+            while not stop_event.is_set():
+                for idx in clock.due_packets():
+                    event = make_event(idx, clock)
+                    if event is None:
+                        return
+                    callback(event)
+                stop_event.wait(max(clock.next_arrival() - time.time(), 0))
+
+        thread = threading.Thread(target=deliver, name='neurosity-simulator', daemon=True)
+        thread.start()
+
+        def unsubscribe():
+            stop_event.set()
+            if thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+
+        return unsubscribe
+
+
+def simulated_neurosity(json_path, **kwargs):
+    # Headset replaying one of the recordings in eeg/files; kwargs go to SimulatedNeurosity (speed, jitter_ms, ...)
+    data, metadata = load_cached_recording(json_path)
+    return SimulatedNeurosity(data, sampling_rate=metadata['sampling_rate'], channel_names=metadata['channel_names'] or None,
+                              epoch_samples=metadata['epoch_samples'] or int(EPOCH_TIME * SAMPLING_FREQ), **kwargs)
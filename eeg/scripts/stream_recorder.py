@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import queue
+import threading
+import numpy as np
+
+from eeg.config.settings import SAMPLING_FREQ, EPOCH_TIME, RECORDING_CACHE_DIR, channel_position_config
+from eeg.classifier.recording_cache import cache_paths, write_recording_cache_blocks
+
+STREAM_VERSION = 1
+
+
+def stream_paths(path):
+    # Epoch samples (float32, epoch-major), epoch start times (float64, ms) and the JSON sidecar
+    return f'{path}.f32', f'{path}.ts.f64', f'{path}.meta.json'
+
+
+class StreamRecorder:
+    # Neurosity callbacks copy each epoch into a preallocated block; full blocks go to a writer thread that appends
+    # them to disk and fsyncs every fsync_interval seconds, so memory stays bounded and a crash loses seconds, not
+    # the session. A block that has not filled within fsync_interval is handed over part-full. The metadata is
+    # written up front and its epoch count refreshed on every fsync, so read_stream works on a crashed session.
+    # If a write fails, later epochs are counted as dropped and close() re-raises the error.
+    def __init__(self, path, n_channels=len(channel_position_config), epoch_samples=int(EPOCH_TIME * SAMPLING_FREQ),
+                 chunk_epochs=256, n_buffers=4, fsync_interval=5.0):
+        self.path = path
+        self.n_channels = n_channels
+        self.epoch_samples = epoch_samples
+        self.chunk_epochs = chunk_epochs
+        self.fsync_interval = fsync_interval
+        self.info = None
+        self.n_epochs = 0
+        self.dropped = 0
+        self.error = None
+
+        self.free = queue.Queue()
+        for _ in range(n_buffers):
+            self.free.put(self.new_buffer())
+        self.full = queue.Queue()
+        self.samples, self.times = self.free.get()
+        self.filled = 0
+        # Guards the current block, which the writer also hands over when it is left part-full
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data_path, time_path, _ = stream_paths(path)
+        self.data_file = open(data_path, 'wb')
+        self.time_file = open(time_path, 'wb')
+        self.write_metadata()
+        self.writer = threading.Thread(target=self.write_forever, name='stream-recorder', daemon=True)
+        self.writer.start()
+
+    def new_buffer(self):
+        return (np.empty((self.chunk_epochs, self.n_channels, self.epoch_samples), dtype=np.float32),
+                np.empty(self.chunk_epochs, dtype=np.float64))
+
+    def callback(self, data):
+        # Runs on the SDK thread: copy the epoch into the current block and nothing else
+        if self.info is None:
+            self.info = data['info']
+        with self.lock:
+            if self.error is not None:
+                # The writer has failed, so nothing more reaches disk
+                self.dropped += 1
+                return
+            try:
+                self.samples[self.filled] = data['data']
+            except ValueError:
+                # Malformed epoch (wrong channel count or length); skip it rather than corrupt the store
+                self.dropped += 1
+                return
+            self.times[self.filled] = data['info']['startTime']
+            self.filled += 1
+            if self.filled == self.chunk_epochs:
+                self.hand_off()
+
+    def hand_off_partial(self):
+        with self.lock:
+            if self.filled:
+                self.hand_off()
+
+    def hand_off(self):
+        # Callers hold self.lock
+        self.full.put((self.samples, self.times, self.filled))
+        try:
+            self.samples, self.times = self.free.get_nowait()
+        except queue.Empty:
+            # The writer fell behind; grow the pool rather than block the SDK thread
+            self.samples, self.times = self.new_buffer()
+        self.filled = 0
+
+    def write_forever(self):
+        last_sync = time.monotonic()
+        metadata_info = None
+        unwritten = 0
+        try:
+            while True:
+                try:
+                    block = self.full.get(timeout=self.fsync_interval)
+                except queue.Empty:
+                    # No block filled for fsync_interval: take the part-full one, which this loop then writes and syncs
+                    self.hand_off_partial()
+                    continue
+                if block is None:
+                    break
+                samples, times, unwritten = block
+                if self.info is not metadata_info:
+                    # The first epoch's info (channel names, sampling rate) reaches the metadata before its data does
+                    metadata_info = self.info
+                    self.write_metadata()
+                samples[:unwritten].tofile(self.data_file)
+                times[:unwritten].tofile(self.time_file)
+                self.n_epochs += unwritten
+                unwritten = 0
+                self.free.put((samples, times))
+
+                if time.monotonic() - last_sync >= self.fsync_interval:
+                    self.sync()
+                    last_sync = time.monotonic()
+        except Exception as error:
+            with self.lock:
+                self.error = error
+                self.dropped += unwritten + self.filled
+                self.filled = 0
+
+    def sync(self):
+        for handle in (self.data_file, self.time_file):
+            handle.flush()
+            os.fsync(handle.fileno())
+        return self.write_metadata()
+
+    def write_metadata(self):
+        return write_stream_metadata(self.path, self.n_channels, self.epoch_samples, self.info, dropped=self.dropped)
+
+    def close(self):
+        self.hand_off_partial()
+        self.full.put(None)
+        self.writer.join()
+        try:
+            if self.error is not None:
+                # Blocks queued behind the failed write never reached disk
+                while not self.full.empty():
+                    block = self.full.get_nowait()
+                    self.dropped += block[2] if block is not None else 0
+                raise self.error
+            return self.sync()
+        finally:
+            self.data_file.close()
+            self.time_file.close()
+
+
+def stream_epochs(path, n_channels, epoch_samples):
+    # After a crash the files may end mid-epoch; only whole epochs with a timestamp count
+    data_path, time_path, _ = stream_paths(path)
+    epoch_bytes = n_channels * epoch_samples * np.dtype(np.float32).itemsize
+    return int(min(os.path.getsize(data_path) // epoch_bytes, os.path.getsize(time_path) // np.dtype(np.float64).itemsize))
+
+
+def write_stream_metadata(path, n_channels, epoch_samples, info=None, dropped=0):
+    _, _, meta_path = stream_paths(path)
+    info = info or {}
+    metadata = {
+        'sampling_rate': info.get('samplingRate', SAMPLING_FREQ),
+        'channel_names': info.get('channelNames', list(channel_position_config)),
+        'n_channels': n_channels,
+        'epoch_samples': epoch_samples,
+        'n_epochs': stream_epochs(path, n_channels, epoch_samples),
+        'dropped_epochs': dropped,
+        'version': STREAM_VERSION
+    }
+    tmp_path = f'{meta_path}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(metadata, handle)
+    os.replace(tmp_path, meta_path)
+    return metadata
+
+
+def read_stream(path, mmap_mode='r'):
+    # Memory-mapped (n_epochs, n_channels, epoch_samples) samples, epoch start times in ms and the metadata
+    data_path, time_path, meta_path = stream_paths(path)
+    with open(meta_path) as handle:
+        metadata = json.load(handle)
+    # The stored count is only refreshed on fsync; when a session crashed the files hold the epochs that made it
+    metadata['n_epochs'] = stream_epochs(path, metadata['n_channels'], metadata['epoch_samples'])
+    shape = (metadata['n_epochs'], metadata['n_channels'], metadata['epoch_samples'])
+    if metadata['n_epochs'] == 0:
+        return np.empty(shape, dtype=np.float32), np.empty(0), metadata
+    samples = np.memmap(data_path, dtype=np.float32, mode=mmap_mode, shape=shape)
+    times = np.memmap(time_path, dtype=np.float64, mode=mmap_mode, shape=(metadata['n_epochs'],))
+    return samples, times, metadata
+
+
+def stream_to_recording_cache(path, json_path, cache_dir=RECORDING_CACHE_DIR, chunk_epochs=4096):
+    # Write the streamed session in the recording-cache layout under the name of json_path, so the classifier
+    # loads it like any converted JSON recording
+    samples, times, metadata = read_stream(path)
+    n_channels, epoch_samples = metadata['n_channels'], metadata['epoch_samples']
+    # Epoch-major blocks -> columnar (n_channels, n_samples), a few thousand epochs at a time
+    blocks = (samples[start:start + chunk_epochs].transpose(1, 0, 2).reshape(n_channels, -1)
+              for start in range(0, len(samples), chunk_epochs))
+    cache_metadata = {
+        'sampling_rate': metadata['sampling_rate'],
+        'channel_names': metadata['channel_names'],
+        'epoch_samples': metadata['epoch_samples'],
+        'start_times': times.tolist(),
+        'source': 'stream'
+    }
+    data_path, meta_path = cache_paths(json_path, cache_dir)
+    write_recording_cache_blocks(blocks, (n_channels, len(samples) * epoch_samples), cache_metadata, data_path, meta_path)
+    return data_path, meta_path
@@ -1,4 +1,6 @@
+import os
 import datetime
+import numpy as np
 
 
 def convert_timestamp_ms_to_time(timestamp_ms):
@@ -8,3 +10,41 @@ def convert_timestamp_ms_to_time(timestamp_ms):
     dt_object = datetime.datetime.fromtimestamp(timestamp_s)
 
     return dt_object
+
+
+def connect_neurosity():
+    # NEUROSITY_SIMULATOR=<recording.json> replays that recording instead of logging in to the headset;
+    # NEUROSITY_SIMULATOR_SPEED sets the replay speed (1 = real time, 0 = as fast as possible)
+    recording = os.getenv("NEUROSITY_SIMULATOR")
+    if recording:
+        from eeg.scripts.simulator import simulated_neurosity
+        speed = float(os.getenv("NEUROSITY_SIMULATOR_SPEED", 1.0))
+        return simulated_neurosity(recording, speed=speed or None)
+
+    from neurosity import NeurositySDK
+    neurosity = NeurositySDK({
+        "device_id": os.getenv("NEUROSITY_DEVICE_ID"),
+    })
+    neurosity.login({
+        "email": os.getenv("NEUROSITY_EMAIL"),
+        "password": os.getenv("NEUROSITY_PASSWORD")
+    })
+    return neurosity
+
+
+class SignalMonitor:
+    # Running RMS of each channel's filtered signal, for spotting flat or noisy electrodes while recording.
+    # update() only does a few array operations, so it can run on the SDK thread.
+    def __init__(self, channel_names, smoothing=0.9):
+        self.channel_names = list(channel_names)
+        self.smoothing = smoothing
+        self.power = np.zeros(len(self.channel_names))
+        self.epochs = 0
+
+    def update(self, epoch):
+        power = np.mean(np.square(epoch['data']), axis=-1)
+        self.power = power if self.epochs == 0 else self.smoothing * self.power + (1 - self.smoothing) * power
+        self.epochs += 1
+
+    def summary(self):
+        return '  '.join(f'{name} {rms:6.1f}' for name, rms in zip(self.channel_names, np.sqrt(self.power)))
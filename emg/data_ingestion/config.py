@@ -1,3 +1,5 @@
+import os
+
 ELECTRODE_CONFIG = {
     'CH1': True,
     'CH2': True,
@@ -28,3 +30,6 @@ FEATURE_CONFIG = {
         "spectral_entropy": False
     }
 
+# Content-addressed EMG feature cache (see utils/feature_store.py)
+FEATURE_CACHE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '.feature_cache', 'emg'))
+FEATURE_CACHE_MAX_BYTES = 2 * 1024 ** 3
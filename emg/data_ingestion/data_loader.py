@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from math import ceil
+from numpy.lib.stride_tricks import sliding_window_view
 
 from emg.data_ingestion.config import ELECTRODE_CONFIG
 from emg.data_ingestion.preprocessing import log_transform_data
@@ -14,38 +14,66 @@ def normalize(df):
     return (df - df.mean()) / df.std()  # Simple Z-score normalization
 
 
-def apply_window_csv(win_len, overlap, filepath, electrode_config, sampling_freq=500):
-    df = pd.read_csv(filepath, sep=';', skiprows=1)
-    selected_channels = [channel for channel, is_selected in electrode_config.items() if is_selected]
-
-    # Calculate the number of samples per window and the number of samples for overlap
-    samples_per_window = int(win_len * sampling_freq)
-    overlap_samples = int(overlap * samples_per_window)
-    non_overlap_samples = samples_per_window - overlap_samples
+CSV_HEADER_LINES = 2  # the MindRove export line, then the channel names
 
-    # Calculate the number of windows
-    total_samples = len(df)
-    num_windows = ceil((total_samples - overlap_samples) / non_overlap_samples)
 
-    windowing_output = []
-    for i in range(num_windows):
-        sample_output = [[] for _ in selected_channels]
-
-        start_seg = i * non_overlap_samples
-        end_seg = start_seg + samples_per_window
+def load_csv_channels(filepath, electrode_config, chunksize=None, dtype=np.float32, first_row=0, n_rows=None):
+    # first_row and n_rows select data rows (samples), so a chunk of a long capture is parsed without the rest
+    selected_channels = [channel for channel, is_selected in electrode_config.items() if is_selected]
+    skiprows = [0] + list(range(CSV_HEADER_LINES, CSV_HEADER_LINES + first_row)) if first_row else 1
+    read_options = dict(sep=';', skiprows=skiprows, nrows=n_rows, usecols=selected_channels, dtype={channel: dtype for channel in selected_channels},
+                        engine='c')
+
+    # Large captures can be read in chunks so pandas never holds the whole file as one DataFrame
+    if chunksize is None:
+        samples = pd.read_csv(filepath, **read_options)[selected_channels].to_numpy(dtype=dtype)
+    else:
+        chunks = [chunk[selected_channels].to_numpy(dtype=dtype) for chunk in pd.read_csv(filepath, chunksize=chunksize, **read_options)]
+        samples = np.vstack(chunks) if chunks else np.empty((0, len(selected_channels)), dtype=dtype)
+
+    # One contiguous (n_channels, n_samples) array
+    return np.ascontiguousarray(samples.T)
+
+
+def sliding_windows(data, samples_per_window, step):
+    # Read-only (n_windows, n_channels, samples_per_window) view; overlapping windows share memory with data
+    if data.shape[-1] < samples_per_window:
+        return np.empty((0, data.shape[0], samples_per_window), dtype=data.dtype)
+    windows = sliding_window_view(data, samples_per_window, axis=-1)[:, ::step]
+    return windows.transpose(1, 0, 2)
+
+
+def count_csv_rows(filepath, block_size=1 << 20):
+    # Data rows without parsing them: newlines in the file, less the header lines
+    n_lines, last = 0, b'\n'
+    with open(filepath, 'rb') as handle:
+        while block := handle.read(block_size):
+            n_lines += block.count(b'\n')
+            last = block[-1:]
+    n_lines += last != b'\n'  # final line without a trailing newline
+    return max(n_lines - CSV_HEADER_LINES, 0)
+
+
+def window_step(win_len, overlap, sampling_freq=500):
+    # Samples per window and the non-overlapping part windows step by
+    samples_per_window = int(win_len * sampling_freq)
+    return samples_per_window, samples_per_window - int(overlap * samples_per_window)
 
-        if end_seg > total_samples:
-            break
 
-        window_data = df.iloc[start_seg:end_seg]
+def count_csv_windows(filepath, win_len, overlap, sampling_freq=500):
+    samples_per_window, step = window_step(win_len, overlap, sampling_freq)
+    n_rows = count_csv_rows(filepath)
+    return (n_rows - samples_per_window) // step + 1 if n_rows >= samples_per_window else 0
 
-        for idx, channel in enumerate(selected_channels):
-            sample_output[idx].extend(window_data[channel].values)
 
-        output = np.array(sample_output)
-        windowing_output.append(output)
+def apply_window_csv(win_len, overlap, filepath, electrode_config, sampling_freq=500, chunksize=None, start=0, stop=None):
+    # Windows start..stop only read the rows they cover, so chunks of a long capture are loaded independently
+    samples_per_window, step = window_step(win_len, overlap, sampling_freq)
+    n_rows = None if stop is None else max((stop - 1) * step + samples_per_window - start * step, 0)
+    data = load_csv_channels(filepath, electrode_config, chunksize=chunksize, first_row=start * step, n_rows=n_rows)
 
-    return windowing_output
+    # Only complete windows are returned, stepping by the non-overlapping part
+    return sliding_windows(data, samples_per_window, step)
 
 
 if __name__ == '__main__':
@@ -1,17 +1,47 @@
 import numpy as np
 import warnings
+from collections import Counter
+from joblib import Parallel, delayed
 
-from sklearn.feature_selection import RFE, SequentialFeatureSelector
+from sklearn.base import clone
+from sklearn.feature_selection import RFE, SequentialFeatureSelector, f_classif, mutual_info_classif
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.inspection import permutation_importance
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.metrics import accuracy_score
 
-from emg.data_ingestion.config import FEATURE_CONFIG
-from emg.feature_extraction.feature_extraction import extract_features_from_files, prepare_data_for_training
+from emg.data_ingestion.config import FEATURE_CONFIG, FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES
+from emg.feature_extraction.feature_extraction import extract_feature_superset_from_files, select_features, prepare_data_for_training, \
+    feature_columns
+from utils.feature_store import FeatureStore
 
 warnings.filterwarnings("ignore")
 
+FILTER_METHODS = ('anova_f', 'mutual_info')
+GROUP_BY = (None, 'channel', 'feature')
+
+
+def score_columns(model, X, y, columns, cv, scoring):
+    # Module-level so candidate feature sets can be scored on a process pool
+    warnings.filterwarnings("ignore")
+    return float(np.mean(cross_val_score(clone(model), X[:, columns], y, cv=cv, scoring=scoring)))
+
+
+def abs_correlation(X):
+    standardised = (X - X.mean(axis=0)) / np.where(X.std(axis=0) > 0, X.std(axis=0), 1)
+    return np.abs(standardised.T @ standardised) / len(X)
+
+
+def correlation_prune(X, order, threshold=0.95, correlation=None):
+    # Walk the features best-first and drop any whose |correlation| with an already kept feature exceeds threshold.
+    # Pass a precomputed abs_correlation(X) when pruning several rankings of the same X.
+    correlation = correlation if correlation is not None else abs_correlation(X)
+    kept = []
+    for idx in order:
+        if not kept or correlation[idx, kept].max() < threshold:
+            kept.append(idx)
+    return np.array(kept, dtype=int)
+
 
 class FeatureOptimiser:
     def __init__(self, model=None, n_features_to_select=None, direction='forward', scoring='accuracy', n_jobs=-1,
@@ -48,7 +78,108 @@ class FeatureOptimiser:
 
         return sorted_idx, importance_scores
 
-    def optimize_features(self, X, y, method='rfe'):
+    def filter_rankings(self, X, y, correlation_threshold=None):
+        # Cheap model-free scores for every column at once; returns {method: (ranked indices, scores)}
+        f_scores = np.nan_to_num(f_classif(X, y)[0])
+        mi_scores = mutual_info_classif(X, y, random_state=self.random_state, n_jobs=self.n_jobs)
+        rankings = {}
+        # One O(n_columns^2) correlation matrix shared by every method's pruning
+        correlation = abs_correlation(X) if correlation_threshold is not None else None
+        for method, scores in zip(FILTER_METHODS, (f_scores, mi_scores)):
+            order = np.argsort(scores)[::-1]
+            if correlation_threshold is not None:
+                order = correlation_prune(X, order, correlation_threshold, correlation)
+            rankings[method] = (order, scores)
+        return rankings
+
+    def prefilter(self, X, y, n_keep, method='anova_f', correlation_threshold=0.95):
+        # Columns worth passing to the wrapper methods: filter-ranked, de-correlated, best n_keep
+        if method not in FILTER_METHODS:
+            raise ValueError(f"Filter method {method} not recognized. Choose one of {list(FILTER_METHODS)}.")
+        order, _ = self.filter_rankings(X, y, correlation_threshold)[method]
+        return np.sort(order[:n_keep])
+
+    def feature_groups(self, n_columns, num_channels, feature_config=FEATURE_CONFIG, group_by=None, columns=None):
+        # Column indices grouped by channel ('CH1', ...) or feature family, so whole groups are kept or dropped.
+        # columns are the (channel, feature, sub_index) of every column, as a superset returns them; by default
+        # they are built from feature_config, so AR, PSD and Hjorth, which span several columns, group correctly.
+        if group_by not in GROUP_BY:
+            raise ValueError(f"Grouping {group_by} not recognized. Choose one of {list(GROUP_BY)}.")
+        if group_by is None:
+            return {idx: np.array([idx]) for idx in range(n_columns)}
+        columns = columns if columns is not None else feature_columns(feature_config)
+        if len(columns) != n_columns:
+            raise ValueError(f"X has {n_columns} columns but the feature layout describes {len(columns)}; pass the matching columns.")
+
+        groups = {}
+        for idx in range(n_columns):
+            channel, feature = columns[idx][:2]
+            groups.setdefault(channel if group_by == 'channel' else feature, []).append(idx)
+        return {name: np.array(columns) for name, columns in groups.items()}
+
+    def group_importances(self, X, y, groups):
+        model = clone(self.model).fit(X, y)
+        if hasattr(model, 'feature_importances_'):
+            importances = model.feature_importances_
+        elif hasattr(model, 'coef_'):
+            importances = np.abs(np.atleast_2d(model.coef_)).sum(axis=0)
+        else:
+            raise ValueError(f"{type(model).__name__} has neither feature_importances_ nor coef_; use grouped SFS instead.")
+        return {name: importances[columns].sum() for name, columns in groups.items()}
+
+    def grouped_rfe(self, X, y, groups, min_groups=1, patience=2, cv=3, tol=0.0):
+        # Drop the least important group per round, scoring each surviving set with cross-validation. Stops once
+        # the score has not beaten the best by more than tol for patience rounds; returns the best set seen.
+        remaining = dict(groups)
+        history = []
+        best_score, best_names, stale = -np.inf, list(remaining), 0
+        while len(remaining) >= min_groups:
+            columns = np.concatenate(list(remaining.values()))
+            score = float(np.mean(cross_val_score(clone(self.model), X[:, columns], y, cv=cv, scoring=self.scoring, n_jobs=self.n_jobs)))
+            history.append((list(remaining), score))
+            if score > best_score + tol:
+                best_score, best_names, stale = score, list(remaining), 0
+            else:
+                stale += 1
+            if stale >= patience or len(remaining) == min_groups:
+                break
+
+            importances = self.group_importances(X[:, columns], y, self.reindex(remaining, columns))
+            del remaining[min(importances, key=importances.get)]
+
+        return np.sort(np.concatenate([groups[name] for name in best_names])), history
+
+    def grouped_sfs(self, X, y, groups, max_groups=None, patience=2, cv=3, tol=0.0):
+        # Forward selection over groups; every candidate in a round is cross-validated in parallel
+        max_groups = max_groups if max_groups is not None else len(groups)
+        selected, history = [], []
+        best_score, best_names, stale = -np.inf, [], 0
+        with Parallel(n_jobs=self.n_jobs) as parallel:
+            while len(selected) < max_groups:
+                candidates = [name for name in groups if name not in selected]
+                if not candidates:
+                    break
+                scores = parallel(delayed(score_columns)(self.model, X, y, np.concatenate([groups[name] for name in selected + [candidate]]),
+                                                         cv, self.scoring) for candidate in candidates)
+                best_idx = int(np.argmax(scores))
+                selected.append(candidates[best_idx])
+                history.append((list(selected), scores[best_idx]))
+                if scores[best_idx] > best_score + tol:
+                    best_score, best_names, stale = scores[best_idx], list(selected), 0
+                else:
+                    stale += 1
+                    if stale >= patience:
+                        break
+
+        return np.sort(np.concatenate([groups[name] for name in best_names])), history
+
+    @staticmethod
+    def reindex(groups, columns):
+        # Group membership expressed as positions within X[:, columns]
+        position = {column: idx for idx, column in enumerate(columns)}
+        return {name: np.array([position[column] for column in members]) for name, members in groups.items()}
+
+    def optimize_features(self, X, y, method='rfe', groups=None):
         """
         General method to perform feature optimization based on the chosen method.
         """
@@ -58,11 +189,26 @@ class FeatureOptimiser:
             return self.sequential_feature_selection(X, y)
         elif method == 'permutation':
             return self.permutation_feature_importance(X, y)
+        elif method == 'filter':
+            return self.filter_rankings(X, y)
+        elif method in ('grouped_rfe', 'grouped_sfs'):
+            groups = groups if groups is not None else self.feature_groups(X.shape[1], num_channels=1)
+            select = self.grouped_rfe if method == 'grouped_rfe' else self.grouped_sfs
+            return select(X, y, groups)
         else:
-            raise ValueError("Unsupported method. Choose 'rfe', 'sfs', or 'permutation'.")
+            raise ValueError("Unsupported method. Choose 'rfe', 'sfs', 'permutation', 'filter', 'grouped_rfe' or 'grouped_sfs'.")
+
+
+def describe_columns(indices, columns):
+    # (channel, feature) for each column index; features spanning several columns name the sub-index, e.g.
+    # 'hjorth_parameters[1]'
+    widths = Counter(column[:2] for column in columns)
+    return [(channel, feature if widths[(channel, feature)] == 1 else f'{feature}[{sub_index}]')
+            for channel, feature, sub_index in (columns[idx] for idx in indices)]
 
 
 def get_channel_and_feature(index, num_channels, feature_config=FEATURE_CONFIG):
+    # Only valid when every enabled feature is one column wide; use describe_columns otherwise
     # Create a list of feature names based on the enabled features in the config
     feature_names_per_channel = [key for key, value in feature_config.items() if value]
     num_features_per_channel = len(feature_names_per_channel)
@@ -128,9 +274,13 @@ if __name__ == '__main__':
     fist_files = ['fist_3min_21_22_24.csv']
     finger_files = ['f_you_21_35_48.csv']
 
-    palm_features = extract_features_from_files(palm_files, feature_config=FEATURE_CONFIG)
-    fist_features = extract_features_from_files(fist_files, feature_config=FEATURE_CONFIG)
-    finger_features = extract_features_from_files(finger_files, feature_config=FEATURE_CONFIG)
+    # Only FEATURE_CONFIG's features are extracted; add configs to feature_configs to compare them as column masks
+    feature_store = FeatureStore(FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES)
+    supersets = [extract_feature_superset_from_files(files, feature_store=feature_store, feature_configs=[FEATURE_CONFIG])
+                 for files in (palm_files, fist_files, finger_files)]
+    palm_features, fist_features, finger_features = [select_features(features, columns, FEATURE_CONFIG) for features, columns in supersets]
+    # (channel, feature, sub_index) of every column of X; every index below is mapped back through these
+    columns = feature_columns(FEATURE_CONFIG)
 
     X, y = prepare_data_for_training([palm_features, fist_features, finger_features], [0, 1, 2])
 
@@ -146,10 +296,19 @@ if __name__ == '__main__':
     # Permutation importance example
     sorted_features_perm, perm_scores = feature_optimiser.optimize_features(X, y, method='permutation')
 
+    # Filter rankings and channel-grouped selection with early stopping
+    rankings = feature_optimiser.filter_rankings(X, y, correlation_threshold=0.95)
+    channel_groups = feature_optimiser.feature_groups(X.shape[1], num_channels, FEATURE_CONFIG, group_by='channel', columns=columns)
+    selected_features_channels, channel_history = feature_optimiser.grouped_sfs(X, y, channel_groups)
+    print(f"ANOVA F ranking (de-correlated): {describe_columns(rankings['anova_f'][0][:n], columns)}")
+    # The history runs past the best set until patience is used up; report the set grouped_sfs selected
+    best_channels = [channel for channel, columns in channel_groups.items() if np.isin(columns, selected_features_channels).all()]
+    print(f"Channel-grouped SFS: channels {best_channels}, score {max(score for _, score in channel_history):.4f}")
+
     # Map the selected features to their corresponding channels and feature names
-    rfe_mapped = [get_channel_and_feature(idx, num_channels, FEATURE_CONFIG) for idx in selected_features_rfe]
-    sfs_mapped = [get_channel_and_feature(idx, num_channels, FEATURE_CONFIG) for idx in selected_features_sfs]
-    perm_mapped = [get_channel_and_feature(idx, num_channels, FEATURE_CONFIG) for idx in sorted_features_perm]
+    rfe_mapped = describe_columns(selected_features_rfe, columns)
+    sfs_mapped = describe_columns(selected_features_sfs, columns)
+    perm_mapped = describe_columns(sorted_features_perm, columns)
 
     write_feature_report_to_file(rfe_mapped, sfs_mapped, perm_mapped, perm_scores, n, output_file=f'reports/{report_name}.txt')
 
@@ -1,34 +1,101 @@
 import os
+import shutil
 import joblib
+import tempfile
 import warnings
+from joblib import Parallel, delayed
 from sklearn.metrics import accuracy_score, f1_score, classification_report
-from sklearn.model_selection import train_test_split, GridSearchCV, ParameterGrid
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import train_test_split, GridSearchCV, RandomizedSearchCV, HalvingGridSearchCV, ParameterGrid
 
-from emg.data_ingestion.config import FEATURE_CONFIG
-from emg.feature_extraction.feature_extraction import extract_features_from_files, prepare_data_for_training
+from emg.data_ingestion.config import FEATURE_CONFIG, WINDOW_LEN, OVERLAP, SAMPLING_FREQ, FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES
+from emg.feature_extraction.feature_extraction import extract_feature_superset_from_files, select_features, prepare_data_for_training, \
+    union_config, config_covers
+from utils.feature_store import FeatureStore
 import emg.models.model_suite as model_suite
 from emg.models.model_suite import get_model
+from emg.models.model_inferencer import CLASS_LABELS
+from emg.models.model_registry import model_registry, training_data_hash
 
 warnings.filterwarnings("ignore")
 
+SEARCH_STRATEGIES = ('grid', 'random', 'halving')
+
+
+def fit_and_score(model_name, params, X_train, y_train, X_test, y_test):
+    # Module-level so the process pool can run one parameter combination per task
+    warnings.filterwarnings("ignore")
+    model = get_model(model_name, custom_params=params)
+    model.fit(X_train, y_train)
+
+    # Evaluate the model on the test set
+    y_pred = model.predict(X_test)
+    accuracy = accuracy_score(y_test, y_pred)
+    f1 = f1_score(y_test, y_pred, average='weighted')
+    return model_name, model, params, accuracy, f1
+
 
 class Optimiser:
-    def __init__(self, model_suite, model_save_tag):
+    def __init__(self, model_suite, model_save_tag, n_jobs=1, search='grid', n_iter=20, random_state=42, feature_configs=()):
+        if search not in SEARCH_STRATEGIES:
+            raise ValueError(f"Search strategy {search} not recognized. Choose one of {list(SEARCH_STRATEGIES)}.")
         self.model_suite = model_suite
         self.tag = model_save_tag
+        self.n_jobs = n_jobs
+        # 'random' samples n_iter combinations and 'halving' races all of them on growing subsets of the data,
+        # so large grids are never fully fitted on everything
+        self.search = search
+        self.n_iter = n_iter
+        self.random_state = random_state
+        self.shared_dir = None
         self.best_model = None
         self.best_params = None
         self.best_score = 0
         self.best_models = {}
+        # Recorded next to every saved model so the realtime loop can check it extracts the same features
+        self.feature_config = FEATURE_CONFIG
+        self.data_hash = None
+        # Per file list, the union of the feature configs optimised on this instance, extracted once and shared as
+        # column masks. Pass the configs of a sweep up front so the first optimise call extracts all of them.
+        self.feature_configs = list(feature_configs)
+        self.supersets = {}
 
     def save_model(self, model, model_name, save_dir='saved_models'):
-        os.makedirs(save_dir, exist_ok=True)
         model_path = os.path.join(save_dir, f"{self.tag}_{model_name}_best_model.pkl")
-        joblib.dump(model, model_path)
+        model_registry.save(model, model_path, feature_config=self.feature_config, win_len=WINDOW_LEN, overlap=OVERLAP,
+                            sampling_rate=SAMPLING_FREQ, class_labels=CLASS_LABELS, data_hash=self.data_hash)
+
+    def make_search(self, model, param_grid):
+        if self.search == 'random':
+            n_iter = min(self.n_iter, len(ParameterGrid(param_grid)))
+            return RandomizedSearchCV(model, param_grid, n_iter=n_iter, cv=5, scoring='accuracy', n_jobs=self.n_jobs,
+                                      random_state=self.random_state)
+        if self.search == 'halving':
+            return HalvingGridSearchCV(model, param_grid, cv=5, scoring='accuracy', n_jobs=self.n_jobs, random_state=self.random_state)
+        return GridSearchCV(model, param_grid, cv=5, scoring='accuracy', n_jobs=self.n_jobs)
+
+    def share_arrays(self, *arrays):
+        # Dump the arrays once and hand workers read-only memmaps, which joblib passes by file name instead of
+        # pickling a copy of the feature matrix into every task
+        if self.n_jobs == 1:
+            return arrays
+        if self.shared_dir is None:
+            self.shared_dir = tempfile.mkdtemp(prefix='optimiser_')
+        shared = []
+        for idx, array in enumerate(arrays):
+            path = os.path.join(self.shared_dir, f'array_{id(array)}_{idx}.joblib')
+            joblib.dump(array, path)
+            shared.append(joblib.load(path, mmap_mode='r'))
+        return tuple(shared)
+
+    def release_arrays(self):
+        if self.shared_dir is not None:
+            shutil.rmtree(self.shared_dir, ignore_errors=True)
+            self.shared_dir = None
 
     def optimise_single_model(self, model_name, param_grid, X, y):
         model = get_model(model_name)
-        grid_search = GridSearchCV(model, param_grid, cv=5, scoring='accuracy')
+        grid_search = self.make_search(model, param_grid)
         grid_search.fit(X, y)
 
         best_model = grid_search.best_estimator_
@@ -41,25 +108,29 @@ class Optimiser:
 
     def optimise_multiple_models_model_lvl(self, model_configs, X, y):
         results = []
-
-        for model_name, param_grid in model_configs.items():
-            print(f"Optimising model: {model_name}...")
-            best_model, best_params, best_score = self.optimise_single_model(model_name, param_grid, X, y)
-
-            # Print the best model, params, and score for the current model
-            print("\n\nBest Model: ", best_model)
-            print("Best Params: ", best_params)
-            print("Best Score: ", best_score)
-
-            # Append results to the list
-            results.append((model_name, best_model, best_params, best_score))
-            self.best_models[model_name] = best_model
-
-            # Update the overall best model if the current model's score is higher
-            if best_score > self.best_score:
-                self.best_model = best_model
-                self.best_params = best_params
-                self.best_score = best_score
+        X, y = self.share_arrays(X, y)
+
+        try:
+            for model_name, param_grid in model_configs.items():
+                print(f"Optimising model: {model_name}...")
+                best_model, best_params, best_score = self.optimise_single_model(model_name, param_grid, X, y)
+
+                # Print the best model, params, and score for the current model
+                print("\n\nBest Model: ", best_model)
+                print("Best Params: ", best_params)
+                print("Best Score: ", best_score)
+
+                # Append results to the list
+                results.append((model_name, best_model, best_params, best_score))
+                self.best_models[model_name] = best_model
+
+                # Update the overall best model if the current model's score is higher
+                if best_score > self.best_score:
+                    self.best_model = best_model
+                    self.best_params = best_params
+                    self.best_score = best_score
+        finally:
+            self.release_arrays()
 
         return results
 
@@ -67,21 +138,15 @@ class Optimiser:
         results = []
 
         # Splitting the dataset for training and evaluation
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-        for model_name, param_grid in model_configs.items():
-            print(f"Optimising model: {model_name}...")
-
-            # Iterate over all possible parameter combinations
-            for params in ParameterGrid(param_grid):
-                model = get_model(model_name, custom_params=params)
-                model.fit(X_train, y_train)
-
-                # Evaluate the model on the test set
-                y_pred = model.predict(X_test)
-                accuracy = accuracy_score(y_test, y_pred)
-                f1 = f1_score(y_test, y_pred, average='weighted')
-
+        X_train, X_test, y_train, y_test = self.share_arrays(*train_test_split(X, y, test_size=0.2, random_state=42))
+
+        # Every parameter combination of every model is one task. Results come back in (model, grid index) order,
+        # whatever order the workers finish in, so the results and the first of several tied best scores are
+        # the same for any n_jobs
+        tasks = (delayed(fit_and_score)(model_name, params, X_train, y_train, X_test, y_test)
+                 for model_name, param_grid in model_configs.items() for params in ParameterGrid(param_grid))
+        try:
+            for model_name, model, params, accuracy, f1 in Parallel(n_jobs=self.n_jobs, return_as='generator')(tasks):
                 # Append results
                 results.append((model_name, model, params, accuracy, f1))
 
@@ -94,6 +159,8 @@ class Optimiser:
                     self.best_model = model
                     self.best_params = params
                     self.best_score = accuracy
+        finally:
+            self.release_arrays()
 
         return results
 
@@ -121,13 +188,26 @@ class Optimiser:
             "best_params": self.best_params
         }
 
-    def optimise(self, config, file_lists, labels, feature_config=FEATURE_CONFIG, test_size=0.1):
-        # Extract features based on the feature config
-        feature_sets = [extract_features_from_files(files, feature_config=feature_config) for files in file_lists]
+    def feature_superset(self, files, feature_config=FEATURE_CONFIG, feature_store=None):
+        # Only re-extracted when a config asks for a feature the file list's superset lacks
+        key = tuple(files)
+        extracted_config = self.supersets[key][0] if key in self.supersets else {}
+        if not config_covers(extracted_config, feature_config):
+            superset_config = union_config(extracted_config, feature_config, *self.feature_configs)
+            superset = extract_feature_superset_from_files(files, feature_store=feature_store, feature_configs=[superset_config])
+            self.supersets[key] = (superset_config, superset)
+        return self.supersets[key][1]
+
+    def optimise(self, config, file_lists, labels, feature_config=FEATURE_CONFIG, test_size=0.1, feature_store=None):
+        # Select the feature config's columns from the superset, which is only extracted when it lacks one of them
+        # (and comes from the cache when a store is given)
+        feature_sets = [select_features(*self.feature_superset(files, feature_config, feature_store), feature_config) for files in file_lists]
 
         # Prepare the data
         X, y = prepare_data_for_training(feature_sets, labels)
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
+        self.feature_config = feature_config
+        self.data_hash = training_data_hash(X_train, y_train)
 
         # Run the optimisation process
         optimisation_results = self.run_optimisation(config, X_train, y_train)
@@ -156,7 +236,7 @@ if __name__ == "__main__":
     labels = [0, 1, 2]  # 0 for palm, 1 for fist, 2 for finger
     test_size = 0.5
 
-    optimiser = Optimiser(model_suite, tag)
+    optimiser = Optimiser(model_suite, tag, n_jobs=-1)
 
     # Example configuration for optimisation
     config = {
@@ -169,8 +249,10 @@ if __name__ == "__main__":
         }
     }
 
-    # Run the optimisation
-    results = optimiser.optimise(config, file_lists, labels, test_size=test_size)
+    # Run the optimisation; features come from the cache when only the model settings change
+    feature_store = FeatureStore(FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_BYTES)
+    results = optimiser.optimise(config, file_lists, labels, test_size=test_size, feature_store=feature_store)
+    print("Feature cache:", feature_store.stats())
 
     # Print out the results
     print("\n\nBest Model: ", optimiser.best_model)
@@ -1,9 +1,11 @@
+import warnings
 import numpy as np
-from scipy.linalg import solve_toeplitz
+from joblib import Parallel, delayed
 from scipy.signal import welch
 
 from emg.data_ingestion.config import ELECTRODE_CONFIG, SAMPLING_FREQ, WINDOW_LEN, OVERLAP, FEATURE_CONFIG
-from emg.data_ingestion.data_loader import apply_window_csv, preprocess_data
+from emg.data_ingestion.data_loader import apply_window_csv, count_csv_windows, preprocess_data
+from utils.feature_store import to_feature_matrix
 
 def mean_absolute_value(emg_data):
     return np.mean(np.abs(emg_data), axis=1)
@@ -27,15 +29,29 @@ def waveform_length(emg_data):
 def integrated_emg(emg_data):
     return np.sum(np.abs(emg_data), axis=1)
 
+def autocorrelation_lags(emg_data, order):
+    # Lags 0..order along the last axis as direct dot products, O(n * order) instead of a full correlation
+    n_samples = emg_data.shape[-1]
+    return np.stack([np.einsum('...i,...i->...', emg_data[..., :n_samples - lag], emg_data[..., lag:]) for lag in range(order + 1)], axis=-1)
+
+def levinson_durbin(r, order):
+    # Solves every Yule-Walker Toeplitz system in r (..., order + 1) at once
+    ar_coeff = np.zeros(r.shape[:-1] + (order,))
+    error = r[..., 0].copy()
+    for k in range(order):
+        reflection = (r[..., k + 1] - np.sum(ar_coeff[..., :k] * r[..., k:0:-1], axis=-1)) / error
+        ar_coeff[..., :k] = ar_coeff[..., :k] - reflection[..., np.newaxis] * ar_coeff[..., k - 1::-1][..., :k]
+        ar_coeff[..., k] = reflection
+        error = error * (1 - reflection ** 2)
+    return ar_coeff
+
+def autoregressive_coefficients_batch(emg_data, order=4):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = autocorrelation_lags(emg_data, order)
+        return levinson_durbin(r / r[..., :1], order)
+
 def autoregressive_coefficients(emg_data, order=4):
-    ar_coeffs = []
-    for channel_data in emg_data:
-        r = np.correlate(channel_data, channel_data, mode='full')
-        r = r[len(r)//2:len(r)//2+order+1]
-        r = r / r[0]
-        ar_coeff = solve_toeplitz((r[:-1], r[:-1]), r[1:])
-        ar_coeffs.append(ar_coeff)
-    return np.array(ar_coeffs).flatten()
+    return autoregressive_coefficients_batch(emg_data, order).flatten()
 
 def hjorth_parameters(emg_data):
     activity = np.var(emg_data, axis=1)
@@ -70,56 +86,226 @@ def spectral_entropy(emg_data, fs):
     spectral_ent = -np.sum(psd_norm * np.log2(psd_norm + np.finfo(float).eps), axis=1)
     return spectral_ent
 
+### Batched feature engine over (n_windows, n_channels, n_samples)
+SPECTRAL_FEATURES = ("mean_frequency", "median_frequency", "power_spectral_density (psd)", "spectral_entropy")
+AR_ORDER = 4
+# Values per channel of the features that are not a single number; the PSD has one value per Welch bin
+MULTI_VALUE_FEATURES = {"autoregressive_coefficients (ar_coefficients)": AR_ORDER, "hjorth_parameters": 3}
+
+
+def welch_segment(n_samples):
+    return min(256, n_samples)
+
+
+def feature_blocks(emg_windows, fs, enabled, preprocessed=False):
+    # Returns [(feature_name, (n_windows, n_channels, n_values))] for the enabled features, in order
+    emg_windows = np.asarray(emg_windows, dtype=float)
+    if not preprocessed:
+        emg_windows = preprocess_data(emg_windows)
+    n_windows = emg_windows.shape[0]
+
+    # Shared intermediates: each is computed at most once for the whole batch
+    abs_data = np.abs(emg_windows)
+    first_diff = np.diff(emg_windows, axis=-1)
+    if any(feature_name in SPECTRAL_FEATURES for feature_name in enabled):
+        freqs, psd = welch(emg_windows, fs, nperseg=welch_segment(emg_windows.shape[-1]), axis=-1)
+        total_power = np.sum(psd, axis=-1)
+
+    # Flat channels make some ratios 0/0; those NaNs are reported per selected feature by the callers
+    blocks = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for feature_name in enabled:
+            if feature_name == "mean_absolute_value (mav)":
+                block = np.mean(abs_data, axis=-1)
+            elif feature_name == "root_mean_square (rms)":
+                block = np.sqrt(np.mean(np.square(emg_windows), axis=-1))
+            elif feature_name == "zero_crossing (zc)":
+                block = np.sum((emg_windows[..., :-1] * emg_windows[..., 1:] < 0) & (np.abs(first_diff) > 0.01), axis=-1)
+            elif feature_name == "slope_sign_changes (ssc)":
+                block = np.sum((first_diff[..., :-1] * first_diff[..., 1:] < 0) & (np.abs(first_diff[..., :-1] - first_diff[..., 1:]) > 0.01), axis=-1)
+            elif feature_name == "waveform_length (wl)":
+                block = np.sum(np.abs(first_diff), axis=-1)
+            elif feature_name == "integrated_emg (iemg)":
+                block = np.sum(abs_data, axis=-1)
+            elif feature_name == "autoregressive_coefficients (ar_coefficients)":
+                block = autoregressive_coefficients_batch(emg_windows, AR_ORDER)
+            elif feature_name == "hjorth_parameters":
+                activity = np.var(emg_windows, axis=-1)
+                diff_var = np.var(first_diff, axis=-1)
+                mobility = np.sqrt(diff_var / activity)
+                complexity = np.sqrt(np.var(np.diff(first_diff, axis=-1), axis=-1) / diff_var) / mobility
+                block = np.stack([activity, mobility, complexity], axis=-1)
+            elif feature_name == "mean_frequency":
+                block = np.divide(np.sum(freqs * psd, axis=-1), total_power, out=np.zeros_like(total_power), where=total_power != 0)
+            elif feature_name == "median_frequency":
+                cumulative_sum = np.cumsum(psd, axis=-1)
+                block = freqs[np.argmax(cumulative_sum >= 0.5 * cumulative_sum[..., -1:], axis=-1)]
+            elif feature_name == "power_spectral_density (psd)":
+                block = psd
+            elif feature_name == "spectral_entropy":
+                psd_norm = psd / total_power[..., np.newaxis]
+                block = -np.sum(psd_norm * np.log2(psd_norm + np.finfo(float).eps), axis=-1)
+            else:
+                continue
+
+            blocks.append((feature_name, block.reshape(n_windows, emg_windows.shape[1], -1)))
+
+    return blocks
+
+def warn_nan_features(feature_names):
+    if feature_names:
+        warnings.warn(f"NaN detected in the {', '.join(feature_names)} feature(s).", RuntimeWarning, stacklevel=3)
+
+
+def nan_feature_names(features, columns):
+    # Enabled features with a NaN in any window, by name; columns as returned by feature_columns
+    features = np.asarray(features)
+    if features.size == 0:
+        return []
+    has_nan = np.isnan(features).any(axis=0)
+    return list(dict.fromkeys(feature_name for (_, feature_name, _), nan in zip(columns, has_nan) if nan))
+
+
+def extract_features_batch(emg_windows, fs, config, preprocessed=False, warn_nan=True):
+    enabled = [feature_name for feature_name, is_enabled in config.items() if is_enabled]
+    named_blocks = feature_blocks(emg_windows, fs, enabled, preprocessed)
+    blocks = [block for _, block in named_blocks]
+    n_windows = len(emg_windows)
+    if warn_nan:
+        warn_nan_features([feature_name for feature_name, block in named_blocks if np.isnan(block).any()])
+
+    if not blocks:
+        return np.empty((n_windows, 0))
+
+    # Channel-major layout: every enabled feature of CH1 in FEATURE_CONFIG order, then CH2, ...
+    return np.concatenate(blocks, axis=-1).reshape(n_windows, -1)
+
 ### Extracting Features from files using config
-def extract_features_multi_channel(emg_data_multi_channel, fs, config):
-    feature_functions = {
-        "mean_absolute_value (mav)": mean_absolute_value,
-        "root_mean_square (rms)": root_mean_square,
-        "zero_crossing (zc)": zero_crossing,
-        "slope_sign_changes (ssc)": slope_sign_changes,
-        "waveform_length (wl)": waveform_length,
-        "integrated_emg (iemg)": integrated_emg,
-        "autoregressive_coefficients (ar_coefficients)": autoregressive_coefficients,
-        "hjorth_parameters": hjorth_parameters,
-        "mean_frequency": lambda x: mean_frequency(x, fs),
-        "median_frequency": lambda x: median_frequency(x, fs),
-        "power_spectral_density (psd)": lambda x: power_spectral_density(x, fs).flatten(),
-        "spectral_entropy": lambda x: spectral_entropy(x, fs)
+def extract_features_multi_channel(emg_data_multi_channel, fs, config, preprocessed=False):
+    return extract_features_batch(np.asarray(emg_data_multi_channel)[np.newaxis], fs, config, preprocessed)[0]
+
+
+def extract_features_from_file(filepath, feature_config=FEATURE_CONFIG, win_len=WINDOW_LEN, overlap=OVERLAP, start=0, stop=None, batch_size=1024):
+    emg_data = apply_window_csv(win_len, overlap, filepath, ELECTRODE_CONFIG, SAMPLING_FREQ, start=start, stop=stop)
+    full_features = []
+    for batch_start in range(0, len(emg_data), batch_size):
+        # NaNs are reported once for the whole result by extract_features_from_files, in the main process
+        full_features.extend(extract_features_batch(emg_data[batch_start:batch_start + batch_size], SAMPLING_FREQ, feature_config, warn_nan=False))
+    return full_features
+
+def count_windows_in_file(filepath, win_len=WINDOW_LEN, overlap=OVERLAP):
+    # From the row count alone; the samples are only parsed by the chunks that need them
+    return count_csv_windows(filepath, win_len, overlap, SAMPLING_FREQ)
+
+def extract_features_per_file(file_paths, feature_config=FEATURE_CONFIG, n_jobs=1, chunk_size=1024):
+    if n_jobs == 1:
+        return [extract_features_from_file(file_path, feature_config=feature_config) for file_path in file_paths]
+
+    # Split large files into chunks of windows and spread them across the pool; Parallel keeps task order
+    window_counts = Parallel(n_jobs=n_jobs)(delayed(count_windows_in_file)(file_path) for file_path in file_paths)
+    tasks = [(file_idx, delayed(extract_features_from_file)(file_path, feature_config, WINDOW_LEN, OVERLAP, start, min(start + chunk_size, n_windows)))
+             for file_idx, (file_path, n_windows) in enumerate(zip(file_paths, window_counts))
+             for start in range(0, n_windows, chunk_size)]
+    chunk_features = Parallel(n_jobs=n_jobs)(task for _, task in tasks)
+
+    per_file = [[] for _ in file_paths]
+    for (file_idx, _), features in zip(tasks, chunk_features):
+        per_file[file_idx].extend(features)
+    return per_file
+
+# Part of every feature cache key; bump it whenever a change here alters the features computed from the same recording
+FEATURE_VERSION = 1
+
+def feature_cache_params(feature_config=FEATURE_CONFIG):
+    return {
+        "feature_version": FEATURE_VERSION,
+        "feature_config": feature_config,
+        "electrode_config": ELECTRODE_CONFIG,
+        "preprocessing": "log_transform",
+        "win_len": WINDOW_LEN,
+        "overlap": OVERLAP,
+        "sampling_freq": SAMPLING_FREQ
     }
 
-    features = []
-    for channel_data in emg_data_multi_channel:
-        channel_data = preprocess_data(channel_data)
-        channel_data = channel_data.reshape(1, -1)
+def extract_features_from_files(file_list, file_loc='../data', feature_config=FEATURE_CONFIG, n_jobs=1, chunk_size=1024, feature_store=None,
+                                warn_nan=True):
+    file_paths = [f'{file_loc}/{file}' for file in file_list]
 
-        if np.isnan(channel_data).any():
-            print("NaN in channel data!")
+    if feature_store is None:
+        per_file = extract_features_per_file(file_paths, feature_config, n_jobs, chunk_size)
+        features = [features for file_features in per_file for features in file_features]
+        if warn_nan:
+            warn_nan_features(nan_feature_names(features, feature_columns(feature_config)))
+        return features
 
-        for feature_name, is_enabled in config.items():
-            if is_enabled:
-                feature_function = feature_functions.get(feature_name)
-                if feature_function:
-                    feature_values = feature_function(channel_data)
-                    if np.isnan(feature_values).any():
-                        print(f"NaN detected in {feature_name} feature!")
-                    features.extend(feature_values)
+    # Serve cache hits straight from the store and only extract the files that missed
+    params = feature_cache_params(feature_config)
+    keys = [feature_store.make_key(file_path, **params) for file_path in file_paths]
+    matrices = [feature_store.get(key) for key in keys]
+    missing = [idx for idx, matrix in enumerate(matrices) if matrix is None]
 
-    return np.array(features)
+    computed = extract_features_per_file([file_paths[idx] for idx in missing], feature_config, n_jobs, chunk_size)
+    for idx, features in zip(missing, computed):
+        matrices[idx] = feature_store.put(keys[idx], to_feature_matrix(features))
 
+    features = [features for matrix in matrices for features in matrix]
+    if warn_nan:
+        warn_nan_features(nan_feature_names(features, feature_columns(feature_config)))
+    return features
 
-def extract_features_from_file(filepath, feature_config=FEATURE_CONFIG, win_len=WINDOW_LEN, overlap=OVERLAP):
-    emg_data = apply_window_csv(win_len, overlap, filepath, ELECTRODE_CONFIG)
-    full_features = [extract_features_multi_channel(sample_channels, SAMPLING_FREQ, feature_config) for sample_channels in emg_data]
-    return full_features
 
-def extract_features_from_files(file_list, file_loc='../data', feature_config=FEATURE_CONFIG):
-    all_features = []
-    for file in file_list:
-        file_path = f'{file_loc}/{file}'
-        features = extract_features_from_file(file_path, feature_config=feature_config)
-        all_features.extend(features)
+### Superset extraction: compute every feature once, then select any FEATURE_CONFIG as a column mask
+ALL_FEATURES_CONFIG = {feature_name: True for feature_name in FEATURE_CONFIG}
+
+
+def feature_widths(feature_config=FEATURE_CONFIG, fs=SAMPLING_FREQ, win_len=WINDOW_LEN):
+    # Values per channel of each enabled feature, e.g. 4 AR coefficients or one value per PSD bin. Worked out from
+    # the config, the same way feature_blocks sizes its output: a one-sided Welch PSD has nperseg // 2 + 1 bins.
+    widths = {}
+    for feature_name, is_enabled in feature_config.items():
+        if not is_enabled or feature_name not in ALL_FEATURES_CONFIG:
+            continue
+        if feature_name == "power_spectral_density (psd)":
+            widths[feature_name] = welch_segment(int(win_len * fs)) // 2 + 1
+        else:
+            widths[feature_name] = MULTI_VALUE_FEATURES.get(feature_name, 1)
+    return widths
+
+
+def feature_columns(feature_config=FEATURE_CONFIG, fs=SAMPLING_FREQ, win_len=WINDOW_LEN, electrode_config=ELECTRODE_CONFIG):
+    # (channel, feature_name, sub_index) for every column, in the channel-major order extract_features_batch uses
+    channels = [channel for channel, is_selected in electrode_config.items() if is_selected]
+    widths = feature_widths(feature_config, fs, win_len)
+    return [(channel, feature_name, sub_index) for channel in channels for feature_name, width in widths.items() for sub_index in range(width)]
+
+
+def config_mask(columns, feature_config):
+    return np.array([bool(feature_config.get(feature_name, False)) for _, feature_name, _ in columns])
+
+
+def union_config(*feature_configs):
+    # Every feature enabled in any of the configs, in ALL_FEATURES_CONFIG order
+    return {feature_name: any(config.get(feature_name, False) for config in feature_configs) for feature_name in ALL_FEATURES_CONFIG}
+
+
+def config_covers(superset_config, feature_config):
+    return all(superset_config.get(feature_name, False) for feature_name, is_enabled in feature_config.items() if is_enabled)
+
+
+def select_features(features, columns, feature_config):
+    # Same columns, in the same order, as extracting with feature_config directly; NaNs are reported here, for the
+    # selected features only, rather than for every feature in the superset
+    mask = config_mask(columns, feature_config)
+    selected = np.asarray(features)[:, mask]
+    warn_nan_features(nan_feature_names(selected, [column for column, keep in zip(columns, mask) if keep]))
+    return selected
+
 
-    return all_features
+def extract_feature_superset_from_files(file_list, file_loc='../data', n_jobs=1, chunk_size=1024, feature_store=None, feature_configs=None):
+    # Extracts the union of feature_configs (every feature when None), so each of them is then a column mask
+    superset_config = union_config(*feature_configs) if feature_configs is not None else ALL_FEATURES_CONFIG
+    features = extract_features_from_files(file_list, file_loc, superset_config, n_jobs, chunk_size, feature_store, warn_nan=False)
+    return to_feature_matrix(features), feature_columns(superset_config)
 
 
 def prepare_data_for_training(feature_sets, labels):
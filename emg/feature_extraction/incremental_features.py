@@ -0,0 +1,230 @@
+import numpy as np
+
+from emg.data_ingestion.config import FEATURE_CONFIG, SAMPLING_FREQ, WINDOW_LEN, OVERLAP
+from emg.data_ingestion.data_loader import preprocess_data
+from emg.feature_extraction.feature_extraction import feature_blocks
+
+# Time-domain features that can be rebuilt from running sums; everything else falls back to the batch engine
+INCREMENTAL_FEATURES = (
+    "mean_absolute_value (mav)",
+    "root_mean_square (rms)",
+    "zero_crossing (zc)",
+    "slope_sign_changes (ssc)",
+    "waveform_length (wl)",
+    "integrated_emg (iemg)",
+    "hjorth_parameters"
+)
+
+# Per-sample contribution streams and how many samples each term spans. A term is assigned to the last
+# sample it touches, so within a window the first (span - 1) terms reach back before the window start.
+STREAM_SPANS = {
+    "abs": 1,
+    "square": 1,
+    "centred": 1,
+    "centred_square": 1,
+    "abs_diff": 2,
+    "diff": 2,
+    "diff_square": 2,
+    "zero_crossing": 2,
+    "second_diff": 3,
+    "second_diff_square": 3,
+    "slope_sign_change": 3
+}
+STREAMS = list(STREAM_SPANS)
+
+
+def contribution_streams(samples, previous, offset, threshold=0.01):
+    # samples: new preprocessed samples (n_channels, n_new); previous: up to two samples before them
+    # Returns (n_streams, n_channels, n_new); terms that would reach before the first sample ever seen are 0
+    extended = np.concatenate([previous, samples], axis=-1)
+    n_previous = previous.shape[-1]
+    first_diff = np.diff(extended, axis=-1)
+    second_diff = np.diff(first_diff, axis=-1)
+
+    def align(values, span):
+        aligned = np.zeros(extended.shape)
+        aligned[..., span - 1:] = values
+        return aligned[..., n_previous:]
+
+    centred = extended - offset[:, np.newaxis]
+    streams = {
+        "abs": align(np.abs(extended), 1),
+        "square": align(np.square(extended), 1),
+        "centred": align(centred, 1),
+        "centred_square": align(np.square(centred), 1),
+        "abs_diff": align(np.abs(first_diff), 2),
+        "diff": align(first_diff, 2),
+        "diff_square": align(np.square(first_diff), 2),
+        "zero_crossing": align((extended[..., :-1] * extended[..., 1:] < 0) & (np.abs(first_diff) > threshold), 2),
+        "second_diff": align(second_diff, 3),
+        "second_diff_square": align(np.square(second_diff), 3),
+        "slope_sign_change": align((first_diff[..., :-1] * first_diff[..., 1:] < 0) & (np.abs(second_diff) > threshold), 3)
+    }
+    return np.stack([streams[name] for name in STREAMS])
+
+
+def block_sums(streams):
+    # streams: (n_streams, n_channels, n_samples) for one hop-sized block
+    # Returns the block totals and the "head" sums of the terms that would leave a window starting at this block
+    totals = streams.sum(axis=-1)
+    heads = np.stack([streams[idx, :, :STREAM_SPANS[name] - 1].sum(axis=-1) for idx, name in enumerate(STREAMS)])
+    return totals, heads
+
+
+def features_from_sums(sums, samples_per_window, enabled):
+    # sums: (n_streams, ...) window sums -> [(feature_name, (..., n_values))]
+    stream = dict(zip(STREAMS, sums))
+    n = samples_per_window
+
+    def variance(total, total_square, count):
+        return np.maximum(total_square - total ** 2 / count, 0) / count
+
+    blocks = []
+    for feature_name in enabled:
+        if feature_name == "mean_absolute_value (mav)":
+            block = stream["abs"] / n
+        elif feature_name == "root_mean_square (rms)":
+            block = np.sqrt(stream["square"] / n)
+        elif feature_name == "zero_crossing (zc)":
+            block = stream["zero_crossing"]
+        elif feature_name == "slope_sign_changes (ssc)":
+            block = stream["slope_sign_change"]
+        elif feature_name == "waveform_length (wl)":
+            block = stream["abs_diff"]
+        elif feature_name == "integrated_emg (iemg)":
+            block = stream["abs"]
+        elif feature_name == "hjorth_parameters":
+            activity = variance(stream["centred"], stream["centred_square"], n)
+            diff_var = variance(stream["diff"], stream["diff_square"], n - 1)
+            mobility = np.sqrt(diff_var / activity)
+            complexity = np.sqrt(variance(stream["second_diff"], stream["second_diff_square"], n - 2) / diff_var) / mobility
+            block = np.stack([activity, mobility, complexity], axis=-1)
+        else:
+            continue
+        blocks.append((feature_name, block if block.ndim == 3 else block[..., np.newaxis]))
+    return blocks
+
+
+def window_geometry(win_len, overlap, fs):
+    samples_per_window = int(win_len * fs)
+    hop = samples_per_window - int(overlap * samples_per_window)
+    if samples_per_window % hop:
+        raise ValueError(f"Window of {samples_per_window} samples is not a whole number of {hop}-sample hops.")
+    return samples_per_window, hop
+
+
+def assemble(blocks, enabled, n_windows):
+    # Channel-major layout in FEATURE_CONFIG order, the same as extract_features_batch
+    by_name = dict(blocks)
+    ordered = [by_name[feature_name] for feature_name in enabled if feature_name in by_name]
+    if not ordered:
+        return np.empty((n_windows, 0))
+    return np.concatenate(ordered, axis=-1).reshape(n_windows, -1)
+
+
+def sliding_time_features(emg_data, feature_config=FEATURE_CONFIG, win_len=WINDOW_LEN, overlap=OVERLAP, fs=SAMPLING_FREQ):
+    # Offline incremental mode over a whole (n_channels, n_samples) recording: each sample is touched once,
+    # then every window is the sum of its hop blocks minus the terms that reach back before it
+    samples_per_window, hop = window_geometry(win_len, overlap, fs)
+    hops_per_window = samples_per_window // hop
+    enabled = [feature_name for feature_name, is_enabled in feature_config.items() if is_enabled]
+
+    raw = np.asarray(emg_data, dtype=float)
+    n_blocks = raw.shape[-1] // hop
+    n_windows = max(n_blocks - hops_per_window + 1, 0)
+    if n_windows == 0:
+        return np.empty((0, 0))
+    raw = raw[:, :n_blocks * hop]
+
+    samples = preprocess_data(raw)
+    streams = contribution_streams(samples, samples[:, :0], samples[:, 0])
+    blocks = streams.reshape(streams.shape[:2] + (n_blocks, hop))
+    totals = blocks.sum(axis=-1)
+    heads = np.stack([blocks[idx, :, :, :STREAM_SPANS[name] - 1].sum(axis=-1) for idx, name in enumerate(STREAMS)])
+
+    # (n_streams, n_channels, n_windows) -> (n_streams, n_windows, n_channels)
+    window_totals = np.lib.stride_tricks.sliding_window_view(totals, hops_per_window, axis=-1).sum(axis=-1)
+    sums = (window_totals - heads[..., :n_windows]).transpose(0, 2, 1)
+    output = features_from_sums(sums, samples_per_window, enabled)
+
+    fallback = [feature_name for feature_name in enabled if feature_name not in INCREMENTAL_FEATURES]
+    if fallback:
+        windows = np.lib.stride_tricks.sliding_window_view(raw, samples_per_window, axis=-1)[:, ::hop].transpose(1, 0, 2)
+        output += feature_blocks(windows, fs, fallback)
+
+    return assemble(output, enabled, n_windows)
+
+
+class IncrementalFeatureExtractor:
+    def __init__(self, n_channels, feature_config=FEATURE_CONFIG, win_len=WINDOW_LEN, overlap=OVERLAP, fs=SAMPLING_FREQ):
+        self.n_channels = n_channels
+        self.fs = fs
+        self.samples_per_window, self.hop = window_geometry(win_len, overlap, fs)
+        self.hops_per_window = self.samples_per_window // self.hop
+        self.enabled = [feature_name for feature_name, is_enabled in feature_config.items() if is_enabled]
+        self.fallback = [feature_name for feature_name in self.enabled if feature_name not in INCREMENTAL_FEATURES]
+        self.reset()
+
+    def reset(self):
+        n_streams = len(STREAMS)
+        self.totals = np.zeros((self.hops_per_window, n_streams, self.n_channels))
+        self.heads = np.zeros((self.hops_per_window, n_streams, self.n_channels))
+        self.blocks_seen = 0
+        self.offset = None
+        self.previous = np.empty((self.n_channels, 0))
+        self.pending = np.empty((self.n_channels, 0))
+        # Stream position one past the last sample of the last window passed to update_window
+        self.last_end = None
+        # Raw samples of the current window, only kept when a feature needs the full window
+        self.window = np.zeros((self.n_channels, self.samples_per_window)) if self.fallback else None
+
+    def push_block(self, raw_block):
+        samples = preprocess_data(raw_block)
+        if self.offset is None:
+            self.offset = samples[:, 0].copy()
+
+        totals, heads = block_sums(contribution_streams(samples, self.previous, self.offset))
+        slot = self.blocks_seen % self.hops_per_window
+        self.totals[slot] = totals
+        self.heads[slot] = heads
+        self.blocks_seen += 1
+        self.previous = samples[:, -2:]
+
+        if self.window is not None:
+            self.window = np.concatenate([self.window[:, self.hop:], raw_block], axis=-1)
+
+    def current_features(self):
+        # Window sums from the last hops_per_window blocks; O(hops_per_window) rather than O(window)
+        oldest = self.blocks_seen % self.hops_per_window
+        sums = self.totals.sum(axis=0) - self.heads[oldest]
+        output = features_from_sums(sums[:, np.newaxis, :], self.samples_per_window, self.enabled)
+        if self.fallback:
+            output += feature_blocks(self.window[np.newaxis], self.fs, self.fallback)
+        return assemble(output, self.enabled, 1)[0]
+
+    def update(self, chunk):
+        # chunk: new raw samples (n_channels, n_samples); returns one feature vector per completed window
+        self.pending = np.concatenate([self.pending, np.asarray(chunk, dtype=float)], axis=-1)
+        features = []
+        while self.pending.shape[-1] >= self.hop:
+            self.push_block(self.pending[:, :self.hop])
+            self.pending = self.pending[:, self.hop:]
+            if self.blocks_seen >= self.hops_per_window:
+                features.append(self.current_features())
+        return features
+
+    def update_window(self, window, end=None):
+        # window: the latest (n_channels, samples_per_window) sliding window and end its stream position, as
+        # RingBuffer.windows(positions=True) yields them; None means one hop after the previous window. Only the
+        # last hop is new when the window follows on from the previous one. Otherwise, for example when the ring
+        # buffer skipped ahead because the consumer fell behind, the running sums are re-seeded from this window.
+        window = np.asarray(window, dtype=float)
+        if window.shape[-1] != self.samples_per_window:
+            raise ValueError(f"Expected windows of {self.samples_per_window} samples, got {window.shape[-1]}.")
+        follows_on = self.last_end is not None and (end is None or end == self.last_end + self.hop)
+        end = end if end is not None else self.last_end + self.hop if follows_on else self.samples_per_window
+        if not follows_on:
+            self.reset()
+        features = self.update(window[:, -self.hop:] if follows_on else window)
+        self.last_end = end
+        return features[-1]
@@ -1,29 +1,238 @@
-import pickle
+import asyncio
 import numpy as np
+from scipy.special import expit, softmax
+from sklearn.svm import SVC
+from sklearn.naive_bayes import GaussianNB
+from sklearn.linear_model import LogisticRegression
+
+from emg.models.model_registry import model_registry
 
 CLASS_LABELS = {0: 'palm', 1: 'fist', 2: 'finger'}
+SCORE_TYPES = ('proba', 'decision')
+
+
+class LinearPredictor:
+    # LogisticRegression (multinomial or one-vs-rest) and any model whose predict is argmax(X @ W.T + b).
+    # proba is how scores become probabilities: 'softmax', 'ovr' (normalised sigmoids) or None if unsupported.
+    def __init__(self, coef, intercept, classes, proba='softmax'):
+        self.coef_t = np.ascontiguousarray(np.asarray(coef, dtype=float).T)
+        self.intercept = np.asarray(intercept, dtype=float)
+        self.classes = np.asarray(classes)
+        self.proba = proba
+
+    def decision_function(self, X):
+        return X @ self.coef_t + self.intercept
+
+    def predict_proba(self, X):
+        if self.proba is None:
+            raise ValueError(f"{type(self).__name__} has no probability estimates. Use decision scores instead.")
+        scores = self.decision_function(X)
+        if scores.shape[1] == 1:
+            positive = expit(scores)
+            return np.hstack([1 - positive, positive])
+        if self.proba == 'ovr':
+            positive = expit(scores)
+            return positive / positive.sum(axis=1, keepdims=True)
+        return softmax(scores, axis=1)
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if scores.shape[1] == 1:
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        return self.classes[np.argmax(scores, axis=1)]
+
+
+class OneVsOnePredictor(LinearPredictor):
+    # Linear-kernel SVC: one hyperplane per class pair (i, j), i < j, in libsvm order. A positive score is a vote
+    # for i; ties go to the lowest class index, as in libsvm.
+    def __init__(self, coef, intercept, classes):
+        # libsvm's Platt-scaled probabilities are not reproduced here
+        super().__init__(coef, intercept, classes, proba=None)
+        n_classes = len(self.classes)
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        # Every pair votes for j unless its score is positive, which moves the vote to i
+        self.base_votes = np.bincount([j for _, j in pairs], minlength=n_classes)
+        self.vote_shift = np.zeros((len(pairs), n_classes))
+        for pair, (i, j) in enumerate(pairs):
+            self.vote_shift[pair, i] += 1
+            self.vote_shift[pair, j] -= 1
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if len(self.classes) == 2:
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        votes = self.base_votes + (scores > 0) @ self.vote_shift
+        return self.classes[np.argmax(votes, axis=1)]
+
+
+class GaussianNBPredictor(LinearPredictor):
+    # GaussianNB's joint log likelihood expanded into a constant, a linear term and a term in X ** 2
+    def __init__(self, theta, var, class_prior, classes):
+        inv_var = 1.0 / np.asarray(var, dtype=float)
+        constant = np.log(class_prior) - 0.5 * np.sum(np.log(2 * np.pi * np.asarray(var, dtype=float)), axis=1) \
+            - 0.5 * np.sum(np.square(theta) * inv_var, axis=1)
+        super().__init__(theta * inv_var, constant, classes)
+        self.half_inv_var_t = np.ascontiguousarray(0.5 * inv_var.T)
+
+    def decision_function(self, X):
+        return X @ self.coef_t - np.square(X) @ self.half_inv_var_t + self.intercept
+
+
+class FallbackPredictor:
+    # Any other estimator keeps its own predict
+    def __init__(self, model):
+        self.model = model
+        self.classes = getattr(model, 'classes_', None)
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+    def predict_proba(self, X):
+        return self.scores('predict_proba', X)
+
+    def decision_function(self, X):
+        return self.scores('decision_function', X)
 
+    def scores(self, method, X):
+        if not hasattr(self.model, method):
+            raise ValueError(f"{type(self.model).__name__} does not provide {method}.")
+        return getattr(self.model, method)(X)
 
-def load_model(model_path):
-    with open(model_path, 'rb') as file:
-        model = pickle.load(file)
-    return model
+
+def compile_model(model, check_data=None):
+    # Export a fitted scikit-learn model to plain NumPy arrays; pass check_data to verify the labels match
+    if isinstance(model, LogisticRegression):
+        # Mirrors LogisticRegression.predict_proba's choice between one-vs-rest and multinomial probabilities
+        multi_class = getattr(model, 'multi_class', 'auto')
+        ovr = multi_class in ('ovr', 'warn') or (multi_class in ('auto', 'deprecated') and (len(model.classes_) <= 2 or model.solver == 'liblinear'))
+        compiled = LinearPredictor(model.coef_, model.intercept_, model.classes_, proba='ovr' if ovr else 'softmax')
+    elif isinstance(model, SVC) and model.kernel == 'linear':
+        compiled = OneVsOnePredictor(model.coef_, model.intercept_, model.classes_)
+    elif isinstance(model, GaussianNB):
+        compiled = GaussianNBPredictor(model.theta_, model.var_, model.class_prior_, model.classes_)
+    else:
+        compiled = FallbackPredictor(model)
+
+    if check_data is not None:
+        verify_compiled_model(model, compiled, check_data)
+    return compiled
+
+
+def verify_compiled_model(model, compiled, check_data):
+    check_data = np.asarray(check_data, dtype=float)
+    mismatches = np.count_nonzero(model.predict(check_data) != compiled.predict(check_data))
+    if mismatches:
+        raise ValueError(f"Compiled {type(model).__name__} disagrees with the original model on {mismatches} of {len(check_data)} rows.")
+
+
+def load_model(model_path, feature_config=None, win_len=None, sampling_rate=None):
+    # Warm, memory-mapped load through the registry; pass the live settings to check them against the model's.
+    # The gesture labels infer and infer_batch report are always checked against the ones stored at training time.
+    return model_registry.load(model_path, feature_config=feature_config, win_len=win_len, sampling_rate=sampling_rate,
+                               class_labels=CLASS_LABELS)
 
 
 def infer(model, input_data):
+    return infer_batch(model, input_data)[0]
+
+
+def infer_batch(model, input_data, scores=None):
+    # (n_windows, n_features) -> one gesture label per window. With scores='proba' or 'decision' also returns the
+    # (n_windows, n_classes) probabilities or decision scores (pairwise for a compiled SVC) from the same call.
+    if scores is not None and scores not in SCORE_TYPES:
+        raise ValueError(f"Score type {scores} not recognized. Choose one of {list(SCORE_TYPES)}.")
+    input_data = np.asarray(input_data)
     if input_data.ndim == 1:
         input_data = input_data.reshape(1, -1)
 
-    # Predict the class
-    predicted_class = model.predict(input_data)
+    # Predict the classes and map them to gesture labels
+    predicted_classes = model.predict(input_data)
+    labels = [CLASS_LABELS[predicted_class] for predicted_class in predicted_classes]
+    if scores is None:
+        return labels
+
+    values = model.predict_proba(input_data) if scores == 'proba' else model.decision_function(input_data)
+    return labels, values
+
+
+class MicroBatcher:
+    # Collects feature vectors from several live streams for up to max_wait_ms (or max_batch requests) and runs
+    # them through one infer_batch call. Each caller awaits its own result.
+    def __init__(self, model, max_batch=32, max_wait_ms=2.0, scores=None, executor=None):
+        if scores is not None and scores not in SCORE_TYPES:
+            raise ValueError(f"Score type {scores} not recognized. Choose one of {list(SCORE_TYPES)}.")
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.scores = scores
+        self.executor = executor
+        self.requests = asyncio.Queue()
+        self.task = None
+        self.stats = {"requests": 0, "batches": 0, "max_batch_size": 0}
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+        return self
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        while not self.requests.empty():
+            _, future = self.requests.get_nowait()
+            future.cancel()
+
+    async def submit(self, features):
+        # Returns the label, or (label, scores) when the batcher was built with scores
+        future = asyncio.get_running_loop().create_future()
+        await self.requests.put((np.asarray(features).ravel(), future))
+        return await future
+
+    async def collect(self):
+        batch = [await self.requests.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self.requests.empty():
+                batch.append(self.requests.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.requests.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect()
+            features = np.vstack([features for features, _ in batch])
+            try:
+                if self.executor is None:
+                    output = infer_batch(self.model, features, self.scores)
+                else:
+                    output = await loop.run_in_executor(self.executor, infer_batch, self.model, features, self.scores)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
 
-    # Map the predicted class to the gesture label
-    return CLASS_LABELS[predicted_class[0]]
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(batch))
+            results = zip(*output) if self.scores is not None else output
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
 
 
 def main(model_path, input_data):
-    # Load the model
-    model = load_model(model_path)
+    # Load the model and swap in the NumPy predictor where one exists
+    model = compile_model(load_model(model_path), check_data=input_data.reshape(1, -1))
 
     # Perform inference
     result = infer(model, input_data)
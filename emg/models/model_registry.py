@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import hashlib
+import joblib
+import numpy as np
+
+from emg.data_ingestion.config import ELECTRODE_CONFIG, FEATURE_CONFIG, SAMPLING_FREQ, WINDOW_LEN, OVERLAP
+from emg.feature_extraction.feature_extraction import extract_features_batch
+
+REGISTRY_VERSION = 1
+
+
+def metadata_path(model_path):
+    return f'{os.path.splitext(model_path)[0]}.meta.json'
+
+
+def training_data_hash(X, y=None):
+    digest = hashlib.sha256()
+    for array in (X, y):
+        if array is not None:
+            array = np.ascontiguousarray(array)
+            digest.update(str((array.dtype.str, array.shape)).encode())
+            digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def expected_feature_count(feature_config=FEATURE_CONFIG, win_len=WINDOW_LEN, sampling_rate=SAMPLING_FREQ, electrode_config=ELECTRODE_CONFIG):
+    # Width of the feature vector the live pipeline will produce, found by running the batch engine on one window
+    n_channels = sum(electrode_config.values())
+    window = np.random.default_rng(0).normal(size=(1, n_channels, int(win_len * sampling_rate)))
+    return extract_features_batch(window, sampling_rate, feature_config).shape[1]
+
+
+def enabled_features(feature_config):
+    return [feature_name for feature_name, is_enabled in feature_config.items() if is_enabled]
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.models = {}
+
+    def save(self, model, model_path, feature_config=FEATURE_CONFIG, win_len=WINDOW_LEN, overlap=OVERLAP, sampling_rate=SAMPLING_FREQ,
+             class_labels=None, data_hash=None):
+        # Uncompressed joblib so the model's NumPy arrays can be memory-mapped on load
+        os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+        joblib.dump(model, model_path)
+
+        classes = getattr(model, 'classes_', [])
+        metadata = {
+            "model_class": type(model).__name__,
+            "feature_config": feature_config,
+            "window_len": win_len,
+            "overlap": overlap,
+            "sampling_rate": sampling_rate,
+            "electrode_config": ELECTRODE_CONFIG,
+            "n_features": getattr(model, 'n_features_in_', None),
+            # null for classes saved without a gesture label, so validate has nothing to check them against
+            "class_labels": {str(cls): (class_labels or {}).get(cls) for cls in np.asarray(classes).tolist()},
+            "data_hash": data_hash,
+            "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "version": REGISTRY_VERSION
+        }
+        tmp_path = f'{metadata_path(model_path)}.tmp'
+        with open(tmp_path, 'w') as handle:
+            json.dump(metadata, handle, indent=2)
+        os.replace(tmp_path, metadata_path(model_path))
+        return metadata
+
+    def metadata(self, model_path):
+        path = metadata_path(model_path)
+        if not os.path.exists(path):
+            return None
+        with open(path) as handle:
+            return json.load(handle)
+
+    def load(self, model_path, feature_config=None, win_len=None, sampling_rate=None, class_labels=None, mmap_mode='r'):
+        # Loaded models stay cached per (path, mtime); the live settings are checked on every call, cached or not
+        stat = os.stat(model_path)
+        key = (os.path.abspath(model_path), stat.st_mtime_ns, mmap_mode)
+        if key not in self.models:
+            self.models[key] = (joblib.load(model_path, mmap_mode=mmap_mode), self.metadata(model_path))
+        model, metadata = self.models[key]
+
+        self.validate(model, metadata, feature_config, win_len, sampling_rate, class_labels)
+        return model
+
+    def validate(self, model, metadata, feature_config=None, win_len=None, sampling_rate=None, class_labels=None):
+        metadata = metadata or {}
+        trained_config = metadata.get("feature_config")
+        if feature_config is not None and trained_config is not None and feature_config != trained_config:
+            raise ValueError(f"Model was trained with features {enabled_features(trained_config)}, "
+                             f"but the live pipeline extracts {enabled_features(feature_config)}.")
+        for name, live, trained in (("window length", win_len, metadata.get("window_len")),
+                                    ("sampling rate", sampling_rate, metadata.get("sampling_rate"))):
+            if live is not None and trained is not None and live != trained:
+                raise ValueError(f"Model was trained with {name} {trained}, but the live pipeline uses {live}.")
+
+        # Models saved before the registry have no metadata, but the width of the feature vector still has to match
+        n_features = getattr(model, 'n_features_in_', None)
+        if feature_config is not None and n_features is not None:
+            expected = expected_feature_count(feature_config, win_len or metadata.get("window_len", WINDOW_LEN),
+                                              sampling_rate or metadata.get("sampling_rate", SAMPLING_FREQ))
+            if expected != n_features:
+                raise ValueError(f"Model expects {n_features} features, but the live feature config produces {expected}.")
+
+        # class_labels maps predicted classes to the gestures inference reports; every class the model predicts needs
+        # one, and it has to be the gesture the class was trained on
+        if class_labels is not None:
+            trained_labels = metadata.get("class_labels") or {}
+            for cls in np.asarray(getattr(model, 'classes_', [])).tolist():
+                if cls not in class_labels:
+                    raise ValueError(f"Model predicts class {cls}, which has no live gesture label in {class_labels}.")
+                trained = trained_labels.get(str(cls))
+                if trained is not None and trained != class_labels[cls]:
+                    raise ValueError(f"Model was trained with class {cls} as '{trained}', but inference labels it '{class_labels[cls]}'.")
+
+    def clear(self):
+        self.models.clear()
+
+
+model_registry = ModelRegistry()
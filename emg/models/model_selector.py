@@ -5,8 +5,8 @@ from sklearn.metrics import accuracy_score, classification_report
 from emg.feature_extraction.feature_extraction import extract_features_from_files, prepare_data_for_training
 from emg.models.model_suite import get_model
 
-def train_and_evaluate_model(file_lists, labels, model_name, custom_params=None, test_size=0.1):
-    feature_sets = [extract_features_from_files(files) for files in file_lists]
+def train_and_evaluate_model(file_lists, labels, model_name, custom_params=None, test_size=0.1, feature_store=None):
+    feature_sets = [extract_features_from_files(files, feature_store=feature_store) for files in file_lists]
 
     X, y = prepare_data_for_training(feature_sets, labels)
 
@@ -0,0 +1,79 @@
+import time
+import asyncio
+import threading
+from mindrove.board_shim import BoardShim
+
+ACQUISITION_MODES = ('timed', 'thread')
+
+
+class BoardReader:
+    # Reads the board only when a chunk should be ready: 'timed' sleeps on the event loop until the missing
+    # samples are due, 'thread' does the same on a dedicated reader thread that feeds an asyncio.Queue
+    def __init__(self, board, sampling_rate, chunk_size, mode='timed'):
+        if mode not in ACQUISITION_MODES:
+            raise ValueError(f"Acquisition mode {mode} not recognized. Choose one of {list(ACQUISITION_MODES)}.")
+        self.board = board
+        self.sampling_rate = sampling_rate
+        self.chunk_size = chunk_size
+        self.mode = mode
+        self.timestamp_channel = BoardShim.get_timestamp_channel(board.board_id)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {"polls": 0, "empty_polls": 0, "chunks": 0, "last_lag_ms": 0.0, "mean_lag_ms": 0.0, "max_lag_ms": 0.0}
+
+    def poll(self):
+        # One check of the board; returns (chunk or None, seconds to wait before the next check)
+        self.stats["polls"] += 1
+        available = self.board.get_board_data_count()
+        if available < self.chunk_size:
+            self.stats["empty_polls"] += 1
+            return None, (self.chunk_size - available) / self.sampling_rate
+
+        data = self.board.get_board_data()
+        self.record_lag(data)
+        return data, self.chunk_size / self.sampling_rate
+
+    def record_lag(self, data):
+        # Poll-to-availability lag: how long the newest sample sat on the board before we picked it up
+        lag_ms = (time.time() - data[self.timestamp_channel, -1]) * 1000
+        self.stats["chunks"] += 1
+        self.stats["last_lag_ms"] = lag_ms
+        self.stats["mean_lag_ms"] += (lag_ms - self.stats["mean_lag_ms"]) / self.stats["chunks"]
+        self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag_ms)
+
+    async def chunks(self):
+        if self.mode == 'thread':
+            async for data in self.threaded_chunks():
+                yield data
+            return
+
+        while not self.stop_event.is_set():
+            data, wait = self.poll()
+            if data is not None:
+                yield data
+            await asyncio.sleep(wait)
+
+    async def threaded_chunks(self):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def read_forever():
+            while not self.stop_event.is_set():
+                data, wait = self.poll()
+                if data is not None:
+                    loop.call_soon_threadsafe(queue.put_nowait, data)
+                self.stop_event.wait(wait)
+
+        self.thread = threading.Thread(target=read_forever, name='board-reader', daemon=True)
+        self.thread.start()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        # The reader thread can be mid-wait for up to a chunk; join it on a worker thread so the event loop keeps running
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            await asyncio.to_thread(self.thread.join, 1.0)
@@ -1,12 +1,15 @@
+import os
 import asyncio
-import pickle
 import numpy as np
 from mindrove.board_shim import BoardShim, MindRoveInputParams, BoardIds
 
-from emg.data_ingestion.config import FEATURE_CONFIG, WINDOW_LEN, SAMPLING_FREQ
-from emg.models.model_inferencer import infer
-from emg.realtime.latency_test import latency_test
-from emg.feature_extraction.feature_extraction import extract_features_multi_channel
+from emg.data_ingestion.config import FEATURE_CONFIG, WINDOW_LEN, OVERLAP, SAMPLING_FREQ
+from emg.feature_extraction.incremental_features import IncrementalFeatureExtractor
+from emg.models.model_inferencer import compile_model, load_model
+from emg.realtime.acquisition import BoardReader
+from emg.realtime.pipeline import RealtimePipeline
+from emg.realtime.ring_buffer import RingBuffer
+from emg.realtime.simulator import simulated_board
 
 def initialize_board():
     BoardShim.enable_dev_board_logger()  # Logging everything for debugging—don’t miss a thing
@@ -17,50 +20,65 @@ def initialize_board():
     board.start_stream()
     return board
 
-async def read_emg_data(board, sampling_rate, feature_config, model, window_size=WINDOW_LEN, chunk_duration=0.1):
+async def read_emg_data(board, sampling_rate, pipeline, window_size=WINDOW_LEN, overlap=OVERLAP, chunk_duration=0.1, buffer_duration=2.0,
+                        reader=None):
     chunk_size = int(sampling_rate * chunk_duration)
-    collected_data = []
+    window_samples = int(window_size * sampling_rate)
+    hop_samples = window_samples - int(overlap * window_samples)
 
-    while True:
-        if board.get_board_data_count() >= chunk_size:
-            data_chunk = board.get_current_board_data(chunk_size)
-            collected_data.append(data_chunk)
+    # Preallocated circular buffers; timestamps stay float64 so epoch seconds keep their precision
+    emg_channels = BoardShim.get_emg_channels(board.board_id)
+    timestamp_channel = BoardShim.get_timestamp_channel(board.board_id)
+    capacity = max(int(buffer_duration * sampling_rate), window_samples)
+    emg_buffer = RingBuffer(len(emg_channels), capacity)
+    timestamp_buffer = RingBuffer(1, capacity, dtype=np.float64)
 
-            # Combine chunks into one if the desired window size is reached
-            if len(collected_data) * chunk_size >= window_size * sampling_rate:
-                emg_channels = BoardShim.get_emg_channels(board.board_id)
-                emg_data = np.hstack(collected_data)  # Combine the chunks
-                collected_data = []  # Reset for the next batch
+    # The reader sleeps until the next chunk is due instead of polling every 10 ms; it drains the board with
+    # get_board_data, which removes what it returns, so no sample is read twice
+    reader = reader if reader is not None else BoardReader(board, sampling_rate, chunk_size)
+    async for data_chunk in reader.chunks():
+        emg_buffer.write(data_chunk[emg_channels])
+        timestamp_buffer.write(data_chunk[timestamp_channel][np.newaxis])
 
-                await process_data(emg_data, model, feature_config)
+        # Overlapping windows, hop_samples apart; the pipeline queues them and never blocks acquisition
+        # unless its policy is 'block'
+        for (end, emg_window), timestamps in zip(emg_buffer.windows(window_samples, hop_samples, positions=True),
+                                                 timestamp_buffer.windows(window_samples, hop_samples)):
+            await pipeline.submit(emg_window, timestamps[0], end)
 
-        await asyncio.sleep(0.01)
-
-async def process_data(data, model, feature_config=FEATURE_CONFIG, samp_freq=SAMPLING_FREQ):
-    # Assuming data is in the format N_channels x N_samples
-    features = extract_features_multi_channel(data, fs=samp_freq, config=feature_config)
-    result = infer(model, features)
-    print(f"Predicted gesture: {result}")
-    await latency_test(data)
-
-
-async def main(model_path, feature_config=FEATURE_CONFIG, window_size=WINDOW_LEN):
-    board = initialize_board()
+async def main(model_path, feature_config=FEATURE_CONFIG, window_size=WINDOW_LEN, queue_policy='drop_oldest', report_interval=5.0,
+               acquisition_mode='timed', chunk_duration=0.1, board=None, incremental=False):
+    # Pass a SimulatedBoard to replay a recording instead of streaming from the armband
+    board = board if board is not None else initialize_board()
     sampling_rate = BoardShim.get_sampling_rate(BoardIds.MINDROVE_WIFI_BOARD.value)
 
-    # Load the model from the .pkl file
-    with open(model_path, 'rb') as file:
-        model = pickle.load(file)
+    # Load the model through the registry, which rejects it if it was trained on a different feature layout;
+    # linear models and GaussianNB then run as plain NumPy predictors
+    model = compile_model(load_model(model_path, feature_config=feature_config, win_len=window_size, sampling_rate=sampling_rate))
+
+    # incremental=True rebuilds the time-domain features from running per-hop sums instead of re-scanning every window
+    extractor = IncrementalFeatureExtractor(len(BoardShim.get_emg_channels(board.board_id)), feature_config, window_size, OVERLAP,
+                                            sampling_rate) if incremental else None
+    pipeline = RealtimePipeline(model, feature_config, samp_freq=sampling_rate, policy=queue_policy, extractor=extractor).start()
+    monitor = asyncio.create_task(pipeline.monitor(report_interval))
+    reader = BoardReader(board, sampling_rate, int(sampling_rate * chunk_duration), mode=acquisition_mode)
 
     try:
-        await read_emg_data(board, sampling_rate, feature_config, model, window_size)
+        await read_emg_data(board, sampling_rate, pipeline, window_size, chunk_duration=chunk_duration, reader=reader)
     except KeyboardInterrupt:
         print("Okay, let’s wrap it up.")
     finally:
+        print(f"Acquisition: {reader.stats}")
+        await reader.stop()
+        monitor.cancel()
+        await pipeline.stop()
         board.stop_stream()
         board.release_session()
 
 
 if __name__ == "__main__":
     path_to_model = '../experimentation/saved_models/just_rms_500ms/just_rms_LogisticRegression_best_model.pkl'
-    asyncio.run(main(model_path=path_to_model))
+
+    # MINDROVE_SIMULATOR=<capture.csv> replays a recorded session in real time instead of using the armband
+    recording = os.getenv("MINDROVE_SIMULATOR")
+    asyncio.run(main(model_path=path_to_model, board=simulated_board(recording) if recording else None))
@@ -0,0 +1,103 @@
+import time
+from contextlib import contextmanager
+import numpy as np
+
+STAGES = ('acquire', 'preprocess', 'features', 'inference', 'actuation', 'end_to_end')
+PERCENTILES = (50, 95, 99)
+
+
+def sample_latencies(timestamps, now=None):
+    # Board timestamps are epoch seconds; one subtraction against a single clock read gives every latency in ms
+    now = time.time() if now is None else now
+    return (now - np.asarray(timestamps, dtype=np.float64)) * 1000
+
+
+class LatencyHistogram:
+    # Fixed-size histogram of millisecond durations: recording is an index increment, never an allocation that
+    # grows with the run, and the last bin collects everything above max_ms
+    def __init__(self, max_ms=1000.0, bin_ms=0.1):
+        self.bin_ms = bin_ms
+        self.n_bins = int(np.ceil(max_ms / bin_ms)) + 1
+        self.counts = np.zeros(self.n_bins, dtype=np.int64)
+        self.total = 0
+        self.max_ms = 0.0
+
+    def record(self, value_ms):
+        idx = min(max(int(value_ms / self.bin_ms), 0), self.n_bins - 1)
+        self.counts[idx] += 1
+        self.total += 1
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def record_many(self, values_ms):
+        values_ms = np.asarray(values_ms, dtype=np.float64).ravel()
+        if values_ms.size == 0:
+            return
+        idx = np.clip((values_ms / self.bin_ms).astype(np.int64), 0, self.n_bins - 1)
+        self.counts += np.bincount(idx, minlength=self.n_bins)
+        self.total += values_ms.size
+        self.max_ms = max(self.max_ms, float(values_ms.max()))
+
+    def percentiles(self, percentiles=PERCENTILES):
+        # Upper edge of the bin holding each percentile, so values are accurate to bin_ms
+        if self.total == 0:
+            return {p: float('nan') for p in percentiles}
+        cumulative = np.cumsum(self.counts)
+        ranks = np.ceil(np.asarray(percentiles) / 100 * self.total)
+        bins = np.searchsorted(cumulative, ranks)
+        return {p: min(round((b + 1) * self.bin_ms, 6), self.max_ms) for p, b in zip(percentiles, bins)}
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total = 0
+        self.max_ms = 0.0
+
+
+class Instrumentation:
+    # One histogram per pipeline stage. The pipeline records everything from the event loop (executor timings
+    # come back with the label), so no locking is needed.
+    def __init__(self, stages=STAGES, max_ms=1000.0, bin_ms=0.1, enabled=True):
+        self.enabled = enabled
+        self.histograms = {stage: LatencyHistogram(max_ms, bin_ms) for stage in stages}
+
+    def record(self, stage, value_ms):
+        if self.enabled:
+            self.histograms[stage].record(value_ms)
+
+    def record_many(self, stage, values_ms):
+        if self.enabled:
+            self.histograms[stage].record_many(values_ms)
+
+    def record_timestamps(self, stage, timestamps, now=None):
+        # Latency of board timestamps relative to now, e.g. the newest sample of each window at submit time
+        if self.enabled:
+            self.histograms[stage].record_many(sample_latencies(timestamps, now))
+
+    @contextmanager
+    def time(self, stage):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histograms[stage].record((time.perf_counter() - start) * 1000)
+
+    def report(self, percentiles=PERCENTILES):
+        report = {}
+        for stage, histogram in self.histograms.items():
+            if histogram.total:
+                summary = {f'p{p}': value for p, value in histogram.percentiles(percentiles).items()}
+                report[stage] = dict(summary, count=histogram.total, max=histogram.max_ms)
+        return report
+
+    def summary(self):
+        lines = []
+        for stage, stats in self.report().items():
+            lines.append(f"{stage:>10}: p50 {stats['p50']:7.1f} ms  p95 {stats['p95']:7.1f} ms  "
+                         f"p99 {stats['p99']:7.1f} ms  max {stats['max']:7.1f} ms  (n={stats['count']})")
+        return '\n'.join(lines)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
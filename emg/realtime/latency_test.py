@@ -1,9 +1,10 @@
+import os
 import time
-import asyncio
-import numpy as np
-from datetime import datetime
 from mindrove.board_shim import BoardShim, MindRoveInputParams, BoardIds
 
+from emg.realtime.instrumentation import LatencyHistogram, sample_latencies
+from emg.realtime.simulator import simulated_board
+
 def initialize_board():
     BoardShim.enable_dev_board_logger()  # Logging for debugging
     params = MindRoveInputParams()
@@ -14,16 +15,12 @@ def initialize_board():
     return board
 
 def calculate_latency(timestamps):
-    latencies = []
-    for ts in timestamps:
-        data_time = datetime.fromtimestamp(ts)
-        current_time = datetime.now()
-        latency = (current_time - data_time).total_seconds() * 1000  # Latency in milliseconds
-        latencies.append(latency)
-    return latencies
+    # Latency in milliseconds for every timestamp, against a single clock read
+    return sample_latencies(timestamps)
 
-def main():
-    board = initialize_board()
+def main(report_every=50, board=None):
+    board = board if board is not None else initialize_board()
+    histogram = LatencyHistogram()
     sampling_rate = BoardShim.get_sampling_rate(BoardIds.MINDROVE_WIFI_BOARD.value)
     try:
         while True:
@@ -31,35 +28,28 @@ def main():
             data = board.get_current_board_data(num_points)
             timestamp_channel = BoardShim.get_timestamp_channel(board.board_id)
             timestamps = data[timestamp_channel, :]
-            latencies = calculate_latency(timestamps)
-            for latency in latencies:
-                print(f"Sample latency: {latency:.2f} ms")
+            histogram.record_many(calculate_latency(timestamps))
+            if histogram.total and histogram.total % report_every == 0:
+                print(f"Sample latency: {histogram.percentiles()}")
             time.sleep(0.1)  # Slight delay between checks
     except KeyboardInterrupt:
         print("Stopping latency test.")
     finally:
+        print(f"Sample latency: {histogram.percentiles()}")
         board.stop_stream()
         board.release_session()
 
 
-async def latency_test(data):
+async def latency_test(data, histogram=None):
+    # Vectorised over the whole chunk; records into histogram when given instead of printing every sample
     timestamp_channel = BoardShim.get_timestamp_channel(BoardIds.MINDROVE_WIFI_BOARD.value)
-    timestamps = data[timestamp_channel, :]
-
-    latencies = []
-    for ts in timestamps:
-        data_time = datetime.fromtimestamp(ts)
-        current_time = datetime.now()
-        latency = (current_time - data_time).total_seconds() * 1000  # Latency in milliseconds
-        latencies.append(latency)
-
-    # Optionally, you can process these latencies further or just print them
-    for latency in latencies:
-        print(f"Sample latency: {latency:.2f} ms")
-
-    await asyncio.sleep(0.1)  # Slight delay to simulate async processing
-
+    latencies = calculate_latency(data[timestamp_channel, :])
+    if histogram is not None:
+        histogram.record_many(latencies)
+    return latencies
 
 
 if __name__ == "__main__":
-    main()
+    # MINDROVE_SIMULATOR=<capture.csv> measures against a replayed recording instead of the armband
+    recording = os.getenv("MINDROVE_SIMULATOR")
+    main(board=simulated_board(recording) if recording else None)
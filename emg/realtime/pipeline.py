@@ -0,0 +1,158 @@
+import time
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from emg.data_ingestion.config import FEATURE_CONFIG, SAMPLING_FREQ
+from emg.data_ingestion.data_loader import preprocess_data
+from emg.models.model_inferencer import infer
+from emg.feature_extraction.feature_extraction import extract_features_multi_channel
+from emg.realtime.instrumentation import Instrumentation
+
+QUEUE_POLICIES = ('drop_oldest', 'drop_newest', 'latest', 'block')
+
+
+def classify_window(model, window, feature_config=FEATURE_CONFIG, samp_freq=SAMPLING_FREQ):
+    # Module-level so it can run on a thread or a process pool
+    features = extract_features_multi_channel(window, fs=samp_freq, config=feature_config)
+    return infer(model, features)
+
+
+def window_features_timed(window, feature_config=FEATURE_CONFIG, samp_freq=SAMPLING_FREQ):
+    # Feature vector plus (preprocess, features) durations in ms
+    start = time.perf_counter()
+    samples = preprocess_data(np.asarray(window, dtype=float))
+    preprocessed = time.perf_counter()
+    features = extract_features_multi_channel(samples, fs=samp_freq, config=feature_config, preprocessed=True)
+    extracted = time.perf_counter()
+    return features, ((preprocessed - start) * 1000, (extracted - preprocessed) * 1000)
+
+
+def classify_window_timed(model, window, feature_config=FEATURE_CONFIG, samp_freq=SAMPLING_FREQ):
+    # Same as classify_window but also returns (preprocess, features, inference) durations in ms. The timings
+    # travel back with the label, so they are collected on the event loop even when a process pool does the work.
+    features, timings = window_features_timed(window, feature_config, samp_freq)
+    start = time.perf_counter()
+    label = infer(model, features)
+    return label, timings + ((time.perf_counter() - start) * 1000,)
+
+
+def print_result(label, timestamps, received_at):
+    latency_ms = (time.time() - timestamps[-1]) * 1000
+    print(f"Predicted gesture: {label} (latency {latency_ms:.1f} ms)")
+
+
+class RealtimePipeline:
+    # acquisition -> bounded window queue -> feature/inference worker (executor) -> output stage
+    def __init__(self, model, feature_config=FEATURE_CONFIG, samp_freq=SAMPLING_FREQ, queue_size=4, policy='drop_oldest',
+                 executor=None, on_result=print_result, instrumentation=None, batcher=None, extractor=None):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Queue policy {policy} not recognized. Choose one of {list(QUEUE_POLICIES)}.")
+        self.model = model
+        self.feature_config = feature_config
+        self.samp_freq = samp_freq
+        self.policy = policy
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1)
+        self.on_result = on_result
+        # Optional MicroBatcher shared by several pipelines, one per stream, so their windows are classified together
+        self.batcher = batcher
+        # Optional IncrementalFeatureExtractor: features are then updated from each window's newest hop on the event
+        # loop, before the queue can drop anything, and the workers only run inference
+        self.extractor = extractor
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.windows = asyncio.Queue(maxsize=queue_size)
+        self.results = asyncio.Queue(maxsize=queue_size)
+        self.tasks = []
+        self.stats = {"submitted": 0, "processed": 0, "dropped": 0, "coalesced": 0, "max_queue_depth": 0}
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.inference_worker()), asyncio.create_task(self.output_worker())]
+        return self
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, window, timestamps, end=None):
+        # Windows from the ring buffer are views that the next write overwrites, so queue a copy. end is the window's
+        # stream position, which lets the extractor notice windows the ring buffer skipped.
+        received_at = time.time()
+        if self.extractor is not None:
+            with self.instrumentation.time('features'):
+                window = self.extractor.update_window(window, end)
+        item = (np.array(window), np.array(timestamps), received_at)
+        self.stats["submitted"] += 1
+        # Acquire: board timestamp of the newest sample to the window entering the queue
+        self.instrumentation.record_timestamps('acquire', item[1][-1], received_at)
+
+        if self.windows.full():
+            if self.policy == 'block':
+                await self.windows.put(item)
+                self.record_depth()
+                return
+            if self.policy == 'drop_newest':
+                self.stats["dropped"] += 1
+                return
+            if self.policy == 'latest':
+                # Coalesce: everything still waiting is stale once a newer window exists
+                while not self.windows.empty():
+                    self.windows.get_nowait()
+                    self.stats["coalesced"] += 1
+            else:
+                self.windows.get_nowait()
+                self.stats["dropped"] += 1
+
+        self.windows.put_nowait(item)
+        self.record_depth()
+
+    def record_depth(self):
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.windows.qsize())
+
+    def backpressure(self):
+        return dict(self.stats, queue_depth=self.windows.qsize(), result_depth=self.results.qsize())
+
+    async def inference_worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            window, timestamps, received_at = await self.windows.get()
+            # CPU-heavy work runs on the executor so the event loop keeps acquiring
+            if self.extractor is not None:
+                # The queued item is already the feature vector
+                with self.instrumentation.time('inference'):
+                    if self.batcher is not None:
+                        label = await self.batcher.submit(window)
+                    else:
+                        label = await loop.run_in_executor(self.executor, infer, self.model, window)
+                timings = ()
+            elif self.batcher is not None:
+                features, timings = await loop.run_in_executor(self.executor, window_features_timed, window, self.feature_config,
+                                                               self.samp_freq)
+                start = time.perf_counter()
+                label = await self.batcher.submit(features)
+                timings += ((time.perf_counter() - start) * 1000,)
+            elif self.instrumentation.enabled:
+                label, timings = await loop.run_in_executor(self.executor, classify_window_timed, self.model, window,
+                                                            self.feature_config, self.samp_freq)
+            else:
+                label = await loop.run_in_executor(self.executor, classify_window, self.model, window, self.feature_config, self.samp_freq)
+                timings = ()
+            for stage, duration in zip(('preprocess', 'features', 'inference'), timings):
+                self.instrumentation.record(stage, duration)
+            self.stats["processed"] += 1
+            await self.results.put((label, timestamps, received_at))
+
+    async def output_worker(self):
+        while True:
+            label, timestamps, received_at = await self.results.get()
+            with self.instrumentation.time('actuation'):
+                self.on_result(label, timestamps, received_at)
+            self.instrumentation.record_timestamps('end_to_end', timestamps[-1])
+
+    async def monitor(self, interval=5.0):
+        while True:
+            await asyncio.sleep(interval)
+            print(f"Pipeline backpressure: {self.backpressure()}")
+            if self.instrumentation.enabled:
+                print(f"Stage latency:\n{self.instrumentation.summary()}")
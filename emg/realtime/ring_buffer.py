@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Single-producer/single-consumer circular buffer of (n_channels, capacity) samples. Storage is mirrored
+    # (every sample is written at i and i + capacity) so any window of up to capacity samples is one contiguous view.
+    def __init__(self, n_channels, capacity, dtype=np.float32):
+        self.n_channels = n_channels
+        self.capacity = capacity
+        self.buffer = np.zeros((n_channels, 2 * capacity), dtype=dtype)
+        self.cursor = 0
+        self.total_written = 0
+        self.next_window_end = None
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    def write(self, samples):
+        # samples is (n_channels, n_samples); copies into the preallocated storage, never allocates
+        n_samples = samples.shape[-1]
+        kept = samples[:, -self.capacity:] if n_samples > self.capacity else samples
+        start = (self.cursor + n_samples - kept.shape[-1]) % self.capacity
+
+        first = min(kept.shape[-1], self.capacity - start)
+        rest = kept.shape[-1] - first
+        for offset in (0, self.capacity):
+            self.buffer[:, offset + start:offset + start + first] = kept[:, :first]
+            self.buffer[:, offset:offset + rest] = kept[:, first:]
+
+        self.cursor = (self.cursor + n_samples) % self.capacity
+        self.total_written += n_samples
+
+    def window_ending_at(self, end, window):
+        # View of the window whose last sample is sample number end - 1 of the stream
+        if window > self.capacity:
+            raise ValueError(f"Window of {window} samples does not fit in a buffer of {self.capacity}.")
+        if end > self.total_written or end - window < max(self.total_written - self.capacity, 0):
+            raise ValueError("Requested window is not in the buffer.")
+        stop = end % self.capacity + self.capacity
+        return self.buffer[:, stop - window:stop]
+
+    def latest(self, window):
+        return self.window_ending_at(self.total_written, window)
+
+    def windows(self, window, hop, positions=False):
+        # Yields every window completed since the last call, hop samples apart, or (end, window) pairs with
+        # positions=True, where end is the stream position one past the window's last sample. Views are only valid
+        # until the next write, so consume them before writing again.
+        if self.next_window_end is None:
+            self.next_window_end = window
+        oldest_end = self.total_written - self.capacity + window
+        if self.next_window_end < oldest_end:
+            # The consumer fell behind by more than the buffer; skip to the oldest window still held
+            self.next_window_end += -(-(oldest_end - self.next_window_end) // hop) * hop
+        while self.next_window_end <= self.total_written:
+            # Advance before yielding: zip() over two of these generators abandons the second one at its yield
+            end = self.next_window_end
+            self.next_window_end += hop
+            yield (end, self.window_ending_at(end, window)) if positions else self.window_ending_at(end, window)
@@ -0,0 +1,176 @@
+import time
+import numpy as np
+
+from emg.data_ingestion.config import ELECTRODE_CONFIG, SAMPLING_FREQ
+from emg.data_ingestion.data_loader import load_csv_channels
+
+
+class ReplayClock:
+    # Decides when each packet of a replayed recording arrives. speed=1.0 is real time, speed=4.0 four times
+    # faster and speed=None as fast as the consumer reads (every poll gets max_speed_burst packets). Each packet is
+    # delayed by |N(0, jitter_ms)| without overtaking the previous one, and dropped with probability packet_loss.
+    def __init__(self, sampling_rate, packet_size, speed=1.0, jitter_ms=0.0, packet_loss=0.0, seed=None, max_speed_burst=100):
+        if speed is not None and speed <= 0:
+            raise ValueError(f"Replay speed must be positive or None, got {speed}.")
+        if not 0 <= packet_loss < 1:
+            raise ValueError(f"Packet loss must be in [0, 1), got {packet_loss}.")
+        self.sampling_rate = sampling_rate
+        self.packet_size = packet_size
+        self.speed = speed
+        self.jitter = jitter_ms / 1000
+        self.packet_loss = packet_loss
+        self.max_speed_burst = max_speed_burst
+        self.rng = np.random.default_rng(seed)
+        self.start_time = None
+        self.next_packet = 0
+        self.next_arrival_time = None
+        self.last_arrival = 0.0
+        self.stats = {"packets": 0, "lost_packets": 0}
+
+    def start(self):
+        self.start_time = time.time()
+        self.next_packet = 0
+        self.next_arrival_time = None
+        self.last_arrival = self.start_time
+
+    def sample_time(self, sample_idx):
+        # Wall-clock time at which the device would have acquired these samples; at max speed, the time they are read
+        if self.speed is None:
+            return np.full(np.shape(sample_idx), time.time())
+        return self.start_time + np.asarray(sample_idx) / (self.sampling_rate * self.speed)
+
+    def next_arrival(self):
+        # Drawn once per packet, so asking when the next packet is due does not change when it arrives
+        if self.speed is None:
+            return time.time()
+        if self.next_arrival_time is None:
+            nominal = self.sample_time((self.next_packet + 1) * self.packet_size)
+            delay = abs(self.rng.normal(0, self.jitter)) if self.jitter else 0.0
+            self.next_arrival_time = max(self.last_arrival, nominal + delay)
+        return self.next_arrival_time
+
+    def due_packets(self, now=None):
+        # Packet indices that have arrived by now, minus lost ones; the next packet's arrival is drawn lazily
+        now = time.time() if now is None else now
+        due = []
+        first_packet = self.next_packet
+        while self.start_time is not None:
+            if self.speed is None and self.next_packet - first_packet >= self.max_speed_burst:
+                break
+            arrival = now if self.speed is None else self.next_arrival()
+            if arrival > now:
+                break
+            self.last_arrival = arrival
+            self.next_arrival_time = None
+            self.stats["packets"] += 1
+            if self.packet_loss and self.rng.random() < self.packet_loss:
+                self.stats["lost_packets"] += 1
+            else:
+                due.append(self.next_packet)
+            self.next_packet += 1
+        return due
+
+
+def load_emg_recording(filepath, electrode_config=ELECTRODE_CONFIG):
+    return load_csv_channels(filepath, electrode_config)
+
+
+class SimulatedBoard:
+    # The subset of mindrove's BoardShim that the realtime scripts use, replaying a (n_channels, n_samples)
+    # recording. Rows follow the real board layout, so BoardShim.get_emg_channels / get_timestamp_channel apply.
+    def __init__(self, recording, board_id=None, sampling_rate=SAMPLING_FREQ, speed=1.0,
+                 jitter_ms=0.0, packet_loss=0.0, packet_size=10, loop=True, seed=None, buffer_size=450000):
+        # Imported here so ReplayClock and load_emg_recording work without the mindrove SDK installed
+        from mindrove.board_shim import BoardShim, BoardIds
+
+        self.recording = np.asarray(recording, dtype=np.float64)
+        self.board_id = BoardIds.MINDROVE_WIFI_BOARD.value if board_id is None else board_id
+        self.sampling_rate = sampling_rate
+        self.loop = loop
+        self.buffer_size = buffer_size
+        self.clock = ReplayClock(sampling_rate, packet_size, speed, jitter_ms, packet_loss, seed)
+        self.emg_channels = BoardShim.get_emg_channels(self.board_id)
+        self.timestamp_channel = BoardShim.get_timestamp_channel(self.board_id)
+        self.n_rows = max(self.emg_channels + [self.timestamp_channel]) + 1
+        if self.recording.shape[0] != len(self.emg_channels):
+            raise ValueError(f"Recording has {self.recording.shape[0]} channels but the board has {len(self.emg_channels)} EMG channels.")
+        # Like the real board, a preallocated ring of buffer_size samples: head is the oldest unread sample
+        self.ring = np.zeros((self.n_rows, buffer_size))
+        self.head = 0
+        self.count = 0
+        self.streaming = False
+
+    def prepare_session(self):
+        pass
+
+    def start_stream(self, *args):
+        self.clock.start()
+        self.head = self.count = 0
+        self.streaming = True
+
+    def stop_stream(self):
+        self.streaming = False
+
+    def release_session(self):
+        self.head = self.count = 0
+
+    def packet(self, packet_idx):
+        size = self.clock.packet_size
+        sample_idx = np.arange(packet_idx * size, (packet_idx + 1) * size)
+        if not self.loop:
+            sample_idx = sample_idx[sample_idx < self.recording.shape[1]]
+        data = np.zeros((self.n_rows, len(sample_idx)))
+        data[self.emg_channels] = self.recording[:, sample_idx % self.recording.shape[1]]
+        data[self.timestamp_channel] = self.clock.sample_time(sample_idx)
+        return data
+
+    def poll(self):
+        if not self.streaming:
+            return
+        for packet_idx in self.clock.due_packets():
+            if not self.loop and packet_idx * self.clock.packet_size >= self.recording.shape[1]:
+                self.streaming = False
+                break
+            self.write(self.packet(packet_idx))
+
+    def write(self, data):
+        # Once buffer_size is exceeded the oldest samples are overwritten, as on the real board
+        kept = data[:, -self.buffer_size:]
+        self.ring[:, self.ring_index(self.count, kept.shape[1])] = kept
+        overwritten = max(self.count + kept.shape[1] - self.buffer_size, 0)
+        self.head = (self.head + overwritten) % self.buffer_size
+        self.count += kept.shape[1] - overwritten
+
+    def ring_index(self, first, n_samples):
+        # Ring columns of the n_samples buffered samples starting first samples after the oldest
+        return (self.head + first + np.arange(n_samples)) % self.buffer_size
+
+    def get_board_data_count(self, *args):
+        self.poll()
+        return self.count
+
+    def get_board_data(self, num_samples=None, *args):
+        self.poll()
+        n_samples = self.count if num_samples is None else min(num_samples, self.count)
+        data = self.ring[:, self.ring_index(0, n_samples)]
+        self.head = (self.head + n_samples) % self.buffer_size
+        self.count -= n_samples
+        return data
+
+    def get_current_board_data(self, num_samples, *args):
+        # Latest samples without removing them; only the tail is copied out of the ring
+        self.poll()
+        n_samples = min(num_samples, self.count)
+        return self.ring[:, self.ring_index(self.count - n_samples, n_samples)]
+
+    @property
+    def stats(self):
+        return dict(self.clock.stats, buffered=self.count)
+
+
+def simulated_board(filepath, **kwargs):
+    # Board replaying one of the EMG CSV captures; kwargs go to SimulatedBoard (speed, jitter_ms, packet_loss, ...)
+    board = SimulatedBoard(load_emg_recording(filepath), **kwargs)
+    board.prepare_session()
+    board.start_stream()
+    return board
@@ -0,0 +1,50 @@
+import time
+import asyncio
+import threading
+import numpy as np
+import pytest
+
+pytest.importorskip('mindrove')
+
+from emg.realtime.acquisition import BoardReader
+from emg.realtime.simulator import SimulatedBoard
+
+
+def test_stop_waits_for_the_reader_thread_off_the_event_loop():
+    board = SimulatedBoard(np.zeros((8, 500)), speed=None)
+    reader = BoardReader(board, 500, 50, mode='thread')
+    # A reader thread that takes a while to notice the stop request
+    reader.thread = threading.Thread(target=time.sleep, args=(0.3,), daemon=True)
+    reader.thread.start()
+
+    async def stop_while_ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        await reader.stop()
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(stop_while_ticking()) > 5
+    assert not reader.thread.is_alive()
+
+
+def test_threaded_chunks_stop_when_the_consumer_does():
+    board = SimulatedBoard(np.random.default_rng(0).normal(size=(8, 5000)), speed=None)
+    board.start_stream()
+    reader = BoardReader(board, 500, 50, mode='thread')
+
+    async def first_chunks(n_chunks):
+        chunks = reader.chunks()
+        received = [await chunks.__anext__() for _ in range(n_chunks)]
+        await chunks.aclose()
+        return received
+
+    assert len(asyncio.run(first_chunks(3))) == 3
+    assert reader.stop_event.is_set() and not reader.thread.is_alive()
@@ -0,0 +1,20 @@
+import json
+
+from benchmarks.__main__ import main
+
+CASES = r'ingest_emg_csv\[seconds=10,channels=2\]|emg_features\[seconds=10,channels=2,config=live\]|realtime_loop'
+
+
+def test_run_and_compare_smoke(tmp_path):
+    results_path = str(tmp_path / 'results.json')
+    assert main(['run', '--quick', '--only', CASES, '--repeat', '1', '--max-time', '0.01', '--output', results_path,
+                 '--data-dir', str(tmp_path / 'data')]) == 0
+
+    with open(results_path) as handle:
+        results = json.load(handle)
+    assert {'ingest_emg_csv[seconds=10,channels=2]', 'emg_features[seconds=10,channels=2,config=live]'} <= set(results['results'])
+    # realtime_loop either ran or was skipped because the mindrove SDK is missing; it never takes the other cases with it
+    assert any(key.startswith('realtime_loop') for key in list(results['results']) + list(results['skipped']))
+    assert results['failed'] == {}
+
+    assert main(['compare', results_path, results_path]) == 0
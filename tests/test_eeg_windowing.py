@@ -0,0 +1,20 @@
+import numpy as np
+
+from eeg.classifier.feature_extraction import iter_equal_length_blocks
+from eeg.classifier.windowing import sliding_windows
+
+
+def test_strided_windows_are_one_block_without_a_copy():
+    recording = np.random.default_rng(0).normal(size=(4, 2560)).astype(np.float32)
+    windows = sliding_windows(recording, 1.0, 0.5, 256)
+    blocks = list(iter_equal_length_blocks(windows))
+    assert len(blocks) == 1 and blocks[0] is windows and np.shares_memory(blocks[0], recording)
+    assert list(iter_equal_length_blocks(windows[:0])) == []
+
+
+def test_ragged_lists_are_split_by_window_length():
+    rng = np.random.default_rng(0)
+    windows = [rng.normal(size=(4, 256)) for _ in range(3)] + [rng.normal(size=(4, 100))]
+    blocks = list(iter_equal_length_blocks(windows))
+    assert [block.shape for block in blocks] == [(3, 4, 256), (1, 4, 100)]
+    np.testing.assert_array_equal(blocks[0][2], windows[2])
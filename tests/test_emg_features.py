@@ -0,0 +1,78 @@
+import warnings
+import numpy as np
+import pytest
+
+from emg.data_ingestion.config import ELECTRODE_CONFIG
+from emg.data_ingestion.data_loader import apply_window_csv
+from emg.feature_extraction.feature_extraction import extract_features_batch, extract_features_from_files, extract_feature_superset_from_files, \
+    extract_features_per_file, count_windows_in_file, feature_blocks, feature_columns, feature_widths, select_features, ALL_FEATURES_CONFIG
+from benchmarks.data import synthetic_emg, write_emg_csv
+
+FS = 500
+
+
+def flat_channel_windows(n_windows=4, n_channels=8, n_samples=250, seed=0):
+    windows = np.random.default_rng(seed).normal(size=(n_windows, n_channels, n_samples))
+    windows[:, 2] = 0  # AR, Hjorth and spectral entropy are undefined on a flat channel
+    return windows
+
+
+def only(*feature_names):
+    return {feature_name: feature_name in feature_names for feature_name in ALL_FEATURES_CONFIG}
+
+
+def test_superset_selection_warns_only_for_selected_features():
+    superset = extract_features_batch(flat_channel_windows(), FS, ALL_FEATURES_CONFIG, warn_nan=False)
+    columns = feature_columns(ALL_FEATURES_CONFIG)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        select_features(superset, columns, only("root_mean_square (rms)", "slope_sign_changes (ssc)"))
+
+    with pytest.warns(RuntimeWarning, match='hjorth_parameters') as record:
+        select_features(superset, columns, only("root_mean_square (rms)", "hjorth_parameters"))
+    assert len(record) == 1 and 'autoregressive' not in str(record[0].message)
+
+
+def test_direct_extraction_names_the_nan_feature():
+    with pytest.warns(RuntimeWarning, match='spectral_entropy'):
+        extract_features_batch(flat_channel_windows(), FS, only("spectral_entropy", "waveform_length (wl)"))
+
+
+def test_superset_of_requested_configs_selects_like_direct_extraction(tmp_path):
+    write_emg_csv(str(tmp_path / 'capture.csv'), synthetic_emg(4)[0])
+    configs = [only("root_mean_square (rms)"), only("slope_sign_changes (ssc)", "hjorth_parameters")]
+    superset, columns = extract_feature_superset_from_files(['capture.csv'], str(tmp_path), feature_configs=configs)
+
+    assert {feature_name for _, feature_name, _ in columns} == {"root_mean_square (rms)", "slope_sign_changes (ssc)", "hjorth_parameters"}
+    for config in configs:
+        direct = np.array(extract_features_from_files(['capture.csv'], str(tmp_path), config))
+        np.testing.assert_array_equal(select_features(superset, columns, config), direct)
+
+
+@pytest.mark.parametrize('fs, win_len', [(500, 0.5), (500, 0.2), (256, 2.0), (1000, 0.1)])
+def test_feature_widths_match_the_engine(fs, win_len):
+    window = np.random.default_rng(0).normal(size=(1, 1, int(win_len * fs)))
+    blocks = dict(feature_blocks(window, fs, list(ALL_FEATURES_CONFIG)))
+    assert feature_widths(ALL_FEATURES_CONFIG, fs, win_len) == {feature_name: block.shape[-1] for feature_name, block in blocks.items()}
+    assert feature_widths({**only("hjorth_parameters"), "unknown": True}, fs, win_len) == {"hjorth_parameters": 3}
+
+
+def test_csv_shorter_than_a_window_has_no_windows(tmp_path):
+    path = str(tmp_path / 'capture.csv')
+    write_emg_csv(path, synthetic_emg(0.4)[0])
+    assert count_windows_in_file(path, 0.5, 0.5) == 0 == len(apply_window_csv(0.5, 0.5, path, ELECTRODE_CONFIG))
+
+
+@pytest.mark.parametrize('seconds', [3, 7.3])
+def test_csv_chunks_load_only_their_windows(tmp_path, seconds):
+    path = str(tmp_path / 'capture.csv')
+    write_emg_csv(path, synthetic_emg(seconds)[0])
+    windows = np.array(apply_window_csv(0.5, 0.5, path, ELECTRODE_CONFIG))
+    assert count_windows_in_file(path, 0.5, 0.5) == len(windows)
+    for start, stop in [(0, 2), (3, 7), (5, None), (len(windows) - 1, len(windows))]:
+        np.testing.assert_array_equal(apply_window_csv(0.5, 0.5, path, ELECTRODE_CONFIG, start=start, stop=stop), windows[start:stop])
+
+    serial, = extract_features_per_file([path])
+    chunked, = extract_features_per_file([path], n_jobs=2, chunk_size=3)
+    np.testing.assert_array_equal(np.array(chunked), np.array(serial))
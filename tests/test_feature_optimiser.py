@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from emg.experimentation.feature_optimiser import FeatureOptimiser, correlation_prune, describe_columns
+from emg.feature_extraction.feature_extraction import feature_columns, ALL_FEATURES_CONFIG
+
+# RMS is one column per channel, AR four and Hjorth three
+CONFIG = {feature_name: feature_name in ("root_mean_square (rms)", "autoregressive_coefficients (ar_coefficients)", "hjorth_parameters")
+          for feature_name in ALL_FEATURES_CONFIG}
+
+
+def test_groups_follow_multi_column_features():
+    columns = feature_columns(CONFIG)
+    optimiser = FeatureOptimiser(random_state=0)
+
+    by_channel = optimiser.feature_groups(len(columns), 8, CONFIG, group_by='channel')
+    assert list(by_channel) == [f'CH{idx}' for idx in range(1, 9)]
+    assert all(len(members) == 1 + 4 + 3 for members in by_channel.values())
+    assert {columns[idx][0] for idx in by_channel['CH3']} == {'CH3'}
+
+    by_feature = optimiser.feature_groups(len(columns), 8, CONFIG, group_by='feature')
+    assert {name: len(members) for name, members in by_feature.items()} == \
+           {"root_mean_square (rms)": 8, "autoregressive_coefficients (ar_coefficients)": 32, "hjorth_parameters": 24}
+
+    with pytest.raises(ValueError, match='columns'):
+        optimiser.feature_groups(len(columns) - 1, 8, CONFIG, group_by='channel')
+
+
+def test_describe_columns_names_sub_indices():
+    columns = feature_columns(CONFIG)
+    assert describe_columns([0, 1, 5, 8], columns) == [('CH1', 'root_mean_square (rms)'), ('CH1', 'autoregressive_coefficients (ar_coefficients)[0]'),
+                                                       ('CH1', 'hjorth_parameters[0]'), ('CH2', 'root_mean_square (rms)')]
+
+
+def test_filter_rankings_prune_with_one_correlation_matrix():
+    rng = np.random.default_rng(0)
+    y = np.arange(120) % 3
+    X = rng.normal(size=(120, 6)) + y[:, np.newaxis] * np.array([1, 1, 0, 0.5, 0, 0])
+    X[:, 1] = X[:, 0] * 2 + 1e-3 * rng.normal(size=120)  # a near-duplicate of column 0
+
+    rankings = FeatureOptimiser(random_state=0, n_jobs=1).filter_rankings(X, y, correlation_threshold=0.95)
+    for order, scores in rankings.values():
+        np.testing.assert_array_equal(order, correlation_prune(X, np.argsort(scores)[::-1], 0.95))
+        assert not {0, 1} <= set(order.tolist())
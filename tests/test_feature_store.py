@@ -0,0 +1,46 @@
+import os
+import warnings
+import numpy as np
+
+from utils.feature_store import FeatureStore
+import eeg.classifier.feature_extraction as eeg_features
+from eeg.classifier.feature_extraction import extract_features_from_files
+from eeg.scripts.stream_recorder import StreamRecorder, stream_to_recording_cache
+
+
+def record_stream(directory, name, n_epochs=160, seed=0):
+    # A session that only exists as the streamed recording cache, as collector_trial.py leaves it
+    rng = np.random.default_rng(seed)
+    path = os.path.join(directory, name)
+    recorder = StreamRecorder(path)
+    for idx in range(n_epochs):
+        recorder.callback({'data': rng.normal(size=(8, 16)).tolist(), 'info': {'startTime': 1.7e12 + idx * 62.5}})
+    recorder.close()
+    stream_to_recording_cache(path, f'{path}.json')
+    return f'{name}.json'
+
+
+def test_stream_only_recording_is_cached(tmp_path):
+    name = record_stream(str(tmp_path), 'session')
+    assert not os.path.exists(tmp_path / name)
+    store = FeatureStore(str(tmp_path / 'features'))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        first = extract_features_from_files([name], file_loc=str(tmp_path), feature_store=store)
+        second = extract_features_from_files([name], file_loc=str(tmp_path), feature_store=store)
+
+    assert len(first) > 0
+    np.testing.assert_array_equal(np.vstack(first), np.vstack(second))
+    assert store.stats()['hits'] == 1 and store.stats()['misses'] == 1
+
+
+def test_feature_version_is_part_of_the_key(tmp_path, monkeypatch):
+    name = record_stream(str(tmp_path), 'session')
+    store = FeatureStore(str(tmp_path / 'features'))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        extract_features_from_files([name], file_loc=str(tmp_path), feature_store=store)
+        monkeypatch.setattr(eeg_features, 'FEATURE_VERSION', eeg_features.FEATURE_VERSION + 1)
+        extract_features_from_files([name], file_loc=str(tmp_path), feature_store=store)
+    assert store.stats()['misses'] == 2 and store.stats()['entries'] == 2
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from sklearn.decomposition import FastICA
+
+import eeg.classifier.preprocessing as preprocessing
+from eeg.classifier.preprocessing import ICAStage, fit_ica_stage, kurtosis_rejection
+
+FS = 256
+WINDOW = 4 * FS
+
+
+def blink_mix(seconds=40, seed=0):
+    # Three steady sources plus a blink-like artefact (sparse, peaky bumps), mixed onto four channels. Returns the
+    # recording and what it would be without the artefact.
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * FS) / FS
+    clean = np.stack([np.sin(2 * np.pi * 7 * t), np.sign(np.sin(2 * np.pi * 11 * t + 0.3)), 2 * ((13 * t) % 1) - 1])
+    blinks = np.arange(0.5, seconds, 1.0) + rng.uniform(-0.2, 0.2, seconds)
+    artefact = 8 * np.exp(-0.5 * np.square((t[:, np.newaxis] - blinks) / 0.03)).sum(axis=1)
+    mixing = rng.normal(size=(4, 4))
+    return mixing @ np.vstack([clean, artefact]), mixing[:, :3] @ clean
+
+
+def per_window_ica(window, reject):
+    # The old path: a fresh FastICA on every window, here also dropping the components reject picks
+    ica = FastICA(whiten='unit-variance', random_state=0)
+    sources = ica.fit_transform(window.T).T
+    keep = np.setdiff1d(np.arange(len(sources)), reject(sources, None))
+    return ica.mixing_[:, keep] @ sources[keep] + ica.mean_[:, np.newaxis]
+
+
+def split(data):
+    return np.stack([data[:, start:start + WINDOW] for start in range(0, data.shape[1] - WINDOW + 1, WINDOW)])
+
+
+def relative_error(actual, expected):
+    # Blinks also shift each window's mean, which the ICA keeps, so compare the demeaned signals
+    demean = lambda x: x - x.mean(axis=-1, keepdims=True)
+    return np.sqrt(np.mean(np.square(demean(actual) - demean(expected))) / np.mean(np.square(expected)))
+
+
+@pytest.fixture
+def unfiltered(monkeypatch):
+    # fit_ica_stage without the filters and normalisation, so the known mix reaches the ICA unchanged
+    for step in ('bandpass', 'notch', 'baseline_correction', 'z_score'):
+        monkeypatch.setitem(preprocessing.config, step, False)
+
+
+def test_fitted_projection_matches_per_window_ica(unfiltered):
+    recording, clean = blink_mix()
+    stage = fit_ica_stage(recording, FS, reject_components=kurtosis_rejection())
+    assert len(stage.rejected_) == 1
+
+    windows, clean_windows = split(recording), split(clean)
+    fitted = stage.apply(windows)
+    per_window = np.stack([per_window_ica(window, kurtosis_rejection()) for window in windows])
+    assert relative_error(windows, clean_windows) > 1
+    assert relative_error(fitted, clean_windows) < 0.02
+    assert relative_error(per_window, fitted) < 0.1
+
+
+def test_saved_stage_applies_the_same_projection(tmp_path):
+    recording, _ = blink_mix(seconds=10)
+    stage = ICAStage(reject_components=kurtosis_rejection()).fit(recording)
+    path = str(tmp_path / 'ica.npz')
+    stage.save(path)
+    loaded = ICAStage.load(path)
+
+    assert loaded.rejected_ == stage.rejected_
+    windows = split(recording)
+    np.testing.assert_array_equal(loaded.apply(windows), stage.apply(windows))
+    np.testing.assert_allclose(stage.apply(windows), np.stack([stage.apply(window) for window in windows]))
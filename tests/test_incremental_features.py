@@ -0,0 +1,84 @@
+import asyncio
+import numpy as np
+import pytest
+
+from emg.data_ingestion.data_loader import sliding_windows
+from emg.feature_extraction.feature_extraction import extract_features_batch, ALL_FEATURES_CONFIG
+from emg.feature_extraction.incremental_features import IncrementalFeatureExtractor, sliding_time_features, INCREMENTAL_FEATURES
+from emg.realtime.pipeline import RealtimePipeline
+
+FS = 500
+WIN_LEN = 0.5
+N_CHANNELS = 4
+SAMPLES_PER_WINDOW = int(WIN_LEN * FS)
+
+# Every running-sum feature, plus two that go through the feature_blocks fallback
+CONFIG = {feature_name: feature_name in INCREMENTAL_FEATURES or feature_name in ("mean_frequency", "spectral_entropy")
+          for feature_name in ALL_FEATURES_CONFIG}
+
+
+def recording(seconds=3, seed=0):
+    return np.random.default_rng(seed).normal(scale=20, size=(N_CHANNELS, seconds * FS))
+
+
+def batch_features(data, overlap):
+    hop = SAMPLES_PER_WINDOW - int(overlap * SAMPLES_PER_WINDOW)
+    windows = np.ascontiguousarray(sliding_windows(data, SAMPLES_PER_WINDOW, hop))
+    return windows, extract_features_batch(windows, FS, CONFIG)
+
+
+@pytest.mark.parametrize('overlap', [0.0, 0.5, 0.8])
+def test_sliding_time_features_match_feature_blocks(overlap):
+    data = recording()
+    _, expected = batch_features(data, overlap)
+    np.testing.assert_allclose(sliding_time_features(data, CONFIG, WIN_LEN, overlap, FS), expected, rtol=1e-7, atol=1e-9)
+
+
+@pytest.mark.parametrize('overlap', [0.5, 0.8])
+@pytest.mark.parametrize('chunk_size', [1, 37, 125, 400])
+def test_extractor_matches_feature_blocks_for_any_chunking(overlap, chunk_size):
+    data = recording()
+    _, expected = batch_features(data, overlap)
+    extractor = IncrementalFeatureExtractor(N_CHANNELS, CONFIG, WIN_LEN, overlap, FS)
+    features = [vector for start in range(0, data.shape[1], chunk_size) for vector in extractor.update(data[:, start:start + chunk_size])]
+    np.testing.assert_allclose(np.array(features), expected, rtol=1e-7, atol=1e-9)
+
+
+@pytest.mark.parametrize('overlap', [0.5, 0.8])
+def test_update_window_reseeds_when_windows_skip_ahead(overlap):
+    windows, expected = batch_features(recording(), overlap)
+    hop = SAMPLES_PER_WINDOW - int(overlap * SAMPLES_PER_WINDOW)
+    extractor = IncrementalFeatureExtractor(N_CHANNELS, CONFIG, WIN_LEN, overlap, FS)
+
+    # Contiguous, then a jump as RingBuffer.windows makes when the consumer falls behind, then contiguous again
+    order = [0, 1, 2, 7, 8, 9, 4, 5]
+    features = [extractor.update_window(windows[idx], SAMPLES_PER_WINDOW + idx * hop) for idx in order]
+    np.testing.assert_allclose(np.array(features), expected[order], rtol=1e-7, atol=1e-9)
+
+
+class EchoModel:
+    # Stands in for a fitted classifier and keeps every feature vector it is asked to classify
+    def __init__(self):
+        self.seen = []
+
+    def predict(self, features):
+        self.seen.extend(np.array(features))
+        return np.zeros(len(features), dtype=int)
+
+
+async def run_pipeline(model, windows, extractor):
+    pipeline = RealtimePipeline(model, CONFIG, samp_freq=FS, policy='block', on_result=lambda *args: None, extractor=extractor).start()
+    try:
+        for window in windows:
+            await pipeline.submit(window, np.zeros(SAMPLES_PER_WINDOW))
+        while pipeline.stats["processed"] < len(windows):
+            await asyncio.sleep(0.001)
+    finally:
+        await pipeline.stop()
+
+
+def test_pipeline_with_extractor_classifies_the_batch_features():
+    windows, expected = batch_features(recording(), 0.5)
+    model = EchoModel()
+    asyncio.run(run_pipeline(model, windows, IncrementalFeatureExtractor(N_CHANNELS, CONFIG, WIN_LEN, 0.5, FS)))
+    np.testing.assert_allclose(np.array(model.seen), expected, rtol=1e-7, atol=1e-9)
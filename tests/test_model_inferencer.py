@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from sklearn.svm import SVC
+from sklearn.naive_bayes import GaussianNB
+from sklearn.linear_model import LogisticRegression
+
+from emg.models.model_inferencer import compile_model, LinearPredictor, OneVsOnePredictor, GaussianNBPredictor
+
+MODELS = {
+    'lbfgs': (lambda: LogisticRegression(max_iter=1000), LinearPredictor),
+    'liblinear': (lambda: LogisticRegression(solver='liblinear'), LinearPredictor),
+    'linear_svc': (lambda: SVC(kernel='linear', decision_function_shape='ovo'), OneVsOnePredictor),
+    'gaussian_nb': (lambda: GaussianNB(), GaussianNBPredictor),
+}
+
+
+def overlapping_classes(n_classes, n_rows=240, n_features=6, seed=0):
+    # Classes that overlap, so plenty of rows sit near a decision boundary; labels are not 0..n-1
+    rng = np.random.default_rng(seed)
+    y = np.array([3, 5, 7, 9])[np.arange(n_rows) % n_classes]
+    centres = rng.normal(scale=1.5, size=(10, n_features))
+    return rng.normal(size=(n_rows, n_features)) + centres[y], y
+
+
+@pytest.mark.parametrize('n_classes', [2, 3, 4])
+@pytest.mark.parametrize('model_name', list(MODELS))
+def test_compiled_model_matches_sklearn(model_name, n_classes):
+    make_model, predictor_type = MODELS[model_name]
+    X, y = overlapping_classes(n_classes)
+    model = make_model().fit(X, y)
+    compiled = compile_model(model)
+    assert type(compiled) is predictor_type
+
+    X_test = overlapping_classes(n_classes, seed=1)[0]
+    np.testing.assert_array_equal(compiled.predict(X_test), model.predict(X_test))
+    if model_name == 'linear_svc':
+        with pytest.raises(ValueError, match='no probability estimates'):
+            compiled.predict_proba(X_test)
+    else:
+        np.testing.assert_allclose(compiled.predict_proba(X_test), model.predict_proba(X_test), rtol=1e-7, atol=1e-10)
+    if model_name != 'gaussian_nb':
+        # Binary models give one score per row; the compiled ones keep it as a column
+        expected = model.decision_function(X_test)
+        np.testing.assert_allclose(compiled.decision_function(X_test), expected.reshape(len(X_test), -1), rtol=1e-7, atol=1e-9)
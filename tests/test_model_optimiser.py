@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sklearn.model_selection import ParameterGrid
+
+import emg.models.model_suite as model_suite
+import emg.experimentation.model_optimiser as model_optimiser
+from emg.experimentation.model_optimiser import Optimiser
+
+MODEL_CONFIGS = {
+    "LogisticRegression": {"C": [0.1, 1, 10]},
+    # Identical settings, so every combination ties on accuracy
+    "NaiveBayes": {"var_smoothing": [1e-9, 1e-9, 1e-9]}
+}
+
+
+def training_data(seed=0):
+    rng = np.random.default_rng(seed)
+    y = np.arange(90) % 3
+    return rng.normal(size=(90, 6)) + y[:, np.newaxis], y
+
+
+def param_level_search(n_jobs):
+    optimiser = Optimiser(model_suite, 'test', n_jobs=n_jobs)
+    results = optimiser.optimise_multiple_models_param_lvl(MODEL_CONFIGS, *training_data())
+    return optimiser, results
+
+
+def test_param_level_results_do_not_depend_on_n_jobs():
+    serial, serial_results = param_level_search(1)
+    parallel, parallel_results = param_level_search(2)
+
+    expected_order = [(model_name, params) for model_name, grid in MODEL_CONFIGS.items() for params in ParameterGrid(grid)]
+    assert [(name, params) for name, _, params, *_ in serial_results] == expected_order
+    assert [(name, params, accuracy) for name, _, params, accuracy, _ in parallel_results] == \
+           [(name, params, accuracy) for name, _, params, accuracy, _ in serial_results]
+    assert (parallel.best_params, parallel.best_score) == (serial.best_params, serial.best_score)
+
+
+def test_shared_arrays_are_released_when_a_fit_fails():
+    optimiser = Optimiser(model_suite, 'test', n_jobs=2)
+    with pytest.raises(ValueError):
+        # A negative C fails to fit
+        optimiser.optimise_multiple_models_param_lvl({"LogisticRegression": {"C": [-1.0]}}, *training_data())
+    assert optimiser.shared_dir is None
+
+
+def test_feature_superset_extracts_only_the_requested_configs(monkeypatch):
+    extracted = []
+
+    def record_superset(files, feature_store=None, feature_configs=None):
+        extracted.append({feature_name for config in feature_configs for feature_name, is_enabled in config.items() if is_enabled})
+        return None, None
+
+    monkeypatch.setattr(model_optimiser, 'extract_feature_superset_from_files', record_superset)
+    rms, ssc, wl = "root_mean_square (rms)", "slope_sign_changes (ssc)", "waveform_length (wl)"
+    optimiser = Optimiser(model_suite, 'test', feature_configs=[{rms: True}, {ssc: True}])
+
+    optimiser.feature_superset(['a.csv'], {ssc: True})
+    optimiser.feature_superset(['a.csv'], {rms: True, ssc: True})
+    assert extracted == [{rms, ssc}]
+
+    # A feature outside the superset extends it once
+    optimiser.feature_superset(['a.csv'], {wl: True})
+    optimiser.feature_superset(['a.csv'], {rms: True, wl: True})
+    assert extracted == [{rms, ssc}, {rms, ssc, wl}]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from emg.models.model_registry import ModelRegistry
+from emg.models.model_inferencer import CLASS_LABELS
+
+
+def fitted_model(n_features=8, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(60, n_features))
+    y = np.arange(60) % len(CLASS_LABELS)
+    return LogisticRegression(max_iter=200).fit(X + y[:, np.newaxis], y)
+
+
+def test_load_accepts_the_labels_the_model_was_trained_with(tmp_path):
+    registry = ModelRegistry()
+    path = str(tmp_path / 'model.pkl')
+    registry.save(fitted_model(), path, class_labels=CLASS_LABELS)
+    assert registry.metadata(path)["class_labels"] == {str(cls): label for cls, label in CLASS_LABELS.items()}
+    registry.load(path, class_labels=CLASS_LABELS)
+
+
+def test_load_rejects_relabelled_classes(tmp_path):
+    registry = ModelRegistry()
+    path = str(tmp_path / 'model.pkl')
+    registry.save(fitted_model(), path, class_labels={0: 'fist', 1: 'palm', 2: 'finger'})
+    with pytest.raises(ValueError, match="class 0 as 'fist'"):
+        registry.load(path, class_labels=CLASS_LABELS)
+
+
+def test_load_rejects_classes_without_a_live_label(tmp_path):
+    registry = ModelRegistry()
+    path = str(tmp_path / 'model.pkl')
+    registry.save(fitted_model(), path)
+    with pytest.raises(ValueError, match='class 2'):
+        registry.load(path, class_labels={0: 'palm', 1: 'fist'})
+    # Saved without labels, so only the live mapping's coverage is checked
+    registry.load(path, class_labels=CLASS_LABELS)
@@ -0,0 +1,25 @@
+import os
+import numpy as np
+
+from benchmarks.data import synthetic_eeg, write_eeg_json
+from eeg.classifier.recording_cache import cache_paths, load_cached_recording
+
+
+def test_shared_cache_dir_keeps_same_named_recordings_apart(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    paths = [str(tmp_path / 'files' / 'x.json'), str(tmp_path / 'files' / 'unfiltered' / 'x.json')]
+    recordings = [synthetic_eeg(2, seed=0), synthetic_eeg(3, seed=1)]
+    for path, recording in zip(paths, recordings):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_eeg_json(path, recording)
+
+    assert cache_paths(paths[0], cache_dir) != cache_paths(paths[1], cache_dir)
+    for _ in range(2):
+        for path, recording in zip(paths, recordings):
+            data, _ = load_cached_recording(path, cache_dir)
+            np.testing.assert_array_equal(data, recording)
+
+
+def test_default_cache_sits_next_to_the_json(tmp_path):
+    data_path, meta_path = cache_paths(str(tmp_path / 'x.json'), None)
+    assert (data_path, meta_path) == (str(tmp_path / '.cache' / 'x.npy'), str(tmp_path / '.cache' / 'x.meta.json'))
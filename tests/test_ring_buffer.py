@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from emg.realtime.ring_buffer import RingBuffer
+
+
+@pytest.mark.parametrize('chunk_size', [7, 50, 130])
+def test_zipped_windows_stay_aligned(chunk_size, window=100, hop=25, capacity=300):
+    # Data and timestamp buffers are zipped in read_emg_data; zip abandons the second generator at its yield,
+    # so each must advance its cursor before yielding
+    samples = np.arange(2000, dtype=np.float64)
+    data = RingBuffer(2, capacity, dtype=np.float64)
+    timestamps = RingBuffer(1, capacity, dtype=np.float64)
+
+    ends = []
+    for start in range(0, samples.size, chunk_size):
+        chunk = samples[start:start + chunk_size]
+        data.write(np.stack([chunk, -chunk]))
+        timestamps.write(chunk[np.newaxis])
+        for data_window, timestamp_window in zip(data.windows(window, hop), timestamps.windows(window, hop)):
+            np.testing.assert_array_equal(data_window[0], timestamp_window[0])
+            np.testing.assert_array_equal(data_window[1], -timestamp_window[0])
+            ends.append(timestamp_window[0, -1])
+
+    # Every window, hop samples apart, exactly once
+    np.testing.assert_array_equal(ends, np.arange(window - 1, samples.size, hop))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from emg.realtime.simulator import ReplayClock, SimulatedBoard
+
+FS = 500
+PACKET_SIZE = 10
+
+
+def arrivals(clock, seconds=2.0, step=0.001):
+    # (time, packet) for every packet the clock hands out, polling every step seconds from the start
+    clock.start()
+    clock.start_time = 0.0
+    clock.last_arrival = 0.0
+    return [(now, packet_idx) for now in np.arange(0, seconds, step) for packet_idx in clock.due_packets(now)]
+
+
+def test_jittered_packets_arrive_late_but_in_order():
+    delivered = arrivals(ReplayClock(FS, PACKET_SIZE, jitter_ms=15, seed=0))
+    times, packets = np.array(delivered).T
+    assert list(packets) == list(range(len(packets)))
+    assert np.all(np.diff(times) >= 0)
+
+    # Never before the packet's last sample was acquired, and the jitter really does hold some back
+    nominal = (packets + 1) * PACKET_SIZE / FS
+    assert np.all(times >= nominal - 1e-9)
+    assert np.mean(times - nominal > 0.005) > 0.2
+
+
+def test_packet_loss_is_reproducible_for_a_seed():
+    def lost(seed):
+        clock = ReplayClock(FS, PACKET_SIZE, jitter_ms=5, packet_loss=0.3, seed=seed)
+        packets = [packet_idx for _, packet_idx in arrivals(clock)]
+        return sorted(set(range(clock.stats["packets"])) - set(packets)), clock.stats
+
+    first, stats = lost(1)
+    assert (first, stats) == lost(1)
+    assert first != lost(2)[0]
+    assert stats["lost_packets"] == len(first) and 0.2 < len(first) / stats["packets"] < 0.4
+
+
+def test_board_without_loop_stops_after_the_recording():
+    pytest.importorskip('mindrove')
+    recording = np.random.default_rng(0).normal(size=(8, 95))
+    board = SimulatedBoard(recording, speed=None, loop=False, packet_size=PACKET_SIZE)
+    board.start_stream()
+
+    chunks = []
+    while board.streaming:
+        chunks.append(board.get_board_data())
+    data = np.hstack(chunks)
+    np.testing.assert_array_equal(data[board.emg_channels], recording)
+    assert board.get_board_data().shape == (board.n_rows, 0) and board.stats["buffered"] == 0
+
+
+def test_board_ring_keeps_the_latest_samples():
+    pytest.importorskip('mindrove')
+    recording = np.arange(8 * 1000, dtype=float).reshape(8, 1000)
+    board = SimulatedBoard(recording, speed=None, loop=False, packet_size=PACKET_SIZE, buffer_size=64)
+    board.start_stream()
+    board.poll()
+
+    # Each poll delivers 100 packets, so only the last 64 of the first 1000 samples are still held
+    assert board.get_board_data_count() == 64
+    np.testing.assert_array_equal(board.get_current_board_data(20)[board.emg_channels], recording[:, -20:])
+    np.testing.assert_array_equal(board.get_board_data(50)[board.emg_channels], recording[:, -64:-14])
+    np.testing.assert_array_equal(board.get_current_board_data(100)[board.emg_channels], recording[:, -14:])
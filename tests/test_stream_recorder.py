@@ -0,0 +1,113 @@
+import os
+import time
+import numpy as np
+import pytest
+
+from eeg.classifier.recording_cache import is_cache_stale, load_cached_recording
+from eeg.scripts.stream_recorder import StreamRecorder, read_stream, stream_paths, stream_to_recording_cache
+
+
+def epochs(n_epochs, n_channels=8, epoch_samples=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{'data': rng.normal(size=(n_channels, epoch_samples)).astype(np.float32),
+             'info': {'startTime': 1.7e12 + idx * 62.5, 'samplingRate': 256, 'channelNames': [f'C{idx}' for idx in range(n_channels)]}}
+            for idx in range(n_epochs)]
+
+
+def wait_for_epochs(path, n_epochs, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        samples, times, metadata = read_stream(path)
+        if len(times) >= n_epochs:
+            return samples, times, metadata
+        time.sleep(0.01)
+    raise AssertionError(f"{n_epochs} epochs did not reach disk within {timeout} s.")
+
+
+def test_metadata_is_readable_before_any_epoch(tmp_path):
+    path = str(tmp_path / 'session')
+    recorder = StreamRecorder(path)
+    try:
+        samples, times, metadata = read_stream(path)
+        assert samples.shape == (0, 8, 16) and metadata['n_epochs'] == 0
+    finally:
+        recorder.close()
+
+
+def test_part_full_block_reaches_disk_without_close(tmp_path):
+    # Far fewer epochs than a block: without the timed hand-off they would sit in memory until close, and a crash
+    # would lose them and leave no metadata to read the session with
+    path = str(tmp_path / 'session')
+    recorder = StreamRecorder(path, chunk_epochs=256, fsync_interval=0.05)
+    session = epochs(10)
+    try:
+        for epoch in session:
+            recorder.callback(epoch)
+        samples, times, metadata = wait_for_epochs(path, len(session))
+        np.testing.assert_array_equal(samples, np.stack([epoch['data'] for epoch in session]))
+        np.testing.assert_array_equal(times, [epoch['info']['startTime'] for epoch in session])
+        assert metadata['channel_names'] == session[0]['info']['channelNames']
+
+        # Later epochs continue the same files
+        for epoch in epochs(5, seed=1):
+            recorder.callback(epoch)
+        wait_for_epochs(path, len(session) + 5)
+    finally:
+        assert recorder.close()['n_epochs'] == len(session) + 5
+
+
+def test_read_stream_counts_whole_epochs_after_a_crash(tmp_path):
+    path = str(tmp_path / 'session')
+    recorder = StreamRecorder(path, chunk_epochs=4)
+    for epoch in epochs(8):
+        recorder.callback(epoch)
+    recorder.close()
+
+    # A crash mid-write leaves half an epoch behind the last complete one
+    data_path, time_path, _ = stream_paths(path)
+    with open(data_path, 'ab') as handle:
+        handle.write(np.zeros(8 * 8, dtype=np.float32).tobytes())
+    assert os.path.getsize(time_path) == 8 * 8
+    samples, times, metadata = read_stream(path)
+    assert samples.shape == (8, 8, 16) and len(times) == 8
+
+
+def test_close_reraises_a_failed_write(tmp_path):
+    path = str(tmp_path / 'session')
+    recorder = StreamRecorder(path, chunk_epochs=4)
+    # Stands in for a full disk or a yanked drive
+    recorder.data_file.close()
+    for epoch in epochs(4):
+        recorder.callback(epoch)
+    deadline = time.monotonic() + 5.0
+    while recorder.error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    for epoch in epochs(3, seed=1):
+        recorder.callback(epoch)
+    with pytest.raises(ValueError):
+        recorder.close()
+    assert recorder.dropped == 7
+
+
+def test_stream_converts_to_the_recording_cache_in_chunks(tmp_path):
+    path = str(tmp_path / 'session')
+    session = epochs(10)
+    recorder = StreamRecorder(path)
+    for epoch in session:
+        recorder.callback(epoch)
+    recorder.close()
+
+    json_path = str(tmp_path / 'session.json')
+    cache_dir = str(tmp_path / 'cache')
+    stream_to_recording_cache(path, json_path, cache_dir, chunk_epochs=3)
+    data, metadata = load_cached_recording(json_path, cache_dir)
+    np.testing.assert_array_equal(data, np.hstack([epoch['data'] for epoch in session]))
+    assert metadata['source'] == 'stream' and not is_cache_stale(json_path, cache_dir)
+
+    # A JSON saved for the same session later takes over from the streamed copy
+    with open(json_path, 'w') as handle:
+        handle.write('{}')
+    assert is_cache_stale(json_path, cache_dir)
+    data, metadata = load_cached_recording(json_path, cache_dir)
+    assert data.size == 0 and 'source' not in metadata
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from eeg.classifier.preprocessing import streaming_preprocessor, streaming_callback, causal_filter
+
+FS = 256
+
+
+def synthetic_recording(n_channels=4, seconds=8, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * FS) / FS
+    drift = np.cumsum(rng.normal(size=(n_channels, t.size)), axis=-1)
+    return drift + 20 * np.sin(2 * np.pi * 10 * t) + 5 * np.sin(2 * np.pi * 60 * t) + 50
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 16, 100, 256, 8 * FS])
+def test_streaming_matches_offline_causal_filter(chunk_size):
+    recording = synthetic_recording()
+    stream = streaming_preprocessor(recording.shape[0], FS)
+    streamed = np.hstack([stream.process(recording[:, i:i + chunk_size]) for i in range(0, recording.shape[1], chunk_size)])
+    np.testing.assert_allclose(streamed, causal_filter(recording, FS), rtol=1e-10, atol=1e-8)
+
+
+def test_streaming_callback_filters_each_epoch_in_sequence():
+    recording = synthetic_recording(n_channels=8)
+    received = []
+    callback = streaming_callback(received.append, recording.shape[0], FS)
+    for i in range(0, recording.shape[1], 16):
+        callback({'data': recording[:, i:i + 16].tolist(), 'info': {'startTime': i}, 'label': 'rawUnfiltered'})
+
+    assert [epoch['info']['startTime'] for epoch in received] == list(range(0, recording.shape[1], 16))
+    np.testing.assert_allclose(np.hstack([epoch['data'] for epoch in received]), causal_filter(recording, FS), rtol=1e-10, atol=1e-8)
@@ -0,0 +1,106 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class FeatureStore:
+    # Shared by the EEG and EMG pipelines; each passes its own cache_dir (FEATURE_CACHE_DIR in its settings)
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.file_hashes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_hash(self, filepath):
+        # Hash the raw bytes once per (path, size, mtime) so repeat lookups in a session skip the read
+        stat = os.stat(filepath)
+        signature = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+        if signature not in self.file_hashes:
+            digest = hashlib.sha256()
+            with open(filepath, 'rb') as handle:
+                for block in iter(lambda: handle.read(1 << 20), b''):
+                    digest.update(block)
+            self.file_hashes[signature] = digest.hexdigest()
+        return self.file_hashes[signature]
+
+    def make_key(self, filepath, **params):
+        # Content hash of the raw file plus every setting that changes the features, e.g. feature/preprocessing
+        # config, window length, overlap and sampling rate
+        payload = json.dumps({'file': self.file_hash(filepath), 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.npy')
+
+    def get(self, key):
+        path = self.entry_path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        os.utime(path)
+        self.hits += 1
+        return np.load(path, mmap_mode='r')
+
+    def put(self, key, features):
+        path = self.entry_path(key)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as handle:
+            np.save(handle, np.asarray(features))
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return np.load(path, mmap_mode='r')
+
+    def get_or_compute(self, filepath, compute, **params):
+        key = self.make_key(filepath, **params)
+        features = self.get(key)
+        if features is None:
+            features = self.put(key, compute())
+        return features
+
+    def entries(self):
+        paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.npy')]
+        return sorted(((os.stat(path).st_mtime_ns, os.path.getsize(path), path) for path in paths))
+
+    def evict(self, keep=None):
+        # Drop least recently used entries until the store fits the size budget
+        entries = self.entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def stats(self):
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries)
+        }
+
+
+def to_feature_matrix(features):
+    # Per-window feature vectors -> one 2-D array that can be stored and memory-mapped
+    if len(features) == 0:
+        return np.empty((0, 0))
+    return np.vstack(features)